@@ -1,4 +1,4 @@
-import { useEffect, useRef, useState } from "react";
+import { useCallback, useEffect, useRef, useState } from "react";
 import { useNavigate, useParams, useSearchParams } from "react-router-dom";
 import SeekerCard from "../components/SeekerCard";
 import MatchCard from "../components/MatchCard";
@@ -11,6 +11,7 @@ export default function AiMatchesPage() {
   const navigate = useNavigate();
   const [results, setResults] = useState([]);
   const [loading, setLoading] = useState(false);
+  const [analysing, setAnalysing] = useState(false);
   const [error, setError] = useState("");
   const [seeker, setSeeker] = useState(null);
   const [refreshTick, setRefreshTick] = useState(0);
@@ -28,6 +29,7 @@ export default function AiMatchesPage() {
   } = useMatchStore();
   const { start, stop } = useLoadingStore();
   const fetchedRef = useRef({});
+  const streamRef = useRef(null);
   const [canonicalLoadingMap, setCanonicalLoadingMap] = useState({});
   const [canonicalErrorMap, setCanonicalErrorMap] = useState({});
 
@@ -58,6 +60,23 @@ export default function AiMatchesPage() {
     return `Good alignment on: ${strong.join(", ")}.`;
   };
 
+  const closeStream = useCallback(() => {
+    const stream = streamRef.current;
+    if (!stream) return;
+    streamRef.current = null;
+    stream.source.close();
+    stream.finish();
+  }, []);
+
+  useEffect(
+    () => () => {
+      // Unmounting mid-stream: drop it so a remount fetches again
+      closeStream();
+      fetchedRef.current = {};
+    },
+    [closeStream]
+  );
+
   useEffect(() => {
     if (!resolvedId) {
       setError("Missing profile id. Please upload your profile first.");
@@ -80,45 +99,67 @@ export default function AiMatchesPage() {
     if (fetchedRef.current[resolvedId]) return;
     fetchedRef.current[resolvedId] = true;
     const fetchProfileAndRerank = async () => {
+      closeStream();
       setLoading(true);
+      setAnalysing(true);
       start();
       setError("");
       setResults([]); // clear local view
       clearRerank(resolvedId); // clear cache for this id
-      try {
-        const [profileRes, rerankRes] = await Promise.all([
-          fetch(`${API_BASE}/profile/${resolvedId}`),
-          fetch(`${API_BASE}/profile/matches/ai/${resolvedId}`),
-        ]);
+      clearCanonicalMatches(resolvedId);
+
+      // The loader only covers the vector ranking; LLM updates stream in afterwards
+      let loaderActive = true;
+      const stopLoader = () => {
+        if (!loaderActive) return;
+        loaderActive = false;
+        setLoading(false);
+        stop();
+      };
+      const finish = () => {
+        stopLoader();
+        setAnalysing(false);
+      };
+      const fail = (message) => {
+        setError(message);
+        fetchedRef.current[resolvedId] = false;
+        closeStream();
+      };
+
+      const source = new EventSource(`${API_BASE}/profile/matches/ai/${resolvedId}/stream`);
+      streamRef.current = { source, finish };
+      source.addEventListener("matches", (event) => {
+        setResults(JSON.parse(event.data));
+        stopLoader();
+      });
+      source.addEventListener("rerank", (event) => {
+        const verdicts = Object.fromEntries(JSON.parse(event.data).map((v) => [v.profile_id, v]));
+        setResults((prev) => prev.map((m) => (verdicts[m.profile_id] ? { ...m, ...verdicts[m.profile_id] } : m)));
+      });
+      source.addEventListener("ranking", (event) => {
+        const rerankData = JSON.parse(event.data);
+        setResults(rerankData);
+        cacheRerank(resolvedId, rerankData);
+      });
+      source.addEventListener("done", () => closeStream());
+      source.onerror = () => fail("Lost connection while fetching reranked matches.");
 
+      try {
+        const profileRes = await fetch(`${API_BASE}/profile/${resolvedId}`);
         if (!profileRes.ok) {
           const msg = await profileRes.text();
           throw new Error(msg || "Failed to fetch your profile");
         }
-        if (!rerankRes.ok) {
-          const msg = await rerankRes.text();
-          throw new Error(msg || "Failed to fetch reranked matches");
-        }
-
         const profileData = await profileRes.json();
-        const rerankData = await rerankRes.json();
-
         setSeeker(profileData);
-        setResults(rerankData);
         cacheProfile(resolvedId, profileData);
-        cacheRerank(resolvedId, rerankData);
-        clearCanonicalMatches(resolvedId);
       } catch (err) {
-        setError(err.message || "Something went wrong fetching reranked matches.");
-        fetchedRef.current[resolvedId] = false;
-      } finally {
-        setLoading(false);
-        stop();
+        fail(err.message || "Something went wrong fetching reranked matches.");
       }
     };
 
     fetchProfileAndRerank();
-  }, [resolvedId, API_BASE, cacheProfile, cacheRerank, clearRerank, start, stop, refreshTick]);
+  }, [resolvedId, API_BASE, cacheProfile, cacheRerank, clearRerank, clearCanonicalMatches, closeStream, start, stop, refreshTick]);
 
   const goBackToMatches = () => {
     if (resolvedId) {
@@ -207,7 +248,7 @@ export default function AiMatchesPage() {
           <button
             type="button"
             onClick={handleRefresh}
-            disabled={loading}
+            disabled={loading || analysing}
             className="w-full md:w-auto text-center px-4 py-2 rounded-full border border-gray-200 text-sm font-semibold bg-white cursor-pointer shadow-sm hover:bg-gray-50 disabled:bg-gray-200 disabled:text-gray-500 disabled:cursor-not-allowed"
           >
             Refresh results
@@ -224,8 +265,10 @@ export default function AiMatchesPage() {
 
       {seeker && <SeekerCard seeker={seeker} />}
 
-      {loading && (
-        <div className="text-center text-sm text-gray-600">Analysis in progress...</div>
+      {(loading || analysing) && (
+        <div className="text-center text-sm text-gray-600">
+          {loading ? "Analysis in progress..." : "AI analysis in progress, scores update as they arrive..."}
+        </div>
       )}
       {error && <p className="text-red-600 text-sm">{error}</p>}
       {!loading && !error && results.length === 0 && (
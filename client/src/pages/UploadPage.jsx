@@ -1,6 +1,8 @@
 import { useRef, useState } from "react";
 import { useNavigate } from "react-router-dom";
 
+const JOB_POLL_MS = 1000;
+
 export default function UploadPage() {
   const [file, setFile] = useState(null);
   const [dragActive, setDragActive] = useState(false);
@@ -93,11 +95,27 @@ export default function UploadPage() {
         throw new Error(msg || "Failed to create profile");
       }
 
-      const data = await res.json();
+      // The server queues the upload (202) and builds the profile in the background
+      let job = await res.json();
+      setSuccessMessage("Profile uploaded, processing…");
+      while (job.status === "queued" || job.status === "running") {
+        await new Promise((resolve) => setTimeout(resolve, JOB_POLL_MS));
+        const jobRes = await fetch(`${API_BASE}/profile/jobs/${job.job_id}`);
+        if (!jobRes.ok) {
+          const msg = await jobRes.text();
+          throw new Error(msg || "Failed to check profile processing");
+        }
+        job = await jobRes.json();
+        if (job.stage) setSuccessMessage(`Profile uploaded, processing (${job.stage})…`);
+      }
+      if (job.status !== "succeeded") {
+        throw new Error(job.error || "Profile processing failed");
+      }
+
       setSuccessMessage("Profile uploaded successfully.");
       // Optionally store profile id for later use (e.g., matches page)
-      localStorage.setItem("lastProfileId", data.profile_id);
-      navigate(`/matches/${data.profile_id}`);
+      localStorage.setItem("lastProfileId", job.profile_id);
+      navigate(`/matches/${job.profile_id}`);
     } catch (err) {
       console.error(err);
       setError(err.message || "Something went wrong, please try again.");
@@ -0,0 +1,393 @@
+"""
+Bulk profile import, for onboarding a partner bureau's archive in one go.
+The source is a manifest (CSV with a header row, or JSON Lines) giving
+`file`, `who_am_i`, `looking_for` and `gender` per item, with file paths
+relative to the manifest; or a directory holding `manifest.csv` /
+`manifest.jsonl`, or only PDF/DOCX files that all share the same answers.
+
+Items run in batches of BULK_IMPORT_BATCH_SIZE: files are parsed together in
+the extraction pool, features extracted concurrently at bulk priority, the
+batch's embeddings requested together, each distinct city geocoded once, and
+the profiles written with one multi-row INSERT in the transaction that also
+advances the import's checkpoint (`BulkImport.position`). A resumed import
+continues after the last committed batch; items whose file and answers were
+already imported are skipped, so re-running a manifest only retries failures.
+"""
+import asyncio
+import csv
+import json
+import logging
+import os
+import time
+from contextlib import contextmanager
+from dataclasses import dataclass, field
+from datetime import datetime, timedelta, timezone
+from typing import Any, Dict, Iterator, List, Optional, Sequence, Set, Tuple, Union
+from uuid import uuid4
+
+from sqlalchemy import and_, func, insert, or_, select, update
+from sqlalchemy.orm import Session
+
+from .config import settings
+from .db import SessionLocal
+from .db.models import BulkImport, Profile
+from .ingest import ProcessedUpload, _profile_fields, find_processed_upload
+from .openai import aextract_features_from_pdf_text, aget_embeddings, build_pref_text, build_self_text
+from .openai.scheduler import Priority
+from .pool_versions import bump_pool_versions, partition_key
+from .utils.extraction_pool import extraction_pool
+from .utils.file_utils import SavedUpload, store_local_file
+from .utils.geo import geocode_city
+
+MANIFEST_FIELDS = ("file", "who_am_i", "looking_for", "gender")
+MANIFEST_NAMES = ("manifest.csv", "manifest.jsonl")
+_DOCUMENT_EXTENSIONS = (".pdf", ".doc", ".docx")
+# Per-file errors kept on the import row; older ones are dropped
+_MAX_ERRORS = 200
+# A running import that has not committed a batch for this long lost its process
+STALE_AFTER = timedelta(minutes=10)
+
+_ImportKey = Tuple[str, str, str, str]  # content hash, who_am_i, looking_for, gender
+
+
+@dataclass(frozen=True)
+class ImportItem:
+    file: str
+    who_am_i: str
+    looking_for: str
+    gender: str
+
+
+@dataclass
+class _Pending:
+    item: ImportItem
+    upload: SavedUpload
+    prior: Optional[ProcessedUpload] = None
+    pdf_text: str = ""
+    canonical: Dict[str, Any] = field(default_factory=dict)
+    dynamic: Dict[str, Any] = field(default_factory=dict)
+
+
+def _inside(root: Optional[str], path: str) -> str:
+    path = os.path.realpath(path)
+    if root is not None:
+        root = os.path.realpath(root)
+        if os.path.commonpath([root, path]) != root:
+            raise ValueError(f"{path} is outside the import directory")
+    return path
+
+
+def _read_manifest(path: str, root: Optional[str]) -> List[ImportItem]:
+    base = os.path.dirname(path)
+    with open(path, newline="", encoding="utf-8") as f:
+        if path.endswith(".jsonl"):
+            rows = [json.loads(line) for line in f if line.strip()]
+        else:
+            rows = list(csv.DictReader(f))
+    items = []
+    for number, row in enumerate(rows, 1):
+        values = {name: str(row.get(name) or "").strip() for name in MANIFEST_FIELDS}
+        missing = [name for name, value in values.items() if not value]
+        if missing:
+            raise ValueError(f"{path}, item {number}: missing {', '.join(missing)}")
+        values["file"] = _inside(root, os.path.join(base, values["file"]))
+        items.append(ImportItem(**values))
+    return items
+
+
+def read_items(source: str, defaults: Optional[Dict[str, str]] = None, root: Optional[str] = None) -> List[ImportItem]:
+    """
+    The items of `source` in import order, which must stay the same across
+    resumes. With `root`, the source and every file it names must lie inside
+    that directory.
+    """
+    source = _inside(root, os.path.join(root, source) if root is not None else source)
+    if not os.path.isdir(source):
+        return _read_manifest(source, root)
+    for name in MANIFEST_NAMES:
+        if os.path.isfile(os.path.join(source, name)):
+            return _read_manifest(os.path.join(source, name), root)
+    defaults = defaults or {}
+    missing = [name for name in MANIFEST_FIELDS[1:] if not str(defaults.get(name) or "").strip()]
+    if missing:
+        raise ValueError(f"{source} has no manifest; give {', '.join(missing)} for all of its files")
+    return [
+        ImportItem(os.path.join(source, name), defaults["who_am_i"], defaults["looking_for"], defaults["gender"])
+        for name in sorted(os.listdir(source))
+        if os.path.splitext(name)[1].lower() in _DOCUMENT_EXTENSIONS
+    ]
+
+
+def create_import(
+    db: Session, source: str, defaults: Optional[Dict[str, str]] = None, root: Optional[str] = None
+) -> BulkImport:
+    """Validate `source` and record a queued import for `arun_import`."""
+    items = read_items(source, defaults, root)
+    if root is None:
+        source = os.path.abspath(source)
+    run = BulkImport(id=str(uuid4()), source=source, defaults=defaults or None, status="queued", total=len(items))
+    db.add(run)
+    db.commit()
+    return run
+
+
+def claim_resume(db: Session, import_id: str) -> bool:
+    """
+    Mark the import running for a resume, unless it succeeded or a live
+    process is still running it (one that committed within STALE_AFTER).
+    The check and the claim are one conditional UPDATE, so of two
+    concurrent resumes only one gets True.
+    """
+    stale_before = datetime.now(timezone.utc) - STALE_AFTER
+    result = db.execute(
+        update(BulkImport)
+        .where(
+            BulkImport.id == import_id,
+            or_(
+                BulkImport.status.in_(("queued", "failed")),
+                and_(
+                    BulkImport.status == "running",
+                    func.coalesce(BulkImport.updated_at, BulkImport.created_at) < stale_before,
+                ),
+            ),
+        )
+        .values(status="running", error=None, updated_at=func.now())
+        .execution_options(synchronize_session=False)
+    )
+    db.commit()
+    return result.rowcount == 1
+
+
+@contextmanager
+def _timed(seconds: Dict[str, float], stage: str) -> Iterator[None]:
+    start = time.monotonic()
+    try:
+        yield
+    finally:
+        seconds[stage] = seconds.get(stage, 0.0) + time.monotonic() - start
+
+
+def _error(item: ImportItem, exc: BaseException) -> Dict[str, str]:
+    return {"file": item.file, "error": str(exc) or type(exc).__name__}
+
+
+def _store_files(items: Sequence[ImportItem]) -> List[Union[SavedUpload, Exception]]:
+    out: List[Union[SavedUpload, Exception]] = []
+    for item in items:
+        try:
+            out.append(store_local_file(item.file))
+        except Exception as exc:
+            out.append(exc)
+    return out
+
+
+def _known_uploads(hashes: Set[str]) -> Tuple[Set[_ImportKey], Dict[str, ProcessedUpload]]:
+    """Items already imported, and earlier extraction results, for these content hashes."""
+    with SessionLocal() as db:
+        imported = {
+            tuple(row)
+            for row in db.execute(
+                select(Profile.content_hash, Profile.who_am_i, Profile.looking_for, Profile.gender).where(
+                    Profile.content_hash.in_(hashes)
+                )
+            )
+        }
+        priors = {content_hash: find_processed_upload(db, content_hash) for content_hash in hashes}
+    return imported, {content_hash: prior for content_hash, prior in priors.items() if prior is not None}
+
+
+def _geocode_cities(cities: Set[str]) -> Dict[str, Optional[Tuple[float, float]]]:
+    # One at a time: gazetteer misses may go to Nominatim, which allows a request per second
+    return {city: geocode_city(city) for city in cities}
+
+
+def _profile_rows(
+    ready: Sequence[_Pending],
+    embeddings: Sequence[List[Optional[List[float]]]],
+    coords: Dict[str, Optional[Tuple[float, float]]],
+) -> List[Dict[str, Any]]:
+    return [
+        _profile_fields(
+            who_am_i=p.item.who_am_i,
+            looking_for=p.item.looking_for,
+            gender=p.item.gender,
+            pdf_path=p.upload.path,
+            pdf_text=p.pdf_text,
+            canonical=p.canonical,
+            dynamic=p.dynamic,
+            self_emb=self_emb,
+            pref_emb=pref_emb,
+            coords=p.prior.coords if p.prior and p.prior.coords else coords.get(p.canonical.get("city")),
+            content_hash=p.upload.sha256,
+        )
+        for p, (self_emb, pref_emb) in zip(ready, embeddings)
+    ]
+
+
+async def _import_batch(
+    items: Sequence[ImportItem], seconds: Dict[str, float], coords: Dict[str, Optional[Tuple[float, float]]]
+) -> Tuple[List[Dict[str, Any]], int, List[Dict[str, str]]]:
+    """
+    Profile rows for `items`, how many were skipped, and per-file errors.
+    `coords` holds the cities geocoded so far in this run and is extended.
+    """
+    errors: List[Dict[str, str]] = []
+    with _timed(seconds, "store"):
+        pending = []
+        for item, upload in zip(items, await asyncio.to_thread(_store_files, items)):
+            if isinstance(upload, Exception):
+                errors.append(_error(item, upload))
+            else:
+                pending.append(_Pending(item, upload))
+        imported, priors = await asyncio.to_thread(_known_uploads, {p.upload.sha256 for p in pending})
+
+    fresh: List[_Pending] = []
+    for p in pending:
+        key = (p.upload.sha256, p.item.who_am_i, p.item.looking_for, partition_key(p.item.gender))
+        if key not in imported:
+            imported.add(key)  # the same row twice in one manifest
+            p.prior = priors.get(p.upload.sha256)
+            fresh.append(p)
+    skipped = len(pending) - len(fresh)
+
+    # Each distinct file is parsed and sent to the LLM once
+    to_parse = {p.upload.sha256: p.upload.path for p in fresh if p.prior is None}
+    with _timed(seconds, "extract"):
+        texts = dict(zip(to_parse, await asyncio.to_thread(extraction_pool.extract_many, list(to_parse.values()))))
+    parsed = {content_hash: text for content_hash, text in texts.items() if not isinstance(text, Exception)}
+    with _timed(seconds, "features"):
+        features = dict(
+            zip(
+                parsed,
+                await asyncio.gather(
+                    *(aextract_features_from_pdf_text(text, strict=True, priority=Priority.BULK) for text in parsed.values()),
+                    return_exceptions=True,
+                ),
+            )
+        )
+
+    ready: List[_Pending] = []
+    for p in fresh:
+        if p.prior is not None:
+            p.pdf_text, p.canonical, p.dynamic = p.prior.pdf_text, p.prior.canonical, p.prior.dynamic
+        else:
+            result = texts[p.upload.sha256]
+            if not isinstance(result, Exception):
+                result = features[p.upload.sha256]
+            if isinstance(result, BaseException):
+                errors.append(_error(p.item, result))
+                continue
+            p.pdf_text = texts[p.upload.sha256]
+            p.canonical = result.get("canonical", {})
+            p.dynamic = result.get("dynamic_features", {})
+        ready.append(p)
+
+    with _timed(seconds, "embed"):
+        embeddings: List[List[Optional[List[float]]]] = []
+        wanted: List[Tuple[int, int, str]] = []
+        for i, p in enumerate(ready):
+            known = p.prior.embeddings_for(p.item.who_am_i, p.item.looking_for) if p.prior else [None, None]
+            embeddings.append(known)
+            if known[0] is None:
+                wanted.append((i, 0, build_self_text(p.item.who_am_i, p.pdf_text, p.canonical, p.dynamic)))
+            if known[1] is None:
+                wanted.append((i, 1, build_pref_text(p.item.looking_for)))
+        if wanted:
+            vectors = await aget_embeddings([text for _, _, text in wanted], priority=Priority.BULK)
+            for (i, which, _), vec in zip(wanted, vectors):
+                embeddings[i][which] = vec
+
+    with _timed(seconds, "geocode"):
+        cities = {p.canonical.get("city") for p in ready if not (p.prior and p.prior.coords)}
+        coords.update(await asyncio.to_thread(_geocode_cities, cities - coords.keys() - {None, ""}))
+
+    with _timed(seconds, "write"):
+        # Interning feature codes reads and writes feature_vocab
+        rows = await asyncio.to_thread(_profile_rows, ready, embeddings, coords)
+    return rows, skipped, errors
+
+
+def _start(import_id: str) -> Tuple[str, Optional[Dict[str, str]], int, int, float, Dict[str, float]]:
+    with SessionLocal() as db:
+        run = db.get(BulkImport, import_id)
+        if run is None:
+            raise LookupError(f"No bulk import {import_id}")
+        run.status = "running"
+        run.error = None
+        db.commit()
+        return run.source, run.defaults, run.total, run.position, run.elapsed_seconds, dict(run.stage_seconds or {})
+
+
+def _write_batch(
+    import_id: str,
+    rows: List[Dict[str, Any]],
+    position: int,
+    skipped: int,
+    errors: List[Dict[str, str]],
+    elapsed: float,
+    seconds: Dict[str, float],
+) -> None:
+    """Insert the batch's profiles and move the checkpoint past it, atomically."""
+    with SessionLocal() as db:
+        if rows:
+            db.execute(insert(Profile), rows)
+        run = db.get(BulkImport, import_id)
+        run.position = position
+        run.imported += len(rows)
+        run.skipped += skipped
+        run.failed += len(errors)
+        if errors:
+            run.errors = ((run.errors or []) + errors)[-_MAX_ERRORS:]
+        run.elapsed_seconds = elapsed
+        run.stage_seconds = dict(seconds)
+        db.commit()
+
+
+def _finish(import_id: str, status: str, error: Optional[str] = None) -> None:
+    with SessionLocal() as db:
+        run = db.get(BulkImport, import_id)
+        run.status = status
+        run.error = error
+        db.commit()
+
+
+async def arun_import(import_id: str, batch_size: Optional[int] = None, root: Optional[str] = None) -> None:
+    """Run (or resume) an import from its checkpoint to the end of its source."""
+    batch_size = max(batch_size or settings.bulk_import_batch_size, 1)
+    source, defaults, total, position, elapsed, seconds = await asyncio.to_thread(_start, import_id)
+    try:
+        items = await asyncio.to_thread(read_items, source, defaults, root)
+        if len(items) != total:
+            raise ValueError(f"{source} now lists {len(items)} items instead of {total}; start a new import")
+        started = time.monotonic() - elapsed
+        resumed_at = position
+        coords: Dict[str, Optional[Tuple[float, float]]] = {}
+        while position < total:
+            batch = items[position : position + batch_size]
+            rows, skipped, errors = await _import_batch(batch, seconds, coords)
+            position += len(batch)
+            with _timed(seconds, "write"):
+                await asyncio.to_thread(
+                    _write_batch, import_id, rows, position, skipped, errors, time.monotonic() - started, seconds
+                )
+            if rows:
+                unembedded = sum(row["self_embedding"] is None or row["pref_embedding"] is None for row in rows)
+                if unembedded:
+                    logging.warning("Import %s: %d profiles stored without embeddings; run `make reembed`", import_id, unembedded)
+                # API processes load the batch on their next index refresh, wherever the import runs
+                await asyncio.to_thread(bump_pool_versions, [row["id"] for row in rows])
+            run_seconds = time.monotonic() - started - elapsed
+            logging.info(
+                "Import %s: %d/%d items (%d new, %d skipped, %d failed in this batch), %.1f items/s",
+                import_id,
+                position,
+                total,
+                len(rows),
+                skipped,
+                len(errors),
+                (position - resumed_at) / run_seconds if run_seconds > 0 else 0.0,
+            )
+    except BaseException as exc:
+        await asyncio.to_thread(_finish, import_id, "failed", str(exc) or type(exc).__name__)
+        raise
+    await asyncio.to_thread(_finish, import_id, "succeeded")
@@ -0,0 +1,123 @@
+"""
+Normalise stored embeddings to unit length and set the *_embedding_valid flags
+for profiles written before embeddings were normalised at ingest. With
+--reembed, profiles whose embedding failed (missing or zero vector) are
+embedded again, one batched request per page at bulk priority. With --all,
+every profile is re-embedded, e.g. after switching EMBEDDING_PROVIDER.
+
+    python -m app.commands.backfill_embeddings [--batch-size 500] [--reembed [--all]]
+"""
+import argparse
+import logging
+
+from sqlalchemy import or_, select
+from sqlalchemy.orm import undefer
+
+from ..db import SessionLocal
+from ..db.models import Profile
+from ..openai import build_pref_text, build_self_text
+from ..openai.embeddings import _normalize_embedding, get_embeddings, is_valid_embedding
+from ..openai.scheduler import Priority
+from ..pool_versions import bump_pool_versions
+
+
+def _backfill_column(profile: Profile, column: str) -> None:
+    vec = getattr(profile, column)
+    valid = is_valid_embedding(vec)
+    if valid:
+        setattr(profile, column, _normalize_embedding(vec))
+    setattr(profile, f"{column}_valid", valid)
+
+
+def backfill(batch_size: int = 500) -> int:
+    updated = 0
+    last_id = ""
+    while True:
+        with SessionLocal() as db:
+            batch = db.execute(
+                select(Profile)
+                .where(Profile.id > last_id)
+                .where(or_(Profile.self_embedding_valid.is_(None), Profile.pref_embedding_valid.is_(None)))
+                .order_by(Profile.id)
+                .limit(batch_size)
+            ).scalars().all()
+            if not batch:
+                break
+            for profile in batch:
+                _backfill_column(profile, "self_embedding")
+                _backfill_column(profile, "pref_embedding")
+            ids = [profile.id for profile in batch]
+            db.commit()
+            bump_pool_versions(ids)
+            updated += len(batch)
+            last_id = ids[-1]
+        logging.info("Backfilled %d profiles", updated)
+    return updated
+
+
+def reembed(batch_size: int = 500, everything: bool = False) -> int:
+    updated = 0
+    last_id = ""
+    while True:
+        with SessionLocal() as db:
+            query = select(Profile).options(undefer(Profile.pdf_text)).where(Profile.id > last_id)
+            if not everything:
+                query = query.where(
+                    or_(
+                        Profile.self_embedding_valid.is_(False),
+                        Profile.pref_embedding_valid.is_(False),
+                        Profile.self_embedding.is_(None),
+                        Profile.pref_embedding.is_(None),
+                    )
+                )
+            batch = db.execute(query.order_by(Profile.id).limit(batch_size)).scalars().all()
+            if not batch:
+                break
+            ids = [profile.id for profile in batch]
+            texts = []
+            for profile in batch:
+                texts.append(
+                    build_self_text(
+                        profile.who_am_i,
+                        profile.pdf_text or "",
+                        profile.canonical or {},
+                        profile.dynamic_features or {},
+                    )
+                )
+                texts.append(build_pref_text(profile.looking_for))
+            # End the read before the (throttled) embedding calls rather than
+            # holding a transaction open across them
+            db.rollback()
+            vectors = get_embeddings(texts, priority=Priority.BULK)
+            for profile, self_emb, pref_emb in zip(batch, vectors[0::2], vectors[1::2]):
+                # None: still failing, keep what is stored and retry on the next run
+                if self_emb is not None:
+                    profile.self_embedding = self_emb
+                    profile.self_embedding_valid = is_valid_embedding(self_emb)
+                if pref_emb is not None:
+                    profile.pref_embedding = pref_emb
+                    profile.pref_embedding_valid = is_valid_embedding(pref_emb)
+            db.commit()
+            bump_pool_versions(ids)
+            updated += len(batch)
+            last_id = ids[-1]
+        logging.info("Re-embedded %d profiles", updated)
+    return updated
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--batch-size", type=int, default=500)
+    parser.add_argument("--reembed", action="store_true", help="re-embed profiles with missing or zero embeddings")
+    parser.add_argument("--all", action="store_true", help="with --reembed, re-embed every profile")
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO)
+    total = backfill(batch_size=args.batch_size)
+    print(f"Backfilled {total} profiles")
+    if args.reembed:
+        total = reembed(batch_size=args.batch_size, everything=args.all)
+        print(f"Re-embedded {total} profiles")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,55 @@
+"""
+Encode canonical fields and dynamic_features keys of existing profiles into
+`canonical_codes`/`dynamic_codes` (interned via feature_vocab) for profiles
+created before ingest did it.
+
+    python -m app.commands.backfill_feature_codes [--batch-size 500]
+"""
+import argparse
+import logging
+
+from sqlalchemy import or_, select
+
+from ..db import SessionLocal
+from ..db.models import Profile
+from ..feature_codes import encode_canonical, encode_dynamic
+from ..pool_versions import bump_pool_versions
+
+
+def backfill(batch_size: int = 500) -> int:
+    updated = 0
+    last_id = ""
+    while True:
+        with SessionLocal() as db:
+            batch = db.execute(
+                select(Profile)
+                .where(Profile.id > last_id)
+                .where(or_(Profile.canonical_codes.is_(None), Profile.dynamic_codes.is_(None)))
+                .order_by(Profile.id)
+                .limit(batch_size)
+            ).scalars().all()
+            if not batch:
+                break
+            for profile in batch:
+                profile.canonical_codes = encode_canonical(profile.canonical)
+                profile.dynamic_codes = encode_dynamic(profile.dynamic_features)
+            ids = [profile.id for profile in batch]
+            db.commit()
+            bump_pool_versions(ids)
+            updated += len(batch)
+            last_id = batch[-1].id
+        logging.info("Encoded %d profiles", updated)
+    return updated
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--batch-size", type=int, default=500)
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO)
+    total = backfill(batch_size=args.batch_size)
+    print(f"Encoded {total} profiles")
+
+
+if __name__ == "__main__":
+    main()
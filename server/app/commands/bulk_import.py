@@ -0,0 +1,78 @@
+"""
+Import a partner's profiles in bulk from a manifest (CSV or JSON Lines with
+file, who_am_i, looking_for, gender) or a directory of PDF/DOCX files, and
+report throughput. An interrupted import continues from its last committed
+batch with --resume.
+
+    python -m app.commands.bulk_import <manifest-or-directory> [--gender male --who-am-i ... --looking-for ...]
+    python -m app.commands.bulk_import --resume <import-id>
+"""
+import argparse
+import asyncio
+import logging
+import sys
+
+from ..bulk_import import arun_import, create_import
+from ..config import settings
+from ..db import SessionLocal
+from ..db.models import BulkImport
+from ..utils.extraction_pool import extraction_pool
+
+
+def _report(import_id: str) -> bool:
+    """Print the import's progress and throughput; whether it succeeded."""
+    with SessionLocal() as db:
+        run = db.get(BulkImport, import_id)
+    if run is None:
+        print(f"No bulk import {import_id}")
+        return False
+    rate = run.position / run.elapsed_seconds if run.elapsed_seconds else 0.0
+    print(
+        f"Import {run.id} {run.status}: {run.position}/{run.total} items, {run.imported} imported, "
+        f"{run.skipped} skipped, {run.failed} failed in {run.elapsed_seconds:.1f}s ({rate:.1f} items/s)"
+    )
+    for stage, seconds in (run.stage_seconds or {}).items():
+        print(f"  {stage:<10} {seconds:8.1f}s")
+    for error in (run.errors or [])[-10:]:
+        print(f"  {error['file']}: {error['error']}")
+    if run.error:
+        print(f"  stopped: {run.error}")
+    return run.status == "succeeded"
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("source", nargs="?", help="manifest file or directory")
+    parser.add_argument("--resume", metavar="IMPORT_ID", help="continue an interrupted import")
+    parser.add_argument("--who-am-i", help="for a directory without a manifest")
+    parser.add_argument("--looking-for", help="for a directory without a manifest")
+    parser.add_argument("--gender", help="for a directory without a manifest")
+    parser.add_argument("--batch-size", type=int, default=settings.bulk_import_batch_size)
+    args = parser.parse_args()
+    if bool(args.source) == bool(args.resume):
+        parser.error("give a source or --resume, not both")
+    logging.basicConfig(level=logging.INFO)
+
+    import_id = args.resume
+    if import_id is None:
+        defaults = {"who_am_i": args.who_am_i, "looking_for": args.looking_for, "gender": args.gender}
+        with SessionLocal() as db:
+            try:
+                import_id = create_import(db, args.source, {k: v for k, v in defaults.items() if v}).id
+            except (OSError, ValueError) as exc:
+                parser.error(str(exc))
+        print(f"Import {import_id} created; resume with --resume {import_id}")
+    try:
+        asyncio.run(arun_import(import_id, batch_size=args.batch_size))
+    except KeyboardInterrupt:
+        pass
+    except Exception:
+        logging.exception("Import %s stopped", import_id)
+    finally:
+        extraction_pool.shutdown()
+    if not _report(import_id):
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,36 @@
+"""
+Run ingest workers outside the API, e.g. on another host or with
+INGEST_WORKERS=0 on the API. Workers share the `ingest_jobs` table with
+any other worker process (claims use FOR UPDATE SKIP LOCKED).
+
+    python -m app.commands.ingest_worker [--workers 4]
+"""
+import argparse
+import asyncio
+import logging
+
+from ..config import settings
+from ..ingest_queue import ingest_workers
+
+
+async def run(workers: int) -> None:
+    ingest_workers.start(workers)
+    try:
+        await asyncio.Event().wait()
+    finally:
+        await ingest_workers.stop()
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--workers", type=int, default=max(settings.ingest_workers, 1))
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO)
+    try:
+        asyncio.run(run(args.workers))
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,82 @@
+"""
+Look up the place names the gazetteer did not know (recorded as pending in
+geocode_cache while GEOCODER_NOMINATIM_FALLBACK is off) on Nominatim, one
+request per second, then set coordinates on profiles stored without any
+whose city now resolves. Each batch that located profiles bumps their pool
+versions, so API processes pick up the coordinates on their next index
+refresh and drop cached matches.
+
+    python -m app.commands.resolve_geocodes [--limit 500] [--batch-size 500]
+"""
+import argparse
+import logging
+from typing import Tuple
+
+from sqlalchemy import select
+
+from ..db import SessionLocal
+from ..db.models import GeocodeCache, Profile
+from ..pool_versions import bump_pool_versions
+from ..utils.geo import geocode_city, nominatim_search, record_geocode
+
+
+def resolve_pending(limit: int = 500) -> Tuple[int, int]:
+    """Found and not-found counts; names whose lookup errored stay pending."""
+    with SessionLocal() as db:
+        keys = db.execute(
+            select(GeocodeCache.query).where(GeocodeCache.source == "pending").order_by(GeocodeCache.created_at).limit(limit)
+        ).scalars().all()
+    found = missed = 0
+    for key in keys:
+        try:
+            coords = nominatim_search(key)
+        except Exception as exc:  # noqa: BLE001
+            logging.warning("Geocode lookup for %r failed: %s", key, exc)
+            continue
+        record_geocode(key, coords, "nominatim" if coords else "miss")
+        found += coords is not None
+        missed += coords is None
+    return found, missed
+
+
+def backfill_profiles(batch_size: int = 500) -> int:
+    updated = 0
+    last_id = ""
+    while True:
+        with SessionLocal() as db:
+            batch = db.execute(
+                select(Profile)
+                .where(Profile.id > last_id)
+                .where(Profile.location_lat.is_(None))
+                .order_by(Profile.id)
+                .limit(batch_size)
+            ).scalars().all()
+            if not batch:
+                break
+            located = []
+            for profile in batch:
+                coords = geocode_city((profile.canonical or {}).get("city"), network=False)
+                if coords is not None:
+                    profile.location_lat, profile.location_lon = coords
+                    located.append(profile.id)
+            updated += len(located)
+            db.commit()
+            if located:
+                bump_pool_versions(located)
+            last_id = batch[-1].id
+    return updated
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--limit", type=int, default=500, help="pending names to look up this run")
+    parser.add_argument("--batch-size", type=int, default=500)
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO)
+    found, missed = resolve_pending(limit=args.limit)
+    print(f"Resolved {found} place names ({missed} not found)")
+    print(f"Located {backfill_profiles(batch_size=args.batch_size)} profiles")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,4 +1,5 @@
 from functools import lru_cache
+from typing import Literal
 
 from pydantic import Field
 from pydantic_settings import BaseSettings, SettingsConfigDict
@@ -19,6 +20,98 @@ class Settings(BaseSettings):
     openai_api_key: str = Field(default="", alias="OPENAI_API_KEY")
     embedding_dim: int = Field(default=1536, alias="EMBEDDING_DIM")
     upload_dir: str = Field(default="uploads", alias="UPLOAD_DIR")
+    max_upload_bytes: int = Field(default=10 * 1024 * 1024, alias="MAX_UPLOAD_BYTES")
+
+    # Candidate retrieval for top_matches: "memory" scores the in-process
+    # embedding index, "scan" scores every opposite-gender row in Postgres,
+    # "ann" scores only the union of the pgvector ANN shortlists.
+    match_retrieval: Literal["memory", "scan", "ann"] = Field(default="memory", alias="MATCH_RETRIEVAL")
+    # How often a "memory" index applies profile writes made by other processes
+    match_index_refresh_seconds: float = Field(default=5.0, alias="MATCH_INDEX_REFRESH_SECONDS")
+    ann_index_type: Literal["hnsw", "ivfflat"] = Field(default="hnsw", alias="ANN_INDEX_TYPE")
+    ann_shortlist_size: int = Field(default=200, alias="ANN_SHORTLIST_SIZE")
+    ann_ef_search: int = Field(default=100, alias="ANN_EF_SEARCH")
+    ann_ivfflat_lists: int = Field(default=100, alias="ANN_IVFFLAT_LISTS")
+    ann_ivfflat_probes: int = Field(default=10, alias="ANN_IVFFLAT_PROBES")
+
+    # Opt-in proximity component of top_matches, decaying linearly to 0 at
+    # MATCH_DISTANCE_DECAY_KM; the default weight 0 leaves scores as they were
+    match_distance_weight: float = Field(default=0.0, alias="MATCH_DISTANCE_WEIGHT")
+    match_distance_decay_km: float = Field(default=1500.0, alias="MATCH_DISTANCE_DECAY_KM")
+    # Grid cell size, in degrees, of the memory index's spatial prefilter for radius queries
+    match_grid_cell_degrees: float = Field(default=1.0, alias="MATCH_GRID_CELL_DEGREES")
+
+    # Dynamic feature key overlap: "exact" Jaccard from uint64 bitsets, or
+    # "minhash" signatures (approximate, fixed size however large the vocab grows)
+    dynamic_similarity: Literal["exact", "minhash"] = Field(default="exact", alias="DYNAMIC_SIMILARITY")
+    minhash_permutations: int = Field(default=64, alias="MINHASH_PERMUTATIONS")
+
+    # Cache of top_matches results, keyed on the shared per-gender pool version
+    match_cache_backend: Literal["memory", "sqlite", "none"] = Field(default="memory", alias="MATCH_CACHE_BACKEND")
+    match_cache_path: str = Field(default="match_cache.sqlite3", alias="MATCH_CACHE_PATH")
+    match_cache_max_entries: int = Field(default=10000, alias="MATCH_CACHE_MAX_ENTRIES")
+    match_cache_ttl_seconds: int = Field(default=600, alias="MATCH_CACHE_TTL_SECONDS")
+
+    # AI rerank: split candidates into shards of this size scored by parallel
+    # LLM calls (0 = one call for all), with at most this many calls in flight
+    rerank_shard_size: int = Field(default=0, alias="RERANK_SHARD_SIZE")
+    rerank_max_concurrency: int = Field(default=4, alias="RERANK_MAX_CONCURRENCY")
+
+    # Prompt token budgets per LLM call; long free-text fields are trimmed to fit
+    rerank_prompt_token_budget: int = Field(default=8000, alias="RERANK_PROMPT_TOKEN_BUDGET")
+    extraction_prompt_token_budget: int = Field(default=2000, alias="EXTRACTION_PROMPT_TOKEN_BUDGET")
+
+    # OpenAI scheduler: requests/min and tokens/min budgets per model (set a
+    # little under the account's limits), and retries with jittered backoff
+    openai_chat_rpm: int = Field(default=500, alias="OPENAI_CHAT_RPM")
+    openai_chat_tpm: int = Field(default=200000, alias="OPENAI_CHAT_TPM")
+    openai_embedding_rpm: int = Field(default=3000, alias="OPENAI_EMBEDDING_RPM")
+    openai_embedding_tpm: int = Field(default=1000000, alias="OPENAI_EMBEDDING_TPM")
+    openai_max_retries: int = Field(default=5, alias="OPENAI_MAX_RETRIES")
+    openai_backoff_base_seconds: float = Field(default=0.5, alias="OPENAI_BACKOFF_BASE_SECONDS")
+    openai_backoff_max_seconds: float = Field(default=30.0, alias="OPENAI_BACKOFF_MAX_SECONDS")
+
+    # Background ingestion: worker tasks per API process (0 = only standalone
+    # `python -m app.commands.ingest_worker` processes), idle poll interval,
+    # retries per stage, and how long a silent worker keeps its claim
+    ingest_workers: int = Field(default=2, alias="INGEST_WORKERS")
+    ingest_poll_seconds: float = Field(default=1.0, alias="INGEST_POLL_SECONDS")
+    ingest_stage_retries: int = Field(default=3, alias="INGEST_STAGE_RETRIES")
+    ingest_job_lease_seconds: int = Field(default=600, alias="INGEST_JOB_LEASE_SECONDS")
+    ingest_max_attempts: int = Field(default=3, alias="INGEST_MAX_ATTEMPTS")
+
+    # Upload text extraction: worker processes (0 = parse in-process, without
+    # a timeout), time limit per parse task once it runs, PDF page cap, and pages per task
+    # when one PDF is split across workers
+    extraction_workers: int = Field(default=2, alias="EXTRACTION_WORKERS")
+    extraction_timeout_seconds: float = Field(default=30.0, alias="EXTRACTION_TIMEOUT_SECONDS")
+    extraction_max_pages: int = Field(default=50, alias="EXTRACTION_MAX_PAGES")
+    extraction_pages_per_task: int = Field(default=10, alias="EXTRACTION_PAGES_PER_TASK")
+
+    # Geocoding: city gazetteer CSV (empty = the bundled app/data/cities.csv),
+    # fuzzy match threshold (0-1), and whether names it does not know are
+    # looked up on Nominatim during ingest. Otherwise they are recorded in
+    # geocode_cache for `make resolve-geocodes`.
+    geocoder_gazetteer_path: str = Field(default="", alias="GEOCODER_GAZETTEER_PATH")
+    geocoder_fuzzy_cutoff: float = Field(default=0.85, alias="GEOCODER_FUZZY_CUTOFF")
+    geocoder_nominatim_fallback: bool = Field(default=False, alias="GEOCODER_NOMINATIM_FALLBACK")
+
+    # Bulk imports: directory that POST /profile/imports may read sources
+    # from, and manifest items per batch (one transaction and checkpoint each)
+    bulk_import_root: str = Field(default="imports", alias="BULK_IMPORT_ROOT")
+    bulk_import_batch_size: int = Field(default=100, alias="BULK_IMPORT_BATCH_SIZE")
+
+    # Embedding provider: "openai", "local" (deterministic feature hashing,
+    # offline; for load tests and outages) or "auto" (openai when an API key
+    # is set, else local). Vectors from different providers are not comparable.
+    embedding_provider: Literal["auto", "openai", "local"] = Field(default="auto", alias="EMBEDDING_PROVIDER")
+
+    # Content-addressed cache of embeddings, keyed by (model, dimension, text)
+    embedding_cache_backend: Literal["sqlite", "memory", "none"] = Field(
+        default="sqlite", alias="EMBEDDING_CACHE_BACKEND"
+    )
+    embedding_cache_path: str = Field(default="embedding_cache.sqlite3", alias="EMBEDDING_CACHE_PATH")
+    embedding_cache_max_entries: int = Field(default=100000, alias="EMBEDDING_CACHE_MAX_ENTRIES")
 
 
 @lru_cache
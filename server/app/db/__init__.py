@@ -1,5 +1,5 @@
 from .session import Base, SessionLocal, engine, get_db
-from .models import Profile
+from .models import BulkImport, FeatureVocab, GeocodeCache, IngestJob, PoolVersion, Profile, RerankScore
 
 __all__ = [
     "Base",
@@ -7,4 +7,10 @@ __all__ = [
     "engine",
     "get_db",
     "Profile",
+    "FeatureVocab",
+    "RerankScore",
+    "IngestJob",
+    "BulkImport",
+    "GeocodeCache",
+    "PoolVersion",
 ]
@@ -1,4 +1,18 @@
-from sqlalchemy import Column, String, DateTime, Text, Float
+from sqlalchemy import (
+    Boolean,
+    Column,
+    DateTime,
+    Float,
+    Index,
+    Integer,
+    JSON,
+    LargeBinary,
+    String,
+    Text,
+    UniqueConstraint,
+    text,
+)
+from sqlalchemy.orm import deferred
 from sqlalchemy.sql import func
 from sqlalchemy.dialects.postgresql import JSONB
 from pgvector.sqlalchemy import Vector
@@ -6,16 +20,52 @@ from pgvector.sqlalchemy import Vector
 from .session import Base
 from ..config import settings
 
+# JSONB on Postgres, plain JSON elsewhere (SQLite for offline benchmarks)
+JSONType = JSON().with_variant(JSONB(), "postgresql")
+
+# Genders that matching queries against; each gets its own partial ANN index so
+# the gender filter does not cut into the index scan's recall.
+MATCHABLE_GENDERS = ("male", "female")
+
+
+def _vector_indexes() -> tuple[Index, ...]:
+    if settings.ann_index_type == "ivfflat":
+        index_with = {"lists": settings.ann_ivfflat_lists}
+    else:
+        index_with = {"m": 16, "ef_construction": 64}
+    return tuple(
+        Index(
+            f"idx_profiles_{column}_{gender}_{settings.ann_index_type}_ip",
+            column,
+            postgresql_using=settings.ann_index_type,
+            postgresql_with=index_with,
+            # Inner product: embeddings are unit length, so it ranks like cosine
+            postgresql_ops={column: "vector_ip_ops"},
+            postgresql_where=text(f"gender = '{gender}'"),
+        ).ddl_if(dialect="postgresql")
+        for column in ("self_embedding", "pref_embedding")
+        for gender in MATCHABLE_GENDERS
+    )
+
 
 class Profile(Base):
     __tablename__ = "profiles"
+    __table_args__ = _vector_indexes() + (
+        Index("idx_profiles_content_hash", "content_hash"),
+        # Bounding-box prefilter of radius-limited matching
+        Index("idx_profiles_location", "gender", "location_lat", "location_lon"),
+        # Rows stamped since a partition version, read by the in-memory index refresh
+        Index("idx_profiles_pool_version", "gender", "pool_version"),
+    )
 
     id = Column(String, primary_key=True)
     gender = Column(String, nullable=False)
 
-    # Raw
+    # Raw (pdf_text is large and only needed at ingest, so it loads on access)
     pdf_path = Column(String, nullable=True)
-    pdf_text = Column(Text, nullable=True)
+    # SHA-256 of the uploaded file; later uploads of the same file reuse its extraction
+    content_hash = Column(String, nullable=True)
+    pdf_text = deferred(Column(Text, nullable=True))
     location_lat = Column(Float, nullable=True)
     location_lon = Column(Float, nullable=True)
 
@@ -23,11 +73,140 @@ class Profile(Base):
     looking_for = Column(Text, nullable=False)
 
     # Canonical + dynamic features from LLM
-    canonical = Column(JSONB, nullable=True)         # standard fields (age, city, etc.)
-    dynamic_features = Column(JSONB, nullable=True)  # free-form traits
+    canonical = Column(JSONType, nullable=True)         # standard fields (age, city, etc.)
+    dynamic_features = Column(JSONType, nullable=True)  # free-form traits
+    # dynamic_features keys interned to feature_vocab codes: sorted packed int32
+    dynamic_codes = Column(LargeBinary, nullable=True)
+    # Canonical match keys interned to feature_vocab codes: packed int32, 0 = missing
+    canonical_codes = Column(LargeBinary, nullable=True)
 
-    # Embeddings
+    # Embeddings, stored L2-normalised so cosine similarity is a dot product.
+    # *_valid: True = unit vector, False = zero/failed embedding, NULL = not yet backfilled.
     self_embedding = Column(Vector(settings.embedding_dim), nullable=True)
     pref_embedding = Column(Vector(settings.embedding_dim), nullable=True)
+    self_embedding_valid = Column(Boolean, nullable=True)
+    pref_embedding_valid = Column(Boolean, nullable=True)
+
+    # pool_versions version whose bump announced the last write (see bump_pool_versions)
+    pool_version = Column(Integer, nullable=True)
+
+    created_at = Column(DateTime(timezone=True), server_default=func.now())
+    updated_at = Column(DateTime(timezone=True), server_default=func.now(), onupdate=func.now())
+
+
+class PoolVersion(Base):
+    """
+    Version of a gender partition's candidate pool, bumped after every
+    profile write so all processes can tell their cached matches and
+    in-memory index are behind.
+    """
+
+    __tablename__ = "pool_versions"
+
+    partition = Column(String, primary_key=True)
+    version = Column(Integer, nullable=False, default=0)
+    updated_at = Column(DateTime(timezone=True), server_default=func.now(), onupdate=func.now())
+
+
+class FeatureVocab(Base):
+    """Interned feature values; `code` is what profiles store instead of the text."""
+
+    __tablename__ = "feature_vocab"
+    __table_args__ = (UniqueConstraint("kind", "value", name="uq_feature_vocab_kind_value"),)
+
+    code = Column(Integer, primary_key=True, autoincrement=True)
+    kind = Column(String, nullable=False)
+    value = Column(String, nullable=False)
+
+
+class RerankScore(Base):
+    """
+    LLM rerank verdict for one (seeker, candidate) pair. `content_version`
+    hashes both profiles as shown to the model and `prompt_version` the prompt
+    and model, so editing either makes old rows unreachable; storing the
+    pair's next verdict deletes them.
+    """
+
+    __tablename__ = "rerank_scores"
+
+    seeker_id = Column(String, primary_key=True)
+    candidate_id = Column(String, primary_key=True)
+    content_version = Column(String, primary_key=True)
+    prompt_version = Column(String, primary_key=True)
+    score = Column(Float, nullable=False)
+    reason = Column(Text, nullable=True)
+    pref_to_self_reason = Column(Text, nullable=True)
+    self_to_pref_reason = Column(Text, nullable=True)
+    location_reason = Column(Text, nullable=True)
+    location_open = Column(Boolean, nullable=True)
+    created_at = Column(DateTime(timezone=True), server_default=func.now())
+
+
+class IngestJob(Base):
+    """
+    One queued profile upload. Workers claim `queued` rows (and `running`
+    rows whose lease expired) with FOR UPDATE SKIP LOCKED; the profile it
+    creates gets the job's id.
+    """
+
+    __tablename__ = "ingest_jobs"
+    __table_args__ = (Index("idx_ingest_jobs_status_created", "status", "created_at"),)
+
+    id = Column(String, primary_key=True)
+    status = Column(String, nullable=False, default="queued")  # queued | running | succeeded | failed
+    stage = Column(String, nullable=True)  # running stages in pipeline order, e.g. extract+embed
+    attempts = Column(Integer, nullable=False, default=0)
+    who_am_i = Column(Text, nullable=False)
+    looking_for = Column(Text, nullable=False)
+    gender = Column(String, nullable=False)
+    pdf_path = Column(String, nullable=False)
+    content_hash = Column(String, nullable=True)
+    profile_id = Column(String, nullable=True)
+    error = Column(Text, nullable=True)
+    locked_at = Column(DateTime(timezone=True), nullable=True)
+    created_at = Column(DateTime(timezone=True), server_default=func.now())
+    updated_at = Column(DateTime(timezone=True), server_default=func.now(), onupdate=func.now())
+
+
+class BulkImport(Base):
+    """
+    One bulk import run. `position` counts the manifest items already
+    handled; it advances in the same transaction as each batch's profiles,
+    so a resumed import continues exactly where the last commit left off.
+    """
+
+    __tablename__ = "bulk_imports"
+
+    id = Column(String, primary_key=True)
+    source = Column(Text, nullable=False)  # manifest file or directory
+    # who_am_i / looking_for / gender for directories without a manifest
+    defaults = Column(JSONType, nullable=True)
+    status = Column(String, nullable=False, default="queued")  # queued | running | succeeded | failed
+    total = Column(Integer, nullable=False, default=0)
+    position = Column(Integer, nullable=False, default=0)
+    imported = Column(Integer, nullable=False, default=0)
+    skipped = Column(Integer, nullable=False, default=0)  # already imported with the same answers
+    failed = Column(Integer, nullable=False, default=0)
+    errors = Column(JSONType, nullable=True)  # [{"file", "error"}], most recent last
+    error = Column(Text, nullable=True)  # why the run itself stopped
+    elapsed_seconds = Column(Float, nullable=False, default=0.0)
+    stage_seconds = Column(JSONType, nullable=True)  # time spent per stage, summed over batches
+    created_at = Column(DateTime(timezone=True), server_default=func.now())
+    updated_at = Column(DateTime(timezone=True), server_default=func.now(), onupdate=func.now())
+
+
+class GeocodeCache(Base):
+    """
+    Geocoding results for place names the gazetteer does not know, shared by
+    every worker. `source` is `nominatim` (found), `miss` (not found) or
+    `pending` (seen offline, not looked up yet).
+    """
+
+    __tablename__ = "geocode_cache"
 
+    query = Column(String, primary_key=True)  # gazetteer.normalize_place'd parts joined with ", "
+    lat = Column(Float, nullable=True)
+    lon = Column(Float, nullable=True)
+    source = Column(String, nullable=False)
     created_at = Column(DateTime(timezone=True), server_default=func.now())
+    updated_at = Column(DateTime(timezone=True), server_default=func.now(), onupdate=func.now())
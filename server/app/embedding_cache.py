@@ -0,0 +1,183 @@
+import hashlib
+import sqlite3
+import threading
+import time
+import unicodedata
+from collections import OrderedDict
+from typing import Any, Dict, Iterable, List, Protocol
+
+import numpy as np
+
+from .config import settings
+
+
+class EmbeddingCacheBackend(Protocol):
+    """Storage for embeddings keyed by content hash; values are float32 bytes."""
+
+    name: str
+
+    def get_many(self, keys: List[str]) -> Dict[str, bytes]: ...
+
+    def set_many(self, items: Dict[str, bytes]) -> None: ...
+
+    def __len__(self) -> int: ...
+
+
+class MemoryBackend:
+    """In-process LRU dict."""
+
+    name = "memory"
+
+    def __init__(self, max_entries: int) -> None:
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
+        self._entries: "OrderedDict[str, bytes]" = OrderedDict()
+
+    def get_many(self, keys: List[str]) -> Dict[str, bytes]:
+        found: Dict[str, bytes] = {}
+        with self._lock:
+            for key in keys:
+                value = self._entries.get(key)
+                if value is not None:
+                    self._entries.move_to_end(key)
+                    found[key] = value
+        return found
+
+    def set_many(self, items: Dict[str, bytes]) -> None:
+        with self._lock:
+            for key, value in items.items():
+                self._entries[key] = value
+                self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def __len__(self) -> int:
+        with self._lock:
+            return len(self._entries)
+
+
+class SQLiteBackend:
+    """
+    Local SQLite file, shared by every worker process on the host and kept
+    across restarts. LRU is tracked with a last-used timestamp.
+    """
+
+    name = "sqlite"
+
+    def __init__(self, path: str, max_entries: int) -> None:
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS embedding_cache ("
+            " key TEXT PRIMARY KEY, value BLOB NOT NULL, last_used REAL NOT NULL)"
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS idx_embedding_cache_last_used ON embedding_cache (last_used)")
+
+    def get_many(self, keys: List[str]) -> Dict[str, bytes]:
+        if not keys:
+            return {}
+        now = time.time()
+        placeholders = ",".join("?" * len(keys))
+        with self._lock:
+            rows = self._conn.execute(
+                f"SELECT key, value FROM embedding_cache WHERE key IN ({placeholders})", keys
+            ).fetchall()
+            if rows:
+                self._conn.executemany(
+                    "UPDATE embedding_cache SET last_used = ? WHERE key = ?", [(now, key) for key, _ in rows]
+                )
+        return {key: value for key, value in rows}
+
+    def set_many(self, items: Dict[str, bytes]) -> None:
+        if not items:
+            return
+        now = time.time()
+        with self._lock:
+            self._conn.execute("BEGIN")
+            self._conn.executemany(
+                "INSERT OR REPLACE INTO embedding_cache (key, value, last_used) VALUES (?, ?, ?)",
+                [(key, value, now) for key, value in items.items()],
+            )
+            self._conn.execute(
+                "DELETE FROM embedding_cache WHERE key IN ("
+                " SELECT key FROM embedding_cache ORDER BY last_used DESC LIMIT -1 OFFSET ?)",
+                (self.max_entries,),
+            )
+            self._conn.execute("COMMIT")
+
+    def __len__(self) -> int:
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM embedding_cache").fetchone()[0]
+
+
+def normalize_text(text: str) -> str:
+    """NFC with whitespace runs collapsed, so trivially different copies share a key."""
+    return " ".join(unicodedata.normalize("NFC", text).split())
+
+
+class EmbeddingCache:
+    """
+    Content-addressed cache of normalised embeddings, keyed by a hash of
+    (model, EMBEDDING_DIM, normalised text). Only successful embeddings are
+    stored, never failures or blank-input zero vectors.
+    """
+
+    def __init__(self, backend: EmbeddingCacheBackend | None) -> None:
+        self.backend = backend
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.bytes_saved = 0
+
+    @staticmethod
+    def key(model: str, text: str) -> str:
+        payload = f"{model}\0{settings.embedding_dim}\0{normalize_text(text)}"
+        return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+    def get_many(self, model: str, texts: Iterable[str]) -> Dict[str, List[float]]:
+        """Cached vectors for whichever of `texts` are present, keyed by text."""
+        texts = list(texts)
+        if self.backend is None or not texts:
+            return {}
+        keys = {text: self.key(model, text) for text in texts}
+        found = self.backend.get_many(list(set(keys.values())))
+        out = {text: np.frombuffer(found[key], dtype=np.float32).tolist() for text, key in keys.items() if key in found}
+        with self._lock:
+            self.hits += len(out)
+            self.misses += len(texts) - len(out)
+            # Request text not uploaded plus float32 vectors not downloaded
+            self.bytes_saved += sum(len(text.encode("utf-8")) + len(found[keys[text]]) for text in out)
+        return out
+
+    def set_many(self, model: str, vectors: Dict[str, List[float]]) -> None:
+        if self.backend is None or not vectors:
+            return
+        self.backend.set_many(
+            {self.key(model, text): np.asarray(vec, dtype=np.float32).tobytes() for text, vec in vectors.items()}
+        )
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            hits, misses, saved = self.hits, self.misses, self.bytes_saved
+        total = hits + misses
+        return {
+            "backend": self.backend.name if self.backend is not None else "none",
+            "entries": len(self.backend) if self.backend is not None else 0,
+            "hits": hits,
+            "misses": misses,
+            "hit_rate": hits / total if total else None,
+            "bytes_saved": saved,
+        }
+
+
+def _build_backend() -> EmbeddingCacheBackend | None:
+    if settings.embedding_cache_backend == "sqlite":
+        return SQLiteBackend(settings.embedding_cache_path, max_entries=settings.embedding_cache_max_entries)
+    if settings.embedding_cache_backend == "memory":
+        return MemoryBackend(max_entries=settings.embedding_cache_max_entries)
+    return None
+
+
+embedding_cache = EmbeddingCache(_build_backend())
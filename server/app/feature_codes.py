@@ -0,0 +1,210 @@
+import threading
+from functools import lru_cache
+from typing import Any, Dict, Iterable, Sequence
+
+import numpy as np
+from sqlalchemy import select, tuple_
+from sqlalchemy.exc import IntegrityError
+
+from .config import settings
+from .db.models import FeatureVocab
+from .db.session import SessionLocal
+
+CANONICAL_KEYS = ("city", "state", "country", "education", "profession", "religion", "caste")
+DYNAMIC_KIND = "dynamic"
+
+MISSING_CODE = 0
+
+# MinHash uses h(x) = (a * x + b) mod p with p the Mersenne prime 2^31 - 1
+_MINHASH_PRIME = (1 << 31) - 1
+
+_cache: Dict[tuple[str, str], int] = {}
+_cache_lock = threading.Lock()
+
+
+def normalize_value(value: Any) -> str:
+    return str(value or "").strip().lower()
+
+
+def _canonical_kind(key: str) -> str:
+    return f"canonical:{key}"
+
+
+def intern(pairs: Iterable[tuple[str, str]]) -> Dict[tuple[str, str], int]:
+    """
+    Map (kind, value) pairs to feature_vocab codes, inserting unseen ones.
+
+    Runs in its own committed transaction so a code is durable before any
+    profile stores it; a rolled-back ingest can never leave a cached code that
+    other workers would assign differently.
+    """
+    wanted = {(kind, value) for kind, value in pairs if value}
+    with _cache_lock:
+        codes = {pair: _cache[pair] for pair in wanted if pair in _cache}
+    missing = wanted - codes.keys()
+    if not missing:
+        return codes
+
+    with SessionLocal() as db:
+        for row in db.execute(
+            select(FeatureVocab.kind, FeatureVocab.value, FeatureVocab.code).where(
+                tuple_(FeatureVocab.kind, FeatureVocab.value).in_(missing)
+            )
+        ):
+            codes[(row.kind, row.value)] = row.code
+        for kind, value in sorted(missing - codes.keys()):
+            entry = FeatureVocab(kind=kind, value=value)
+            try:
+                with db.begin_nested():
+                    db.add(entry)
+                codes[(kind, value)] = entry.code
+            except IntegrityError:
+                # Another worker interned it first
+                codes[(kind, value)] = db.execute(
+                    select(FeatureVocab.code)
+                    .where(FeatureVocab.kind == kind)
+                    .where(FeatureVocab.value == value)
+                ).scalar_one()
+        db.commit()
+
+    with _cache_lock:
+        for pair in missing:
+            _cache[pair] = codes[pair]
+    return codes
+
+
+def encode_canonical(canonical: Dict[str, Any] | None) -> bytes:
+    """Pack the canonical match keys as int32 codes in CANONICAL_KEYS order."""
+    canonical = canonical or {}
+    pairs = [(_canonical_kind(key), normalize_value(canonical.get(key))) for key in CANONICAL_KEYS]
+    codes = intern(pairs)
+    out = np.array([codes.get(pair, MISSING_CODE) for pair in pairs], dtype=np.int32)
+    return out.tobytes()
+
+
+def encode_dynamic(dynamic: Dict[str, Any] | None) -> bytes:
+    """Sorted int32 codes of the dynamic_features keys (their values are not compared)."""
+    pairs = [(DYNAMIC_KIND, str(key)) for key in (dynamic or {}).keys()]
+    codes = intern(pairs)
+    return np.unique(np.array([codes[pair] for pair in pairs if pair in codes], dtype=np.int32)).tobytes()
+
+
+def decode_dynamic(blob: bytes | None) -> np.ndarray | None:
+    if blob is None:
+        return None
+    return np.frombuffer(blob, dtype=np.int32)
+
+
+class DynamicKeyBits:
+    """
+    Process-wide layout of dynamic key codes onto dense bit positions.
+
+    Vocab codes are shared across kinds and grow without bound, so bitsets use
+    positions assigned here in first-seen order; a matrix built earlier is
+    simply narrower, and any bit beyond its width is zero for its rows.
+    """
+
+    def __init__(self) -> None:
+        self._lock = threading.Lock()
+        self._positions: Dict[int, int] = {}
+
+    @property
+    def words(self) -> int:
+        return (len(self._positions) + 63) // 64
+
+    def positions(self, codes: np.ndarray) -> np.ndarray:
+        with self._lock:
+            out = np.empty(len(codes), dtype=np.int64)
+            for i, code in enumerate(codes.tolist()):
+                pos = self._positions.get(code)
+                if pos is None:
+                    pos = self._positions[code] = len(self._positions)
+                out[i] = pos
+            return out
+
+    def bitset(self, codes: np.ndarray, words: int | None = None) -> np.ndarray:
+        """uint64 bitset of `codes`; bits past `words` words are dropped."""
+        positions = self.positions(codes)
+        words = self.words if words is None else words
+        out = np.zeros(words, dtype=np.uint64)
+        positions = positions[positions < words * 64]
+        np.bitwise_or.at(out, positions // 64, np.left_shift(np.uint64(1), (positions % 64).astype(np.uint64)))
+        return out
+
+
+dynamic_key_bits = DynamicKeyBits()
+
+
+@lru_cache
+def _minhash_params(num_perm: int) -> tuple[np.ndarray, np.ndarray]:
+    rng = np.random.default_rng(20240521)
+    a = rng.integers(1, _MINHASH_PRIME, size=num_perm, dtype=np.int64)
+    b = rng.integers(0, _MINHASH_PRIME, size=num_perm, dtype=np.int64)
+    return a, b
+
+
+def minhash_signature(codes: np.ndarray, num_perm: int | None = None) -> np.ndarray:
+    """
+    MinHash signature of a code set; the share of equal slots between two
+    signatures estimates their Jaccard similarity. Empty sets get all-max slots.
+    """
+    num_perm = num_perm or settings.minhash_permutations
+    if len(codes) == 0:
+        return np.full(num_perm, _MINHASH_PRIME, dtype=np.uint32)
+    a, b = _minhash_params(num_perm)
+    hashed = (np.outer(a, codes.astype(np.int64)) + b[:, None]) % _MINHASH_PRIME
+    return hashed.min(axis=1).astype(np.uint32)
+
+
+def canonical_code_matrix(blobs: Sequence[bytes | None]) -> tuple[np.ndarray, np.ndarray]:
+    """
+    Stack packed canonical codes into an (N, len(CANONICAL_KEYS)) int32 matrix.
+    Also returns a mask of rows that had codes (legacy rows stay all-missing).
+    """
+    width = len(CANONICAL_KEYS)
+    mat = np.zeros((len(blobs), width), dtype=np.int32)
+    has_codes = np.zeros(len(blobs), dtype=bool)
+    for i, blob in enumerate(blobs):
+        if blob is not None:
+            mat[i] = np.frombuffer(blob, dtype=np.int32, count=width)
+            has_codes[i] = True
+    return mat, has_codes
+
+
+def decode_canonical(blob: bytes | None) -> np.ndarray | None:
+    if blob is None:
+        return None
+    return np.frombuffer(blob, dtype=np.int32, count=len(CANONICAL_KEYS))
+
+
+def dynamic_code_matrices(
+    code_sets: Sequence[np.ndarray | None],
+) -> tuple[np.ndarray, np.ndarray, np.ndarray, np.ndarray]:
+    """
+    Columnar dynamic-key data for a batch: (bits, sizes, signatures, has_codes).
+    Only the representation the configured DYNAMIC_SIMILARITY mode reads is
+    filled; the other comes back with zero width.
+    """
+    n = len(code_sets)
+    sizes = np.zeros(n, dtype=np.int32)
+    has_codes = np.zeros(n, dtype=bool)
+    for i, codes in enumerate(code_sets):
+        if codes is not None:
+            has_codes[i] = True
+            sizes[i] = len(codes)
+    if settings.dynamic_similarity == "minhash":
+        bits = np.zeros((n, 0), dtype=np.uint64)
+        signatures = np.zeros((n, settings.minhash_permutations), dtype=np.uint32)
+        for i, codes in enumerate(code_sets):
+            if codes is not None:
+                signatures[i] = minhash_signature(codes)
+    else:
+        signatures = np.zeros((n, 0), dtype=np.uint32)
+        for codes in code_sets:
+            if codes is not None:
+                dynamic_key_bits.positions(codes)
+        bits = np.zeros((n, dynamic_key_bits.words), dtype=np.uint64)
+        for i, codes in enumerate(code_sets):
+            if codes is not None:
+                bits[i] = dynamic_key_bits.bitset(codes, bits.shape[1])
+    return bits, sizes, signatures, has_codes
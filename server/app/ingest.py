@@ -0,0 +1,230 @@
+import asyncio
+import logging
+from dataclasses import dataclass
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Sequence, Tuple
+from uuid import uuid4
+
+from sqlalchemy import select
+from sqlalchemy.orm import Session, undefer
+
+from .db import SessionLocal
+from .db.models import Profile
+from .feature_codes import encode_canonical, encode_dynamic
+from .match_index import embedding_index
+from .openai import (
+    aextract_features_from_pdf_text,
+    aget_embeddings,
+    build_pref_text,
+    build_self_text,
+    is_valid_embedding,
+)
+from .pool_versions import bump_pool_versions, partition_key
+from .utils.extraction_pool import extraction_pool
+from .utils.geo import lookup_city
+
+# Runs one named step of `aprepare_profile`; the ingest queue retries failed steps
+StageRunner = Callable[[str, Callable[[], Awaitable[Any]]], Awaitable[Any]]
+
+
+@dataclass(frozen=True)
+class ProcessedUpload:
+    """What an earlier ingest of the same file (by content hash) already computed."""
+
+    pdf_text: str
+    canonical: Dict[str, Any]
+    dynamic: Dict[str, Any]
+    who_am_i: str
+    looking_for: str
+    self_emb: Optional[List[float]]
+    pref_emb: Optional[List[float]]
+    coords: Optional[Tuple[float, float]]
+
+    def embeddings_for(self, who_am_i: str, looking_for: str) -> List[Optional[List[float]]]:
+        """[self, pref] embeddings that still apply to these answers, None where they differ."""
+        return [
+            self.self_emb if who_am_i == self.who_am_i else None,
+            self.pref_emb if looking_for == self.looking_for else None,
+        ]
+
+
+def find_processed_upload(db: Session, content_hash: Optional[str]) -> Optional[ProcessedUpload]:
+    """The newest profile built from the file with this hash whose feature extraction produced data."""
+    if not content_hash:
+        return None
+    profile = db.execute(
+        select(Profile)
+        .options(undefer(Profile.pdf_text))
+        .where(Profile.content_hash == content_hash, Profile.pdf_text.isnot(None))
+        .order_by(Profile.created_at.desc())
+        .limit(1)
+    ).scalars().first()
+    if profile is None or not profile.canonical:
+        return None
+    has_coords = profile.location_lat is not None and profile.location_lon is not None
+    return ProcessedUpload(
+        pdf_text=profile.pdf_text,
+        canonical=profile.canonical,
+        dynamic=profile.dynamic_features or {},
+        who_am_i=profile.who_am_i,
+        looking_for=profile.looking_for,
+        self_emb=[float(x) for x in profile.self_embedding] if profile.self_embedding_valid else None,
+        pref_emb=[float(x) for x in profile.pref_embedding] if profile.pref_embedding_valid else None,
+        coords=(profile.location_lat, profile.location_lon) if has_coords else None,
+    )
+
+
+def _find_processed_upload(content_hash: str) -> Optional[ProcessedUpload]:
+    with SessionLocal() as db:
+        return find_processed_upload(db, content_hash)
+
+
+def _missing(known: Sequence[Optional[List[float]]]) -> List[int]:
+    return [i for i, vec in enumerate(known) if vec is None]
+
+
+async def aembed_missing(
+    texts: Sequence[str], known: Sequence[Optional[List[float]]]
+) -> List[Optional[List[float]]]:
+    """Embeddings for `texts`, keeping the `known` ones and embedding only the rest."""
+    out = list(known)
+    todo = _missing(known)
+    if todo:
+        for i, vec in zip(todo, await aget_embeddings([texts[i] for i in todo])):
+            out[i] = vec
+    return out
+
+
+def _profile_fields(
+    *,
+    who_am_i: str,
+    looking_for: str,
+    gender: str,
+    pdf_path: str,
+    pdf_text: str,
+    canonical: Dict[str, Any],
+    dynamic: Dict[str, Any],
+    self_emb: Optional[List[float]],
+    pref_emb: Optional[List[float]],
+    coords: Optional[Tuple[float, float]],
+    profile_id: Optional[str] = None,
+    content_hash: Optional[str] = None,
+) -> Dict[str, Any]:
+    """
+    Column values for a new profile, feature codes and validity flags
+    included. The gender is stored as its partition key, the spelling the
+    ANN indexes and gender filters compare against.
+    """
+    return dict(
+        id=profile_id or str(uuid4()),
+        pdf_path=pdf_path,
+        content_hash=content_hash,
+        pdf_text=pdf_text,
+        location_lat=coords[0] if coords else None,
+        location_lon=coords[1] if coords else None,
+        who_am_i=who_am_i,
+        looking_for=looking_for,
+        gender=partition_key(gender),
+        canonical=canonical,
+        canonical_codes=encode_canonical(canonical),
+        dynamic_features=dynamic,
+        dynamic_codes=encode_dynamic(dynamic),
+        self_embedding=self_emb,
+        pref_embedding=pref_emb,
+        self_embedding_valid=is_valid_embedding(self_emb),
+        pref_embedding_valid=is_valid_embedding(pref_emb),
+    )
+
+
+def _publish_profiles(profiles: Sequence[Profile]) -> None:
+    """
+    Make committed profiles matchable: this process's in-memory index right
+    away, other processes' on their next refresh (via the pool version bump,
+    which also retires cached matches).
+    """
+    for profile in profiles:
+        if profile.self_embedding is None or profile.pref_embedding is None:
+            # Stored unmatchable rather than with a placeholder vector; `make reembed` retries it
+            logging.warning("Profile %s stored without embeddings; run `make reembed` once OpenAI recovers", profile.id)
+        if embedding_index.loaded:
+            embedding_index.add(profile)
+    bump_pool_versions(profile.id for profile in profiles)
+
+
+def _store_profile(db: Session, **fields: Any) -> Profile:
+    profile = Profile(**_profile_fields(**fields))
+    db.add(profile)
+    db.commit()
+    _publish_profiles([profile])
+    return profile
+
+
+async def _run(name: str, run: Callable[[], Awaitable[Any]]) -> Any:
+    return await run()
+
+
+async def _embed(texts: List[str], known: List[Optional[List[float]]]) -> List[List[float]]:
+    vectors = await aembed_missing(texts, known)
+    if any(vec is None for vec in vectors):
+        raise RuntimeError("embedding request failed")
+    return vectors
+
+
+async def _geocode(city: Any) -> Optional[Tuple[float, float]]:
+    if not city:
+        return None
+    return await asyncio.to_thread(lookup_city, city)
+
+
+async def aprepare_profile(
+    *,
+    who_am_i: str,
+    looking_for: str,
+    pdf_path: str,
+    content_hash: Optional[str] = None,
+    stage: StageRunner = _run,
+) -> Dict[str, Any]:
+    """
+    Text, features, embeddings and coordinates for a profile from a saved
+    upload, as `_store_profile` keyword arguments. The pref embedding only
+    needs `looking_for`, so it runs while the file is parsed and features are
+    extracted; geocoding runs alongside the self embedding. When a profile
+    was already built from the file with `content_hash`, its text, features,
+    coordinates and still-applicable embeddings are reused.
+
+    Each step goes through `stage(name, run)` ("extract", "embed",
+    "geocode"), which may call `run` again after a failure.
+    """
+    prior = await stage("extract", lambda: asyncio.to_thread(_find_processed_upload, content_hash)) if content_hash else None
+    known_self, known_pref = prior.embeddings_for(who_am_i, looking_for) if prior else [None, None]
+    pref_task = asyncio.create_task(stage("embed", lambda: _embed([build_pref_text(looking_for)], [known_pref])))
+    try:
+        if prior is not None:
+            pdf_text, canonical, dynamic = prior.pdf_text, prior.canonical, prior.dynamic
+        else:
+
+            async def extract() -> Tuple[str, Dict[str, Any]]:
+                text = await extraction_pool.aextract(pdf_path)
+                return text, await aextract_features_from_pdf_text(text, strict=True)
+
+            pdf_text, feat = await stage("extract", extract)
+            canonical = feat.get("canonical", {})
+            dynamic = feat.get("dynamic_features", {})
+
+        self_text = build_self_text(who_am_i, pdf_text, canonical, dynamic)
+        city = None if prior and prior.coords else canonical.get("city")
+        (self_emb,), coords = await asyncio.gather(
+            stage("embed", lambda: _embed([self_text], [known_self])),
+            stage("geocode", lambda: _geocode(city)),
+        )
+        (pref_emb,) = await pref_task
+    finally:
+        pref_task.cancel()
+
+    return dict(
+        pdf_text=pdf_text,
+        canonical=canonical,
+        dynamic=dynamic,
+        self_emb=self_emb,
+        pref_emb=pref_emb,
+        coords=coords or (prior.coords if prior else None),
+    )
@@ -0,0 +1,275 @@
+"""
+Background profile ingestion. `POST /profile` saves the upload and queues an
+`IngestJob`; workers claim jobs from the `ingest_jobs` table and run the
+extract, embed, geocode and persist stages, retrying each on its own. The
+stages overlap as in `aprepare_profile`: the pref embedding runs during
+extraction, and geocoding alongside the self embedding.
+
+The table is the queue: on Postgres, claims use FOR UPDATE SKIP LOCKED, so
+any number of API processes and `python -m app.commands.ingest_worker`
+processes can share it. Workers inside one process are also serialised by a
+lock, which keeps SQLite correct for single-node use.
+"""
+import asyncio
+import logging
+import random
+import threading
+from collections import Counter
+from dataclasses import dataclass
+from datetime import datetime, timedelta, timezone
+from typing import Any, Awaitable, Callable, Dict, List, Optional, TypeVar
+from uuid import uuid4
+
+from sqlalchemy import and_, func, or_, select
+from sqlalchemy.orm import Session
+
+from .config import settings
+from .db import SessionLocal
+from .db.models import IngestJob, Profile
+from .ingest import _store_profile, aprepare_profile
+from .utils.extraction_pool import ExtractionTimeout
+
+T = TypeVar("T")
+
+# Longest pause between retries of one stage
+_STAGE_BACKOFF_MAX_SECONDS = 30.0
+# Failures that would only repeat on a retry
+_PERMANENT_ERRORS = (FileNotFoundError, ExtractionTimeout)
+# Pipeline order, in which overlapping stages are listed
+_STAGES = ("extract", "embed", "geocode", "persist")
+
+_claim_lock = threading.Lock()
+
+
+class StageError(RuntimeError):
+    """A stage still failed after its retries; the job is marked failed."""
+
+    def __init__(self, stage: str, cause: BaseException) -> None:
+        super().__init__(f"{stage} failed: {cause}")
+        self.stage = stage
+
+
+@dataclass(frozen=True)
+class _ClaimedJob:
+    id: str
+    who_am_i: str
+    looking_for: str
+    gender: str
+    pdf_path: str
+    content_hash: Optional[str]
+
+
+def _now() -> datetime:
+    return datetime.now(timezone.utc)
+
+
+def enqueue_job(
+    db: Session,
+    *,
+    who_am_i: str,
+    looking_for: str,
+    gender: str,
+    pdf_path: str,
+    content_hash: Optional[str] = None,
+) -> IngestJob:
+    job = IngestJob(
+        id=str(uuid4()),
+        status="queued",
+        attempts=0,
+        who_am_i=who_am_i,
+        looking_for=looking_for,
+        gender=gender,
+        pdf_path=pdf_path,
+        content_hash=content_hash,
+    )
+    db.add(job)
+    db.commit()
+    ingest_workers.notify()
+    return job
+
+
+def claim_job() -> Optional[_ClaimedJob]:
+    """
+    Take the oldest queued job, or a running one whose worker stopped
+    heartbeating for INGEST_JOB_LEASE_SECONDS. Jobs already claimed
+    INGEST_MAX_ATTEMPTS times are failed instead of run again.
+    """
+    with _claim_lock, SessionLocal() as db:
+        while True:
+            now = _now()
+            stale = now - timedelta(seconds=settings.ingest_job_lease_seconds)
+            job = db.execute(
+                select(IngestJob)
+                .where(
+                    or_(
+                        IngestJob.status == "queued",
+                        and_(IngestJob.status == "running", IngestJob.locked_at < stale),
+                    )
+                )
+                .order_by(IngestJob.created_at)
+                .limit(1)
+                .with_for_update(skip_locked=True)
+            ).scalars().first()
+            if job is None:
+                return None
+            job.attempts += 1
+            if job.attempts > settings.ingest_max_attempts:
+                job.status = "failed"
+                job.error = job.error or f"abandoned by its worker {settings.ingest_max_attempts} times"
+                db.commit()
+                continue
+            job.status = "running"
+            job.locked_at = now
+            db.commit()
+            return _ClaimedJob(job.id, job.who_am_i, job.looking_for, job.gender, job.pdf_path, job.content_hash)
+
+
+def _update_job(job_id: str, **fields: Any) -> None:
+    """Set `fields` on the job and renew its lease."""
+    with SessionLocal() as db:
+        job = db.get(IngestJob, job_id)
+        for name, value in fields.items():
+            setattr(job, name, value)
+        job.locked_at = _now()
+        db.commit()
+
+
+class _RunningStages:
+    """
+    The stages of one job in progress. Stages overlap, so `IngestJob.stage`
+    names every running one in pipeline order ("extract+embed") rather than
+    whichever started last.
+    """
+
+    def __init__(self, job_id: str) -> None:
+        self.job_id = job_id
+        self._counts: Counter = Counter()
+        # Serialises the writes, so the last one committed is the current set
+        self._lock = asyncio.Lock()
+        self._reported: Optional[str] = None
+
+    def label(self) -> Optional[str]:
+        return "+".join(name for name in _STAGES if self._counts[name] > 0) or None
+
+    async def enter(self, name: str) -> None:
+        self._counts[name] += 1
+        await self._report()
+
+    async def leave(self, name: str) -> None:
+        self._counts[name] -= 1
+        await self._report()
+
+    async def _report(self) -> None:
+        async with self._lock:
+            label = self.label()
+            if label != self._reported:
+                await asyncio.to_thread(_update_job, self.job_id, stage=label)
+                self._reported = label
+
+
+async def _stage(job: _ClaimedJob, stages: _RunningStages, name: str, run: Callable[[], Awaitable[T]]) -> T:
+    """Run one stage, retrying failures with jittered exponential backoff."""
+    await stages.enter(name)
+    try:
+        attempt = 0
+        while True:
+            try:
+                return await run()
+            except Exception as exc:
+                if attempt >= settings.ingest_stage_retries or isinstance(exc, _PERMANENT_ERRORS):
+                    raise StageError(name, exc) from exc
+                attempt += 1
+                logging.info("Ingest job %s: %s failed (%s), retry %d", job.id, name, exc, attempt)
+                await asyncio.sleep(random.uniform(0, min(_STAGE_BACKOFF_MAX_SECONDS, 2**attempt)))
+    finally:
+        await stages.leave(name)
+
+
+def _persist(job: _ClaimedJob, **fields: Any) -> None:
+    with SessionLocal() as db:
+        # A retry after a commit that did land must not insert a second profile
+        if db.get(Profile, job.id) is None:
+            _store_profile(db, who_am_i=job.who_am_i, looking_for=job.looking_for, gender=job.gender, **fields)
+
+
+async def run_job(job: _ClaimedJob) -> None:
+    """Run every stage of `job` and record the outcome; the profile gets the job's id."""
+    stages = _RunningStages(job.id)
+    try:
+        fields = await aprepare_profile(
+            who_am_i=job.who_am_i,
+            looking_for=job.looking_for,
+            pdf_path=job.pdf_path,
+            content_hash=job.content_hash,
+            stage=lambda name, run: _stage(job, stages, name, run),
+        )
+        await _stage(
+            job,
+            stages,
+            "persist",
+            lambda: asyncio.to_thread(
+                _persist, job, pdf_path=job.pdf_path, profile_id=job.id, content_hash=job.content_hash, **fields
+            ),
+        )
+    except StageError as exc:
+        logging.warning("Ingest job %s failed: %s", job.id, exc)
+        await asyncio.to_thread(_update_job, job.id, status="failed", error=str(exc))
+        return
+    await asyncio.to_thread(_update_job, job.id, status="succeeded", stage=None, profile_id=job.id)
+
+
+class IngestWorkers:
+    """Asyncio worker tasks on the current event loop, woken early by `notify`."""
+
+    def __init__(self) -> None:
+        self._tasks: List[asyncio.Task] = []
+        self._wake: Optional[asyncio.Event] = None
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+
+    @property
+    def running(self) -> int:
+        return sum(not task.done() for task in self._tasks)
+
+    def start(self, count: int) -> None:
+        self._loop = asyncio.get_running_loop()
+        self._wake = asyncio.Event()
+        self._tasks = [asyncio.create_task(self._work(), name=f"ingest-worker-{i}") for i in range(count)]
+
+    async def stop(self) -> None:
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+
+    def notify(self) -> None:
+        """Wake idle workers now instead of at their next poll."""
+        if self._loop is not None and self._wake is not None:
+            self._loop.call_soon_threadsafe(self._wake.set)
+
+    async def _work(self) -> None:
+        while True:
+            try:
+                job = await asyncio.to_thread(claim_job)
+            except Exception:
+                logging.exception("Could not claim an ingest job")
+                job = None
+            if job is not None:
+                try:
+                    await run_job(job)
+                except Exception:
+                    # Left running; another worker reclaims it once the lease expires
+                    logging.exception("Ingest job %s crashed", job.id)
+                continue
+            try:
+                await asyncio.wait_for(self._wake.wait(), timeout=settings.ingest_poll_seconds)
+            except asyncio.TimeoutError:
+                pass
+            self._wake.clear()
+
+
+def job_counts(db: Session) -> Dict[str, int]:
+    rows = db.execute(select(IngestJob.status, func.count()).group_by(IngestJob.status)).all()
+    return {status: count for status, count in rows}
+
+
+ingest_workers = IngestWorkers()
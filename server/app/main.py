@@ -3,8 +3,12 @@ from fastapi.middleware.cors import CORSMiddleware
 from fastapi.responses import RedirectResponse
 from sqlalchemy import text
 
-from .db import Base, engine
-from .routers import profiles
+from .config import settings
+from .db import Base, Profile, SessionLocal, engine
+from .ingest_queue import ingest_workers
+from .match_index import embedding_index, index_refresher
+from .routers import profiles, stats
+from .utils.extraction_pool import extraction_pool
 
 app = FastAPI(
     title="AI Match Maker Backend",
@@ -33,9 +37,48 @@ def init_db():
         conn.execute(text("CREATE EXTENSION IF NOT EXISTS vector"))
     # Create tables if they do not exist (use migrations for production)
     Base.metadata.create_all(bind=engine)
+    # create_all skips indexes on tables that already exist; add any missing ANN indexes
+    for index in Profile.__table__.indexes:
+        index.create(bind=engine, checkfirst=True)
+
+
+@app.on_event("startup")
+def load_match_index():
+    if settings.match_retrieval != "memory":
+        return
+    with SessionLocal() as db:
+        embedding_index.load(db)
+
+
+@app.on_event("startup")
+async def start_match_index_refresh():
+    if settings.match_retrieval == "memory" and settings.match_index_refresh_seconds > 0:
+        index_refresher.start(settings.match_index_refresh_seconds)
+
+
+@app.on_event("shutdown")
+async def stop_match_index_refresh():
+    await index_refresher.stop()
+
+
+@app.on_event("startup")
+async def start_ingest_workers():
+    if settings.ingest_workers > 0:
+        ingest_workers.start(settings.ingest_workers)
+
+
+@app.on_event("shutdown")
+async def stop_ingest_workers():
+    await ingest_workers.stop()
+
+
+@app.on_event("shutdown")
+def stop_extraction_pool():
+    extraction_pool.shutdown()
 
 
 app.include_router(profiles.router)
+app.include_router(stats.router)
 
 
 @app.get("/", include_in_schema=False)
@@ -0,0 +1,188 @@
+import json
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Dict, List, Optional, Protocol
+
+from .config import settings
+from .pool_versions import partition_key
+
+Matches = List[Dict[str, Any]]
+
+
+class MatchCacheBackend(Protocol):
+    """Storage for cached `top_matches` results."""
+
+    name: str
+
+    def get(self, key: str) -> Optional[Matches]: ...
+
+    def set(self, key: str, value: Matches) -> None: ...
+
+    def __len__(self) -> int: ...
+
+
+class MemoryBackend:
+    """In-process LRU dict with per-entry TTL."""
+
+    name = "memory"
+
+    def __init__(self, max_entries: int, ttl_seconds: float) -> None:
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self._lock = threading.Lock()
+        self._entries: "OrderedDict[str, tuple[float, Matches]]" = OrderedDict()
+
+    def get(self, key: str) -> Optional[Matches]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            expires_at, value = entry
+            if expires_at < time.monotonic():
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return value
+
+    def set(self, key: str, value: Matches) -> None:
+        with self._lock:
+            self._entries[key] = (time.monotonic() + self.ttl_seconds, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def __len__(self) -> int:
+        with self._lock:
+            return len(self._entries)
+
+
+class SQLiteBackend:
+    """
+    Local SQLite file; entries are shared by every worker process on the
+    host. LRU is tracked with a last-used timestamp.
+    """
+
+    name = "sqlite"
+
+    def __init__(self, path: str, max_entries: int, ttl_seconds: float) -> None:
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS match_cache ("
+            " key TEXT PRIMARY KEY, value TEXT NOT NULL, expires_at REAL NOT NULL, last_used REAL NOT NULL)"
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS idx_match_cache_last_used ON match_cache (last_used)")
+
+    def get(self, key: str) -> Optional[Matches]:
+        now = time.time()
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT value, expires_at FROM match_cache WHERE key = ?", (key,)
+            ).fetchone()
+            if row is None:
+                return None
+            if row[1] < now:
+                self._conn.execute("DELETE FROM match_cache WHERE key = ?", (key,))
+                return None
+            self._conn.execute("UPDATE match_cache SET last_used = ? WHERE key = ?", (now, key))
+        return json.loads(row[0])
+
+    def set(self, key: str, value: Matches) -> None:
+        now = time.time()
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO match_cache (key, value, expires_at, last_used) VALUES (?, ?, ?, ?)",
+                (key, json.dumps(value), now + self.ttl_seconds, now),
+            )
+            self._conn.execute(
+                "DELETE FROM match_cache WHERE key IN ("
+                " SELECT key FROM match_cache ORDER BY last_used DESC LIMIT -1 OFFSET ?)",
+                (self.max_entries,),
+            )
+
+    def __len__(self) -> int:
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM match_cache").fetchone()[0]
+
+
+class MatchCache:
+    """
+    Cache of `top_matches` output keyed by (profile_id, seeker version, limit,
+    candidate-pool version, radius). Profile writes bump the shared version of
+    their gender partition (`pool_versions`), so every seeker matching against
+    that partition recomputes on the next call, in every process; the bump
+    also restamps the written profiles, so a seeker's own edits (re-embedding,
+    feature codes, geocoding) retire its entries too.
+    """
+
+    def __init__(self, backend: MatchCacheBackend | None) -> None:
+        self.backend = backend
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get_or_compute(
+        self,
+        profile_id: str,
+        target_gender: str,
+        limit: int,
+        version: int,
+        compute: Callable[[], Matches],
+        max_distance_km: float | None = None,
+        seeker_version: int | None = None,
+    ) -> Matches:
+        """
+        `version` is the pool version of the data `compute` reads and
+        `seeker_version` the seeker's `Profile.pool_version` stamp.
+        """
+        if self.backend is None:
+            return compute()
+        key = f"{profile_id}@{seeker_version or 0}:{limit}:{partition_key(target_gender)}:{version}"
+        if max_distance_km is not None:
+            key += f":{max_distance_km:g}km"
+        cached = self.backend.get(key)
+        with self._lock:
+            if cached is not None:
+                self.hits += 1
+            else:
+                self.misses += 1
+        if cached is not None:
+            return [dict(m) for m in cached]
+        value = compute()
+        self.backend.set(key, value)
+        return [dict(m) for m in value]
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            hits, misses = self.hits, self.misses
+        total = hits + misses
+        return {
+            "backend": self.backend.name if self.backend is not None else "none",
+            "entries": len(self.backend) if self.backend is not None else 0,
+            "hits": hits,
+            "misses": misses,
+            "hit_rate": hits / total if total else None,
+        }
+
+
+def _build_backend() -> MatchCacheBackend | None:
+    if settings.match_cache_backend == "sqlite":
+        return SQLiteBackend(
+            settings.match_cache_path,
+            max_entries=settings.match_cache_max_entries,
+            ttl_seconds=settings.match_cache_ttl_seconds,
+        )
+    if settings.match_cache_backend == "memory":
+        return MemoryBackend(
+            max_entries=settings.match_cache_max_entries,
+            ttl_seconds=settings.match_cache_ttl_seconds,
+        )
+    return None
+
+
+match_cache = MatchCache(_build_backend())
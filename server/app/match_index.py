@@ -0,0 +1,443 @@
+import asyncio
+import logging
+import math
+import threading
+from dataclasses import dataclass
+from typing import Any, Dict, List, Optional, Sequence, Set, Tuple
+
+import numpy as np
+from sqlalchemy import and_, or_, select
+from sqlalchemy.orm import Session
+
+from .config import settings
+from .db import SessionLocal
+from .db.models import Profile
+from .feature_codes import (
+    CANONICAL_KEYS,
+    decode_canonical,
+    decode_dynamic,
+    dynamic_key_bits,
+    minhash_signature,
+)
+from .pool_versions import partition_key, pool_versions
+from .utils.geo import bounding_box
+
+_INITIAL_CAPACITY = 1024
+_LOAD_BATCH_SIZE = 5000
+_ARRAY_FIELDS = (
+    "self_matrix",
+    "pref_matrix",
+    "canonical_codes",
+    "has_canonical_codes",
+    "dynamic_bits",
+    "dynamic_sizes",
+    "dynamic_signatures",
+    "has_dynamic_codes",
+    "locations",
+)
+_INDEX_COLUMNS = (
+    Profile.id,
+    Profile.gender,
+    Profile.self_embedding,
+    Profile.pref_embedding,
+    Profile.self_embedding_valid,
+    Profile.pref_embedding_valid,
+    Profile.canonical_codes,
+    Profile.dynamic_codes,
+    Profile.canonical,
+    Profile.dynamic_features,
+    Profile.location_lat,
+    Profile.location_lon,
+)
+
+
+def _unit_row(vec: Sequence[float] | None, valid: bool | None) -> np.ndarray:
+    """Float32 unit row; `valid` is the stored *_embedding_valid flag."""
+    row = np.zeros(settings.embedding_dim, dtype=np.float32)
+    if valid is False or vec is None or isinstance(vec, (str, bytes)):
+        return row
+    row[:] = vec
+    if valid is None:
+        # Not backfilled yet, so not guaranteed to be unit length
+        norm = np.linalg.norm(row)
+        if norm > 0:
+            row /= norm
+    return row
+
+
+def _location_row(lat: float | None, lon: float | None) -> np.ndarray:
+    """(lat, lon) as float64; NaN when the profile has no coordinates."""
+    if lat is None or lon is None:
+        return np.full(2, np.nan)
+    return np.array([lat, lon], dtype=np.float64)
+
+
+@dataclass(frozen=True)
+class CandidateBatch:
+    """
+    Candidates in the column layout the batch scorer reads; rows align across
+    all fields. Partitions hand out read-only snapshots of this shape.
+    """
+
+    ids: List[str]
+    self_matrix: np.ndarray
+    pref_matrix: np.ndarray
+    canonical_codes: np.ndarray
+    has_canonical_codes: np.ndarray
+    dynamic_bits: np.ndarray
+    dynamic_sizes: np.ndarray
+    dynamic_signatures: np.ndarray
+    has_dynamic_codes: np.ndarray
+    # (N, 2) lat/lon in degrees, NaN for profiles without coordinates
+    locations: np.ndarray
+    canonicals: List[Dict[str, Any] | None]
+    dynamics: List[Dict[str, Any] | None]
+
+    def __len__(self) -> int:
+        return len(self.ids)
+
+    def take(self, rows: np.ndarray) -> "CandidateBatch":
+        """A new batch of just `rows` (integer positions), in that order."""
+        return CandidateBatch(
+            ids=[self.ids[i] for i in rows],
+            self_matrix=self.self_matrix[rows],
+            pref_matrix=self.pref_matrix[rows],
+            canonical_codes=self.canonical_codes[rows],
+            has_canonical_codes=self.has_canonical_codes[rows],
+            dynamic_bits=self.dynamic_bits[rows],
+            dynamic_sizes=self.dynamic_sizes[rows],
+            dynamic_signatures=self.dynamic_signatures[rows],
+            has_dynamic_codes=self.has_dynamic_codes[rows],
+            locations=self.locations[rows],
+            canonicals=[self.canonicals[i] for i in rows],
+            dynamics=[self.dynamics[i] for i in rows],
+        )
+
+
+class _Grid:
+    """
+    Row positions bucketed by lat/lon cell of `degrees` on a side, so a
+    radius query only visits the cells its bounding box touches. Cell
+    columns wrap at the antimeridian.
+    """
+
+    def __init__(self, degrees: float) -> None:
+        self.degrees = degrees
+        self.columns = math.ceil(360.0 / degrees)
+        self.cells: Dict[Tuple[int, int], Set[int]] = {}
+        self._cell_of: Dict[int, Tuple[int, int]] = {}
+
+    def _row(self, lat: float) -> int:
+        return math.floor((lat + 90.0) / self.degrees)
+
+    def _column(self, lon: float) -> int:
+        return math.floor((lon + 180.0) / self.degrees)
+
+    def place(self, pos: int, lat: float | None, lon: float | None) -> None:
+        old = self._cell_of.pop(pos, None)
+        if old is not None:
+            self.cells[old].discard(pos)
+            if not self.cells[old]:
+                del self.cells[old]
+        if lat is None or lon is None:
+            return
+        cell = (self._row(lat), self._column(lon) % self.columns)
+        self.cells.setdefault(cell, set()).add(pos)
+        self._cell_of[pos] = cell
+
+    def near(self, lat: float, lon: float, radius_km: float) -> np.ndarray:
+        """Sorted positions in the cells overlapping the bounding box of the circle."""
+        lat_min, lat_max, lon_range = bounding_box(lat, lon, radius_km)
+        rows = range(self._row(lat_min), self._row(lat_max) + 1)
+        if lon_range is None or self._column(lon_range[1]) - self._column(lon_range[0]) + 1 >= self.columns:
+            columns: Optional[Set[int]] = None
+        else:
+            columns = {c % self.columns for c in range(self._column(lon_range[0]), self._column(lon_range[1]) + 1)}
+        if columns is None or len(rows) * len(columns) > len(self.cells):
+            keys = [k for k in self.cells if k[0] in rows and (columns is None or k[1] in columns)]
+        else:
+            keys = [(r, c) for r in rows for c in columns if (r, c) in self.cells]
+        found = [pos for key in keys for pos in self.cells[key]]
+        return np.array(sorted(found), dtype=np.intp)
+
+
+class _Partition:
+    def __init__(self) -> None:
+        dim = settings.embedding_dim
+        self.size = 0
+        # A snapshot handed out by view() references the current arrays
+        self._shared = False
+        self.ids: List[str] = []
+        self.positions: Dict[str, int] = {}
+        self.self_matrix = np.zeros((_INITIAL_CAPACITY, dim), dtype=np.float32)
+        self.pref_matrix = np.zeros((_INITIAL_CAPACITY, dim), dtype=np.float32)
+        self.canonical_codes = np.zeros((_INITIAL_CAPACITY, len(CANONICAL_KEYS)), dtype=np.int32)
+        self.has_canonical_codes = np.zeros(_INITIAL_CAPACITY, dtype=bool)
+        self.dynamic_bits = np.zeros((_INITIAL_CAPACITY, 0), dtype=np.uint64)
+        self.dynamic_sizes = np.zeros(_INITIAL_CAPACITY, dtype=np.int32)
+        signature_width = settings.minhash_permutations if settings.dynamic_similarity == "minhash" else 0
+        self.dynamic_signatures = np.zeros((_INITIAL_CAPACITY, signature_width), dtype=np.uint32)
+        self.has_dynamic_codes = np.zeros(_INITIAL_CAPACITY, dtype=bool)
+        self.locations = np.zeros((_INITIAL_CAPACITY, 2), dtype=np.float64)
+        self.grid = _Grid(settings.match_grid_cell_degrees)
+        self.canonicals: List[Dict[str, Any] | None] = []
+        self.dynamics: List[Dict[str, Any] | None] = []
+
+    def _grow(self) -> None:
+        # Copy into new arrays so snapshots taken before the resize stay valid.
+        capacity = self.self_matrix.shape[0] * 2
+        for name in _ARRAY_FIELDS:
+            old = getattr(self, name)
+            new = np.zeros((capacity, *old.shape[1:]), dtype=old.dtype)
+            new[: self.size] = old[: self.size]
+            setattr(self, name, new)
+        self._shared = False
+
+    def _widen_bits(self, words: int) -> None:
+        # The dynamic key vocabulary grew past this partition's bitset width
+        old = self.dynamic_bits
+        new = np.zeros((old.shape[0], words), dtype=np.uint64)
+        new[: self.size, : old.shape[1]] = old[: self.size]
+        self.dynamic_bits = new
+
+    def _set_dynamic(self, pos: int, codes: np.ndarray | None) -> None:
+        self.has_dynamic_codes[pos] = codes is not None
+        self.dynamic_sizes[pos] = 0 if codes is None else len(codes)
+        if codes is None:
+            self.dynamic_bits[pos] = 0
+            self.dynamic_signatures[pos] = 0
+        elif settings.dynamic_similarity == "minhash":
+            self.dynamic_signatures[pos] = minhash_signature(codes)
+        else:
+            bits = dynamic_key_bits.bitset(codes)
+            if len(bits) > self.dynamic_bits.shape[1]:
+                self._widen_bits(len(bits))
+            self.dynamic_bits[pos] = 0
+            self.dynamic_bits[pos, : len(bits)] = bits
+
+    def upsert(
+        self,
+        profile_id: str,
+        self_row,
+        pref_row,
+        canonical_codes: np.ndarray | None,
+        dynamic_codes: np.ndarray | None,
+        canonical,
+        dynamic,
+        lat: float | None = None,
+        lon: float | None = None,
+    ) -> None:
+        pos = self.positions.get(profile_id)
+        if pos is not None:
+            if self._shared:
+                # Copy-on-write once per snapshot: later updates until the next
+                # view() write in place, so a batch of updates copies once.
+                # view() already copies the lists.
+                for name in _ARRAY_FIELDS:
+                    setattr(self, name, getattr(self, name).copy())
+                self._shared = False
+        else:
+            if self.size == self.self_matrix.shape[0]:
+                self._grow()
+            pos = self.size
+            self.positions[profile_id] = pos
+            self.ids.append(profile_id)
+            self.canonicals.append(None)
+            self.dynamics.append(None)
+            self.size += 1
+        self.self_matrix[pos] = self_row
+        self.pref_matrix[pos] = pref_row
+        self.has_canonical_codes[pos] = canonical_codes is not None
+        self.canonical_codes[pos] = canonical_codes if canonical_codes is not None else 0
+        self._set_dynamic(pos, dynamic_codes)
+        self.locations[pos] = _location_row(lat, lon)
+        self.grid.place(pos, lat, lon)
+        self.canonicals[pos] = canonical
+        self.dynamics[pos] = dynamic
+
+    def view(self) -> CandidateBatch:
+        n = self.size
+        self._shared = True
+        return CandidateBatch(
+            ids=self.ids[:n],
+            self_matrix=self.self_matrix[:n],
+            pref_matrix=self.pref_matrix[:n],
+            canonical_codes=self.canonical_codes[:n],
+            has_canonical_codes=self.has_canonical_codes[:n],
+            dynamic_bits=self.dynamic_bits[:n],
+            dynamic_sizes=self.dynamic_sizes[:n],
+            dynamic_signatures=self.dynamic_signatures[:n],
+            has_dynamic_codes=self.has_dynamic_codes[:n],
+            locations=self.locations[:n],
+            canonicals=self.canonicals[:n],
+            dynamics=self.dynamics[:n],
+        )
+
+
+class EmbeddingIndex:
+    """
+    Memory-resident matching index, partitioned by gender.
+
+    Holds L2-normalised float32 `self_embedding`/`pref_embedding` rows, canonical
+    codes, dynamic key bitsets (or MinHash signatures), locations on a grid for
+    radius queries and the canonical/dynamic dicts for responses, so
+    `top_matches` can score a whole partition with a matmul instead of reading
+    every candidate from Postgres.
+
+    Loaded once at startup. Profiles created by this process are added
+    directly; writes by other processes (ingest workers, bulk import,
+    backfill commands, other API workers) are picked up by `refresh`, which
+    re-reads the rows stamped since the pool version it holds whenever the
+    shared versions move.
+    """
+
+    def __init__(self) -> None:
+        self._lock = threading.Lock()
+        self._partitions: Dict[str, _Partition] = {}
+        # Pool versions the contents reflect
+        self._versions: Dict[str, int] = {}
+        self.loaded = False
+
+    @staticmethod
+    def _entry(row) -> tuple:
+        """upsert() arguments for a `_INDEX_COLUMNS` row or a Profile."""
+        return (
+            row.id,
+            _unit_row(row.self_embedding, row.self_embedding_valid),
+            _unit_row(row.pref_embedding, row.pref_embedding_valid),
+            decode_canonical(row.canonical_codes),
+            decode_dynamic(row.dynamic_codes),
+            row.canonical,
+            row.dynamic_features,
+            row.location_lat,
+            row.location_lon,
+        )
+
+    @staticmethod
+    def _query():
+        return (
+            select(*_INDEX_COLUMNS)
+            .where(Profile.self_embedding.isnot(None))
+            .where(Profile.pref_embedding.isnot(None))
+        )
+
+    def load(self, db: Session) -> int:
+        # Versions first: rows written after this read are picked up by refresh
+        versions = pool_versions(db)
+        partitions: Dict[str, _Partition] = {}
+        count = 0
+        for row in db.execute(self._query().execution_options(yield_per=_LOAD_BATCH_SIZE)):
+            partitions.setdefault(partition_key(row.gender), _Partition()).upsert(*self._entry(row))
+            count += 1
+        with self._lock:
+            self._partitions = partitions
+            self._versions = versions
+            self.loaded = True
+        logging.info("Match index loaded %d profiles", count)
+        return count
+
+    def refresh(self, db: Session) -> int:
+        """
+        Apply profile writes from other processes: for each partition whose
+        pool version moved, upsert the rows stamped with a newer version than
+        the one held (bumps stamp in commit order, so none is skipped).
+        Returns how many rows were read.
+        """
+        versions = pool_versions(db)
+        with self._lock:
+            moved = {
+                partition: self._versions.get(partition, 0)
+                for partition, version in versions.items()
+                if version != self._versions.get(partition, 0)
+            }
+        if not moved:
+            return 0
+        rows = db.execute(
+            self._query().where(
+                or_(
+                    *(
+                        and_(Profile.gender == partition, Profile.pool_version > held)
+                        for partition, held in moved.items()
+                    )
+                )
+            )
+        ).all()
+        entries = [(partition_key(row.gender), self._entry(row)) for row in rows]
+        with self._lock:
+            # One batch under the lock: each partition copies its arrays at most once
+            for key, entry in entries:
+                self._partitions.setdefault(key, _Partition()).upsert(*entry)
+            self._versions = versions
+        if rows:
+            logging.info("Match index refreshed %d profiles", len(rows))
+        return len(rows)
+
+    def version(self, gender: str | None) -> int:
+        """Pool version of `gender`'s partition as of the last load or refresh."""
+        with self._lock:
+            return self._versions.get(partition_key(gender), 0)
+
+    def add(self, profile: Profile) -> None:
+        if profile.self_embedding is None or profile.pref_embedding is None:
+            return
+        entry = self._entry(profile)
+        with self._lock:
+            self._partitions.setdefault(partition_key(profile.gender), _Partition()).upsert(*entry)
+
+    def partition(self, gender: str) -> CandidateBatch:
+        with self._lock:
+            part = self._partitions.get(partition_key(gender))
+            if part is None:
+                part = _Partition()
+            return part.view()
+
+    def nearby(self, gender: str, lat: float, lon: float, radius_km: float) -> CandidateBatch:
+        """
+        The partition's candidates in grid cells within reach of `radius_km`
+        around (lat, lon): a superset of those within the radius, without
+        those lacking coordinates.
+        """
+        with self._lock:
+            part = self._partitions.get(partition_key(gender))
+            if part is None:
+                part = _Partition()
+            rows = part.grid.near(lat, lon, radius_km)
+            batch = part.view()
+        return batch.take(rows)
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return {gender: part.size for gender, part in self._partitions.items()}
+
+
+class IndexRefresher:
+    """Asyncio task running `EmbeddingIndex.refresh` every `interval` seconds."""
+
+    def __init__(self, index: EmbeddingIndex) -> None:
+        self.index = index
+        self._task: Optional[asyncio.Task] = None
+
+    def start(self, interval: float) -> None:
+        self._task = asyncio.create_task(self._run(interval), name="match-index-refresh")
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+
+    def _refresh(self) -> int:
+        with SessionLocal() as db:
+            return self.index.refresh(db)
+
+    async def _run(self, interval: float) -> None:
+        while True:
+            await asyncio.sleep(interval)
+            try:
+                await asyncio.to_thread(self._refresh)
+            except Exception:
+                logging.exception("Match index refresh failed")
+
+
+embedding_index = EmbeddingIndex()
+index_refresher = IndexRefresher(embedding_index)
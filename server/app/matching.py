@@ -1,10 +1,25 @@
-from typing import Iterable, List
+from typing import Iterable, Sequence
 
 import numpy as np
-from sqlalchemy import select
+from sqlalchemy import or_, select, text
 from sqlalchemy.orm import Session
 
+from .config import settings
 from .db.models import Profile
+from .feature_codes import (
+    CANONICAL_KEYS,
+    canonical_code_matrix,
+    decode_canonical,
+    decode_dynamic,
+    dynamic_code_matrices,
+    dynamic_key_bits,
+    minhash_signature,
+    normalize_value,
+)
+from .match_cache import match_cache
+from .pool_versions import pool_version
+from .match_index import CandidateBatch, embedding_index
+from .utils.geo import bounding_box, distance_decay, haversine_km_many
 
 
 def _opposite_gender(gender: str) -> str | None:
@@ -16,58 +31,437 @@ def _opposite_gender(gender: str) -> str | None:
     return None
 
 
+# Component weights; a component only counts towards the normaliser when it is > 0,
+# except proximity (MATCH_DISTANCE_WEIGHT), which counts whenever both sides have
+# coordinates, so a far candidate is penalised rather than ignored.
+EMBEDDING_WEIGHT = 0.4
+CANONICAL_WEIGHT = 0.1
+DYNAMIC_WEIGHT = 0.1
+
+
 def _is_vector(vec: Iterable | None) -> bool:
-    return vec is not None and isinstance(vec, (list, tuple))
-
-
-def _cosine(a: List[float] | None, b: List[float] | None) -> float:
-    if not _is_vector(a) or not _is_vector(b):
-        return 0.0
-    va = np.array(a, dtype=float)
-    vb = np.array(b, dtype=float)
-    denom = np.linalg.norm(va) * np.linalg.norm(vb)
-    if denom == 0:
-        return 0.0
-    return float(np.dot(va, vb) / denom)
-
-
-def _canonical_similarity(src: dict | None, cand: dict | None) -> float:
-    if not src or not cand:
-        return 0.0
-    keys = ["city", "state", "country", "education", "profession", "religion", "caste"]
-    matches = 0
-    total = 0
-    for k in keys:
-        s_val = (src.get(k) or "").strip().lower()
-        c_val = (cand.get(k) or "").strip().lower()
-        if not s_val or not c_val:
+    return vec is not None and isinstance(vec, (list, tuple, np.ndarray))
+
+
+def _unit_vector(vec: Sequence[float] | None) -> np.ndarray:
+    """L2-normalised float32 copy of `vec`; zeros when missing or zero-length."""
+    if not _is_vector(vec):
+        return np.zeros(settings.embedding_dim, dtype=np.float32)
+    out = np.array(vec, dtype=np.float32)
+    norm = np.linalg.norm(out)
+    if norm > 0:
+        out /= norm
+    return out
+
+
+def _embedding_matrix(vectors: Sequence, valid: Sequence[bool | None] | None = None) -> np.ndarray:
+    """
+    Stack embeddings into a contiguous (N, dim) float32 matrix of unit rows.
+
+    `valid` holds the rows' *_embedding_valid flags: True rows are stored
+    pre-normalised and copied as is, False rows stay zero, and rows without a
+    flag (not yet backfilled) are normalised here. Zero rows score 0.
+    """
+    if valid is None:
+        valid = [None] * len(vectors)
+    mat = np.zeros((len(vectors), settings.embedding_dim), dtype=np.float32)
+    legacy = []
+    for i, (vec, ok) in enumerate(zip(vectors, valid)):
+        if ok is False or not _is_vector(vec):
+            continue
+        mat[i] = vec
+        if ok is None:
+            legacy.append(i)
+    if legacy:
+        rows = mat[legacy]
+        norms = np.linalg.norm(rows, axis=1, keepdims=True)
+        np.divide(rows, norms, out=rows, where=norms > 0)
+        mat[legacy] = rows
+    return mat
+
+
+def _canonical_code_scores(src_codes: np.ndarray, cand_codes: np.ndarray) -> np.ndarray:
+    """
+    Share of the canonical keys present on both sides whose values are equal,
+    from interned codes (0 = missing): an (N, keys) compare against one row.
+    """
+    present = (cand_codes != 0) & (src_codes != 0)
+    total = present.sum(axis=1)
+    matches = (present & (cand_codes == src_codes)).sum(axis=1)
+    out = np.zeros(len(cand_codes), dtype=np.float64)
+    np.divide(matches, total, out=out, where=total > 0)
+    return out
+
+
+def _canonical_text_scores(src: dict | None, cands: Sequence[dict | None]) -> np.ndarray:
+    """
+    Same as `_canonical_code_scores`, comparing normalised text; used for rows
+    whose canonical codes have not been backfilled.
+    """
+    out = np.zeros(len(cands), dtype=np.float64)
+    if not src or not cands:
+        return out
+    matches = np.zeros(len(cands), dtype=np.float64)
+    total = np.zeros(len(cands), dtype=np.float64)
+    for k in CANONICAL_KEYS:
+        s_val = normalize_value(src.get(k))
+        if not s_val:
             continue
-        total += 1
-        if s_val == c_val:
-            matches += 1
-    if total == 0:
-        return 0.0
-    return matches / total
+        column = np.array([normalize_value((c or {}).get(k)) for c in cands], dtype=object)
+        total += column != ""
+        matches += column == s_val
+    np.divide(matches, total, out=out, where=total > 0)
+    return out
 
 
-def _dynamic_similarity(src: dict | None, cand: dict | None) -> float:
-    if not src or not cand:
-        return 0.0
-    src_keys = set(src.keys())
-    cand_keys = set(cand.keys())
-    if not src_keys or not cand_keys:
-        return 0.0
-    overlap = src_keys & cand_keys
-    return len(overlap) / len(src_keys | cand_keys)
+def _canonical_scores(profile: Profile, batch: CandidateBatch) -> np.ndarray:
+    src_codes = decode_canonical(profile.canonical_codes)
+    if src_codes is None:
+        return _canonical_text_scores(profile.canonical, batch.canonicals)
+    out = _canonical_code_scores(src_codes, batch.canonical_codes)
+    legacy = np.flatnonzero(~batch.has_canonical_codes)
+    if len(legacy):
+        out[legacy] = _canonical_text_scores(profile.canonical, [batch.canonicals[i] for i in legacy])
+    return out
 
 
-def top_matches(db: Session, source_profile_id: str, limit: int = 20):
+def _dynamic_key_scores(src: dict | None, cands: Sequence[dict | None]) -> np.ndarray:
+    """
+    Jaccard overlap of dynamic_features keys from the dicts; used for rows whose
+    dynamic codes have not been backfilled.
+    """
+    out = np.zeros(len(cands), dtype=np.float64)
+    src_keys = set(src.keys()) if src else set()
+    if not src_keys or not cands:
+        return out
+    sizes = np.fromiter((len(c) if c else 0 for c in cands), dtype=np.float64, count=len(cands))
+    overlap = np.fromiter(
+        (len(src_keys.intersection(c)) if c else 0 for c in cands),
+        dtype=np.float64,
+        count=len(cands),
+    )
+    union = sizes + len(src_keys) - overlap
+    np.divide(overlap, union, out=out, where=sizes > 0)
+    return out
+
+
+def _popcount(words: np.ndarray) -> np.ndarray:
+    """Number of set bits in each row of a uint64 matrix."""
+    if hasattr(np, "bitwise_count"):
+        return np.bitwise_count(words).sum(axis=1, dtype=np.int64)
+    return np.unpackbits(np.ascontiguousarray(words).view(np.uint8), axis=1).sum(axis=1, dtype=np.int64)
+
+
+def _dynamic_bitset_scores(src_codes: np.ndarray, batch: CandidateBatch) -> np.ndarray:
+    """Exact key Jaccard: |S & C| by popcount, |S | C| = |S| + |C| - |S & C|."""
+    src_bits = dynamic_key_bits.bitset(src_codes, batch.dynamic_bits.shape[1])
+    overlap = _popcount(batch.dynamic_bits & src_bits)
+    union = len(src_codes) + batch.dynamic_sizes - overlap
+    out = np.zeros(len(batch), dtype=np.float64)
+    np.divide(overlap, union, out=out, where=batch.dynamic_sizes > 0)
+    return out
+
+
+def _dynamic_minhash_scores(src_codes: np.ndarray, batch: CandidateBatch) -> np.ndarray:
+    """Approximate key Jaccard: share of MinHash slots equal to the seeker's."""
+    estimate = (batch.dynamic_signatures == minhash_signature(src_codes)).mean(axis=1)
+    return np.where(batch.dynamic_sizes > 0, estimate, 0.0)
+
+
+def _dynamic_scores(profile: Profile, batch: CandidateBatch) -> np.ndarray:
+    src_codes = decode_dynamic(profile.dynamic_codes)
+    if src_codes is None:
+        return _dynamic_key_scores(profile.dynamic_features, batch.dynamics)
+    if len(src_codes) == 0:
+        return np.zeros(len(batch), dtype=np.float64)
+    if settings.dynamic_similarity == "minhash":
+        out = _dynamic_minhash_scores(src_codes, batch)
+    else:
+        out = _dynamic_bitset_scores(src_codes, batch)
+    legacy = np.flatnonzero(~batch.has_dynamic_codes)
+    if len(legacy):
+        out[legacy] = _dynamic_key_scores(profile.dynamic_features, [batch.dynamics[i] for i in legacy])
+    return out
+
+
+def _combine_scores(
+    pref_to_self: np.ndarray,
+    self_to_pref: np.ndarray,
+    canonical_sim: np.ndarray,
+    dynamic_sim: np.ndarray,
+    proximity: np.ndarray | None = None,
+) -> np.ndarray:
+    """
+    Weighted mean of the components, renormalised per candidate over the
+    components that are > 0. `proximity` (NaN = unknown) counts wherever it
+    is known.
+    """
+    weights = np.zeros(len(pref_to_self), dtype=np.float64)
+    parts = np.zeros(len(pref_to_self), dtype=np.float64)
+    for values, weight in (
+        (pref_to_self, EMBEDDING_WEIGHT),
+        (self_to_pref, EMBEDDING_WEIGHT),
+        (canonical_sim, CANONICAL_WEIGHT),
+        (dynamic_sim, DYNAMIC_WEIGHT),
+    ):
+        values = np.asarray(values, dtype=np.float64)
+        present = values > 0
+        weights += np.where(present, weight, 0.0)
+        parts += np.where(present, weight * values, 0.0)
+    if proximity is not None and settings.match_distance_weight > 0:
+        present = ~np.isnan(proximity)
+        weights += np.where(present, settings.match_distance_weight, 0.0)
+        parts += np.where(present, settings.match_distance_weight * np.nan_to_num(proximity), 0.0)
+    scores = np.zeros_like(parts)
+    np.divide(parts, weights, out=scores, where=weights > 0)
+    return scores
+
+
+def _component_scores(
+    profile: Profile, batch: CandidateBatch
+) -> tuple[np.ndarray, np.ndarray, np.ndarray, np.ndarray]:
+    """pref_to_self, self_to_pref, canonical and dynamic similarity of `profile` to each candidate."""
+    return (
+        batch.self_matrix @ _unit_vector(profile.pref_embedding),
+        batch.pref_matrix @ _unit_vector(profile.self_embedding),
+        _canonical_scores(profile, batch),
+        _dynamic_scores(profile, batch),
+    )
+
+
+def _score_batch(profile: Profile, batch: CandidateBatch, distances: np.ndarray | None = None) -> np.ndarray:
+    """
+    Score `profile` against every candidate in `batch` in one pass;
+    `distances` are the candidates' km from the seeker (NaN = unknown).
+    """
+    proximity = distance_decay(distances) if distances is not None else None
+    return _combine_scores(*_component_scores(profile, batch), proximity)
+
+
+def _top_k(scores: np.ndarray, k: int) -> np.ndarray:
+    """
+    Indices of the `k` highest scores, best first, in O(N + k log k).
+    Ties keep candidate order, matching a stable full sort.
+    """
+    n = len(scores)
+    if k <= 0 or n == 0:
+        return np.empty(0, dtype=np.intp)
+    if k < n:
+        kth = np.partition(scores, n - k)[n - k]
+        above = np.flatnonzero(scores > kth)
+        ties = np.flatnonzero(scores == kth)[: k - len(above)]
+        idx = np.concatenate([above, ties])
+    else:
+        idx = np.arange(n)
+    return idx[np.lexsort((idx, -scores[idx]))]
+
+
+def _candidate_filters(profile: Profile, target_gender: str) -> list:
+    return [
+        Profile.id != profile.id,
+        Profile.gender == target_gender,
+        Profile.self_embedding.isnot(None),
+        Profile.pref_embedding.isnot(None),
+    ]
+
+
+def _seeker_location(profile: Profile) -> tuple[float, float] | None:
+    if profile.location_lat is None or profile.location_lon is None:
+        return None
+    return profile.location_lat, profile.location_lon
+
+
+def _radius_filters(origin: tuple[float, float], radius_km: float) -> list:
+    """
+    Bounding box of the circle for the SQL paths (served by
+    idx_profiles_location); the exact distance is checked after scoring reads.
+    """
+    lat_min, lat_max, lon_range = bounding_box(origin[0], origin[1], radius_km)
+    filters = [Profile.location_lat.between(lat_min, lat_max), Profile.location_lon.isnot(None)]
+    if lon_range is not None:
+        lon_min, lon_max = lon_range
+        if lon_min < -180.0:
+            filters.append(or_(Profile.location_lon >= lon_min + 360.0, Profile.location_lon <= lon_max))
+        elif lon_max > 180.0:
+            filters.append(or_(Profile.location_lon >= lon_min, Profile.location_lon <= lon_max - 360.0))
+        else:
+            filters.append(Profile.location_lon.between(lon_min, lon_max))
+    return filters
+
+
+def _ann_shortlist(db: Session, profile: Profile, target_gender: str) -> list[str]:
+    """
+    Candidate ids from the two pgvector ANN queries (pref -> candidate self,
+    self -> candidate pref), unioned in rank order.
+    """
+    k = settings.ann_shortlist_size
+    if settings.ann_index_type == "hnsw":
+        # ef_search bounds how many rows an HNSW scan can return
+        ef_search = max(settings.ann_ef_search, k)
+        db.execute(text(f"SET LOCAL hnsw.ef_search = {int(ef_search)}"))
+    else:
+        db.execute(text(f"SET LOCAL ivfflat.probes = {int(settings.ann_ivfflat_probes)}"))
+
+    base = select(Profile.id).where(*_candidate_filters(profile, target_gender))
+    # `<#>` is the negated inner product, so ascending order is best first
+    pref_to_self = db.execute(
+        base.order_by(Profile.self_embedding.max_inner_product(_unit_vector(profile.pref_embedding))).limit(k)
+    ).scalars().all()
+    self_to_pref = db.execute(
+        base.order_by(Profile.pref_embedding.max_inner_product(_unit_vector(profile.self_embedding))).limit(k)
+    ).scalars().all()
+    return list(dict.fromkeys([*pref_to_self, *self_to_pref]))
+
+
+# Only what scoring reads; pdf_text, pdf_path and the free-text fields stay in Postgres
+_SCORING_COLUMNS = (
+    Profile.id,
+    Profile.self_embedding,
+    Profile.pref_embedding,
+    Profile.self_embedding_valid,
+    Profile.pref_embedding_valid,
+    Profile.canonical_codes,
+    Profile.dynamic_codes,
+    Profile.canonical,
+    Profile.dynamic_features,
+    Profile.location_lat,
+    Profile.location_lon,
+)
+
+
+def _materialize(
+    db: Session,
+    ids: Sequence[str],
+    scores: Sequence[float],
+    canonicals: Sequence[dict | None],
+    dynamics: Sequence[dict | None],
+) -> list[dict]:
+    """Build response dicts for the winners, reading their free text in one query."""
+    if not ids:
+        return []
+    texts = {
+        row.id: row
+        for row in db.execute(
+            select(Profile.id, Profile.who_am_i, Profile.looking_for).where(Profile.id.in_(ids))
+        )
+    }
+    matches = []
+    for pid, score, canonical, dynamic in zip(ids, scores, canonicals, dynamics):
+        row = texts.get(pid)
+        if row is None:
+            continue
+        matches.append(
+            {
+                "profile_id": pid,
+                "score": float(score),
+                "canonical": canonical,
+                "dynamic_features": dynamic,
+                "looking_for": row.looking_for,
+                "who_am_i": row.who_am_i,
+            }
+        )
+    return matches
+
+
+def _location_matrix(rows: Sequence) -> np.ndarray:
+    """(N, 2) lat/lon of `rows`; NaN for rows without coordinates."""
+    out = np.full((len(rows), 2), np.nan)
+    for i, r in enumerate(rows):
+        if r.location_lat is not None and r.location_lon is not None:
+            out[i] = r.location_lat, r.location_lon
+    return out
+
+
+def _batch_from_rows(rows: Sequence) -> CandidateBatch:
+    """Columnar CandidateBatch from `_SCORING_COLUMNS` rows."""
+    codes, has_codes = canonical_code_matrix([r.canonical_codes for r in rows])
+    bits, sizes, signatures, has_dynamic = dynamic_code_matrices([decode_dynamic(r.dynamic_codes) for r in rows])
+    return CandidateBatch(
+        ids=[r.id for r in rows],
+        self_matrix=_embedding_matrix([r.self_embedding for r in rows], [r.self_embedding_valid for r in rows]),
+        pref_matrix=_embedding_matrix([r.pref_embedding for r in rows], [r.pref_embedding_valid for r in rows]),
+        canonical_codes=codes,
+        has_canonical_codes=has_codes,
+        dynamic_bits=bits,
+        dynamic_sizes=sizes,
+        dynamic_signatures=signatures,
+        has_dynamic_codes=has_dynamic,
+        locations=_location_matrix(rows),
+        canonicals=[r.canonical for r in rows],
+        dynamics=[r.dynamic_features for r in rows],
+    )
+
+
+def _use_index() -> bool:
+    return settings.match_retrieval == "memory" and embedding_index.loaded
+
+
+def _compute_matches(
+    db: Session,
+    profile: Profile,
+    target_gender: str,
+    limit: int,
+    max_distance_km: float | None = None,
+) -> list[dict]:
+    origin = _seeker_location(profile)
+    radius = max_distance_km if origin is not None else None
+    if _use_index():
+        if radius is not None:
+            batch = embedding_index.nearby(target_gender, origin[0], origin[1], radius)
+        else:
+            batch = embedding_index.partition(target_gender)
+    else:
+        query = select(*_SCORING_COLUMNS).where(*_candidate_filters(profile, target_gender))
+        if radius is not None:
+            # The box is already a small share of the pool; score all of it exactly
+            query = query.where(*_radius_filters(origin, radius))
+        elif settings.match_retrieval == "ann":
+            shortlist = _ann_shortlist(db, profile, target_gender)
+            if not shortlist:
+                return []
+            query = query.where(Profile.id.in_(shortlist))
+        batch = _batch_from_rows(db.execute(query).all())
+
+    distances = None
+    if origin is not None and len(batch) and (radius is not None or settings.match_distance_weight > 0):
+        distances = haversine_km_many(origin[0], origin[1], batch.locations[:, 0], batch.locations[:, 1])
+        if radius is not None:
+            # Grid cells and boxes overshoot the circle; NaN (no coordinates) fails too
+            inside = np.flatnonzero(distances <= radius)
+            batch, distances = batch.take(inside), distances[inside]
+
+    if not len(batch):
+        return []
+
+    scores = _score_batch(profile, batch, distances)
+    winners = [int(i) for i in _top_k(scores, limit + 1) if batch.ids[i] != profile.id][:limit]
+    return _materialize(
+        db,
+        [batch.ids[i] for i in winners],
+        [scores[i] for i in winners],
+        [batch.canonicals[i] for i in winners],
+        [batch.dynamics[i] for i in winners],
+    )
+
+
+def top_matches(db: Session, source_profile_id: str, limit: int = 20, max_distance_km: float | None = None):
     """
     Similarity matcher combining:
     - pref vs candidate who_am_i (pref_embedding vs self_embedding)
     - self vs candidate preferences (self_embedding vs pref_embedding)
     - canonical overlap
     - dynamic feature overlap
+    - proximity, decaying with the distance between the two locations
+
+    With `max_distance_km`, only candidates within that distance of the seeker
+    are considered (those without coordinates are dropped); the spatial
+    prefilter means only the nearby part of the pool is read and scored. It
+    is ignored when the seeker has no coordinates.
+
+    With MATCH_RETRIEVAL=memory the in-process embedding index is scored and
+    only the winners are read from Postgres; with MATCH_RETRIEVAL=ann only the
+    pgvector ANN shortlist is scored. Results are cached until a profile joins
+    the candidate partition or the seeker itself is rewritten.
     """
     profile = db.get(Profile, source_profile_id)
     if not profile or profile.pref_embedding is None or profile.self_embedding is None:
@@ -77,55 +471,14 @@ def top_matches(db: Session, source_profile_id: str, limit: int = 20):
     if target_gender is None:
         return []
 
-    candidates = db.execute(
-        select(Profile)
-        .where(Profile.id != profile.id)
-        .where(Profile.gender == target_gender)
-        .where(Profile.self_embedding.isnot(None))
-        .where(Profile.pref_embedding.isnot(None))
-    ).scalars().all()
-
-    scored = []
-    for cand in candidates:
-        pref_to_self = _cosine(profile.pref_embedding, cand.self_embedding)
-        self_to_pref = _cosine(profile.self_embedding, cand.pref_embedding)
-        canonical_sim = _canonical_similarity(profile.canonical, cand.canonical)
-        dynamic_sim = _dynamic_similarity(profile.dynamic_features, cand.dynamic_features)
-
-        weights = []
-        parts = []
-
-        # Embedding similarities carry most weight
-        if pref_to_self > 0:
-            weights.append(0.4)
-            parts.append(0.4 * pref_to_self)
-        if self_to_pref > 0:
-            weights.append(0.4)
-            parts.append(0.4 * self_to_pref)
-
-        # Structured overlaps if present
-        if canonical_sim > 0:
-            weights.append(0.1)
-            parts.append(0.1 * canonical_sim)
-        if dynamic_sim > 0:
-            weights.append(0.1)
-            parts.append(0.1 * dynamic_sim)
-
-        if weights:
-            score = sum(parts) / sum(weights)
-        else:
-            score = 0.0
-
-        scored.append(
-            {
-                "profile_id": cand.id,
-                "score": score,
-                "canonical": cand.canonical,
-                "dynamic_features": cand.dynamic_features,
-                "looking_for": cand.looking_for,
-                "who_am_i": cand.who_am_i,
-            }
-        )
-
-    scored.sort(key=lambda x: x["score"], reverse=True)
-    return scored[:limit]
+    # The index may trail the database by one refresh; key on what it holds
+    version = embedding_index.version(target_gender) if _use_index() else pool_version(db, target_gender)
+    return match_cache.get_or_compute(
+        profile.id,
+        target_gender,
+        limit,
+        version,
+        lambda: _compute_matches(db, profile, target_gender, limit, max_distance_km),
+        max_distance_km=max_distance_km,
+        seeker_version=profile.pool_version,
+    )
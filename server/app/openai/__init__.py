@@ -1,19 +1,26 @@
-from .client import client
-from .embeddings import get_embedding
+from .client import async_client, client
+from .embeddings import aget_embeddings, get_embedding, get_embeddings, is_valid_embedding
 from .feature_extraction import (
+    aextract_features_from_pdf_text,
     extract_features_from_pdf_text,
     build_self_text,
     build_pref_text,
 )
-from .rerank import rerank_with_llm
+from .rerank import iter_rerank_with_llm, rerank_with_llm
 from .canonical_match import score_canonical_fields
 
 __all__ = [
     "client",
+    "async_client",
     "get_embedding",
+    "get_embeddings",
+    "aget_embeddings",
+    "is_valid_embedding",
     "extract_features_from_pdf_text",
+    "aextract_features_from_pdf_text",
     "build_self_text",
     "build_pref_text",
     "rerank_with_llm",
+    "iter_rerank_with_llm",
     "score_canonical_fields",
 ]
@@ -6,6 +6,12 @@ from openai import APIError, RateLimitError
 
 from .client import client
 from .prompts import CANONICAL_MATCH_SYSTEM_PROMPT
+from .scheduler import Priority, scheduler
+from .tokens import count_tokens
+
+CANONICAL_MATCH_MODEL = "gpt-4.1-mini"
+# Completion allowance per compared field when budgeting a call
+CANONICAL_MATCH_COMPLETION_TOKENS_PER_FIELD = 60
 
 DEFAULT_FIELD_LABELS = {
     "name": "Name",
@@ -155,12 +161,19 @@ def score_canonical_fields(
         {"role": "user", "content": json.dumps(payload)},
     ]
 
+    tokens = sum(count_tokens(m["content"], CANONICAL_MATCH_MODEL) for m in messages)
+    tokens += CANONICAL_MATCH_COMPLETION_TOKENS_PER_FIELD * len(base_keys)
     try:
-        resp = client.chat.completions.create(
-            model="gpt-4.1-mini",
-            messages=messages,
-            response_format={"type": "json_object"},
-            temperature=0.2,
+        resp = scheduler.run(
+            CANONICAL_MATCH_MODEL,
+            tokens,
+            Priority.INTERACTIVE,
+            lambda: client.chat.completions.create(
+                model=CANONICAL_MATCH_MODEL,
+                messages=messages,
+                response_format={"type": "json_object"},
+                temperature=0.2,
+            ),
         )
         content = resp.choices[0].message.content
         data = json.loads(content or "{}")
@@ -1,5 +1,7 @@
-from openai import OpenAI
+from openai import AsyncOpenAI, OpenAI
 
 from ..config import settings
 
-client = OpenAI(api_key=settings.openai_api_key)
+# Retries are owned by the scheduler, which also paces them against the rate limits
+client = OpenAI(api_key=settings.openai_api_key, max_retries=0)
+async_client = AsyncOpenAI(api_key=settings.openai_api_key, max_retries=0)
@@ -1,36 +1,204 @@
+import asyncio
 import logging
-from typing import List
+from typing import Dict, Iterator, List, Optional, Protocol, Sequence
 
+import numpy as np
 from openai import APIError, RateLimitError
 
 from ..config import settings
-from .client import client
+from ..embedding_cache import embedding_cache, normalize_text
+from .client import async_client, client
+from .local_embeddings import HashingEmbeddingProvider
+from .scheduler import Priority, scheduler
+from .tokens import count_tokens, truncate_to_tokens
 
+EMBEDDING_MODEL = "text-embedding-3-small"
+# Per-request API limits for the embeddings endpoint
+EMBEDDING_MAX_INPUTS = 2048
+EMBEDDING_MAX_INPUT_TOKENS = 8191
+EMBEDDING_MAX_REQUEST_TOKENS = 300_000
 
-def _normalize_embedding(vec: List[float]) -> List[float]:
+
+def _normalize_embedding(vec: Sequence[float]) -> List[float]:
+    """
+    Fit `vec` to `settings.embedding_dim` (truncate or zero-pad) and scale it to
+    unit length, so stored vectors can be compared with a plain dot product.
+    """
     target = settings.embedding_dim
-    if len(vec) == target:
-        return vec
-    if len(vec) > target:
-        return vec[:target]
-    # pad with zeros if shorter
-    return vec + [0.0] * (target - len(vec))
-
-
-def get_embedding(text: str) -> List[float]:
-    if not text.strip() or not client.api_key:
-        return [0.0] * settings.embedding_dim
-
-    try:
-        resp = client.embeddings.create(
-            model="text-embedding-3-small",
-            input=text,
-        )
-        raw = resp.data[0].embedding
-        return _normalize_embedding(raw)
-    except (RateLimitError, APIError) as exc:
-        logging.warning("OpenAI embeddings failed: %s", exc)
-        return [0.0] * settings.embedding_dim
-    except Exception as exc:
-        logging.warning("OpenAI embeddings unexpected error: %s", exc)
-        return [0.0] * settings.embedding_dim
+    arr = np.zeros(target, dtype=np.float64)
+    n = min(len(vec), target)
+    arr[:n] = vec[:n]
+    norm = np.linalg.norm(arr)
+    if norm > 0:
+        arr /= norm
+    return arr.tolist()
+
+
+def is_valid_embedding(vec: Sequence[float] | None) -> bool:
+    """False for missing (embedding failed) or all-zero (blank input) vectors."""
+    return vec is not None and bool(np.any(np.asarray(vec, dtype=np.float64)))
+
+
+def _batches(texts: List[str]) -> Iterator[tuple[List[str], int]]:
+    """Split texts into requests within the input and token limits; yields (batch, tokens)."""
+    batch: List[str] = []
+    tokens = 0
+    for text in texts:
+        cost = count_tokens(text, EMBEDDING_MODEL)
+        if batch and (len(batch) >= EMBEDDING_MAX_INPUTS or tokens + cost > EMBEDDING_MAX_REQUEST_TOKENS):
+            yield batch, tokens
+            batch, tokens = [], 0
+        batch.append(text)
+        tokens += cost
+    if batch:
+        yield batch, tokens
+
+
+class EmbeddingProvider(Protocol):
+    """
+    Turns distinct, normalised, non-blank texts into raw vectors. Texts left
+    out of the result failed. `name` identifies the vector space and is part
+    of the embedding cache key.
+    """
+
+    name: str
+    cacheable: bool
+
+    def embed(self, texts: List[str], priority: Priority) -> Dict[str, Sequence[float]]: ...
+
+    async def aembed(self, texts: List[str], priority: Priority) -> Dict[str, Sequence[float]]: ...
+
+
+class OpenAIEmbeddingProvider:
+    """`embeddings.create` in as few requests as the API limits allow, through the scheduler."""
+
+    name = EMBEDDING_MODEL
+    cacheable = True
+
+    def embed(self, texts: List[str], priority: Priority) -> Dict[str, Sequence[float]]:
+        out: Dict[str, Sequence[float]] = {}
+        if not client.api_key:
+            return out
+        for batch, tokens in _batches(texts):
+            try:
+                resp = scheduler.run(
+                    EMBEDDING_MODEL,
+                    tokens,
+                    priority,
+                    lambda: client.embeddings.create(model=EMBEDDING_MODEL, input=batch),
+                )
+            except (RateLimitError, APIError) as exc:
+                logging.warning("OpenAI embeddings failed for %d inputs: %s", len(batch), exc)
+                continue
+            except Exception as exc:
+                logging.warning("OpenAI embeddings unexpected error for %d inputs: %s", len(batch), exc)
+                continue
+            out.update((batch[item.index], item.embedding) for item in resp.data)
+        return out
+
+    async def aembed(self, texts: List[str], priority: Priority) -> Dict[str, Sequence[float]]:
+        """Async `embed`; the batches are sent concurrently."""
+        out: Dict[str, Sequence[float]] = {}
+        if not async_client.api_key:
+            return out
+
+        async def send(batch: List[str], tokens: int) -> None:
+            try:
+                resp = await scheduler.arun(
+                    EMBEDDING_MODEL,
+                    tokens,
+                    priority,
+                    lambda: async_client.embeddings.create(model=EMBEDDING_MODEL, input=batch),
+                )
+            except (RateLimitError, APIError) as exc:
+                logging.warning("OpenAI embeddings failed for %d inputs: %s", len(batch), exc)
+                return
+            except Exception as exc:
+                logging.warning("OpenAI embeddings unexpected error for %d inputs: %s", len(batch), exc)
+                return
+            out.update((batch[item.index], item.embedding) for item in resp.data)
+
+        await asyncio.gather(*(send(batch, tokens) for batch, tokens in _batches(texts)))
+        return out
+
+
+def _build_provider() -> EmbeddingProvider:
+    if settings.embedding_provider == "local" or (
+        settings.embedding_provider == "auto" and not settings.openai_api_key
+    ):
+        return HashingEmbeddingProvider(settings.embedding_dim)
+    return OpenAIEmbeddingProvider()
+
+
+embedding_provider = _build_provider()
+
+
+def _plan(texts: Sequence[str], out: List[Optional[List[float]]]) -> Dict[str, List[int]]:
+    """
+    Fill cached vectors into `out` and return the distinct texts still to be
+    embedded, each with the positions it occupies in `texts`.
+    """
+    wanted: Dict[str, List[int]] = {}
+    for i, text in enumerate(texts):
+        # The provider sees the same normalised text the cache key is built
+        # from; oversized inputs would fail their whole request, so clip them
+        text = truncate_to_tokens(normalize_text(text), EMBEDDING_MAX_INPUT_TOKENS, EMBEDDING_MODEL)
+        if text:
+            wanted.setdefault(text, []).append(i)
+    if embedding_provider.cacheable:
+        for text, vec in embedding_cache.get_many(embedding_provider.name, wanted).items():
+            for i in wanted.pop(text):
+                out[i] = vec
+    return wanted
+
+
+def _fill(
+    wanted: Dict[str, List[int]],
+    raw: Dict[str, Sequence[float]],
+    out: List[Optional[List[float]]],
+) -> None:
+    fresh: Dict[str, List[float]] = {}
+    for text, embedding in raw.items():
+        vec = fresh[text] = _normalize_embedding(embedding)
+        for i in wanted[text]:
+            out[i] = vec
+    if embedding_provider.cacheable:
+        embedding_cache.set_many(embedding_provider.name, fresh)
+
+
+def _initial(texts: Sequence[str]) -> List[Optional[List[float]]]:
+    """Zero vectors for blank inputs, None (not embedded yet) for the rest."""
+    zero = [0.0] * settings.embedding_dim
+    return [None if normalize_text(text) else zero for text in texts]
+
+
+def get_embeddings(texts: Sequence[str], priority: Priority = Priority.INGEST) -> List[Optional[List[float]]]:
+    """
+    Embed `texts` with the configured EMBEDDING_PROVIDER, skipping texts
+    found in the embedding cache and sending repeated texts once. Output
+    order matches input order. Blank inputs get the zero vector; inputs the
+    provider could not embed (after the scheduler's retries, or with no API
+    key) get None, so callers never store a placeholder as if it were an
+    embedding.
+    """
+    out = _initial(texts)
+    wanted = _plan(texts, out)
+    if wanted:
+        _fill(wanted, embedding_provider.embed(list(wanted), priority), out)
+    return out
+
+
+async def aget_embeddings(
+    texts: Sequence[str], priority: Priority = Priority.INGEST
+) -> List[Optional[List[float]]]:
+    """Async `get_embeddings`."""
+    out = _initial(texts)
+    wanted = await asyncio.to_thread(_plan, texts, out)
+    if wanted:
+        raw = await embedding_provider.aembed(list(wanted), priority)
+        await asyncio.to_thread(_fill, wanted, raw, out)
+    return out
+
+
+def get_embedding(text: str) -> Optional[List[float]]:
+    return get_embeddings([text])[0]
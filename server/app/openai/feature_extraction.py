@@ -3,33 +3,99 @@ import logging
 
 from openai import APIError, RateLimitError
 
-from .client import client
+from .client import async_client, client
+from ..config import settings
 from .prompts import EXTRACTION_SYSTEM_PROMPT
+from .scheduler import Priority, scheduler
+from .tokens import count_tokens, prompt_stats, truncate_to_tokens
+
+EXTRACTION_MODEL = "gpt-4.1-mini"
+# Completion allowance added to the prompt size when budgeting a call
+EXTRACTION_COMPLETION_TOKENS = 1000
+
+
+def _extraction_input(pdf_text: str) -> tuple[str, int]:
+    """
+    `pdf_text` cut to what EXTRACTION_PROMPT_TOKEN_BUDGET leaves after the
+    system prompt, and the estimated tokens for the whole call.
+    """
+    system_tokens = count_tokens(EXTRACTION_SYSTEM_PROMPT, EXTRACTION_MODEL)
+    text = truncate_to_tokens(pdf_text, settings.extraction_prompt_token_budget - system_tokens, EXTRACTION_MODEL)
+    prompt_tokens = system_tokens + count_tokens(text, EXTRACTION_MODEL)
+    prompt_stats.record("extraction", prompt_tokens, text != pdf_text)
+    return text, prompt_tokens + EXTRACTION_COMPLETION_TOKENS
+
+
+def _messages(pdf_text: str) -> list[dict[str, str]]:
+    return [
+        {"role": "system", "content": EXTRACTION_SYSTEM_PROMPT},
+        {"role": "user", "content": pdf_text},
+    ]
 
 
-def _call_responses_api(pdf_text: str) -> str:
-    return client.responses.create(
-        model="gpt-4.1-mini",
-        input=[
-            {"role": "system", "content": EXTRACTION_SYSTEM_PROMPT},
-            {"role": "user", "content": pdf_text[:6000]},
-        ],
-        response_format={"type": "json_object"},
+def _call_responses_api(pdf_text: str, tokens: int) -> str:
+    return scheduler.run(
+        EXTRACTION_MODEL,
+        tokens,
+        Priority.INGEST,
+        lambda: client.responses.create(
+            model=EXTRACTION_MODEL,
+            input=_messages(pdf_text),
+            response_format={"type": "json_object"},
+        ),
     ).output[0].content[0].text
 
 
-def _call_chat_api(pdf_text: str) -> str:
-    resp = client.chat.completions.create(
-        model="gpt-4.1-mini",
-        messages=[
-            {"role": "system", "content": EXTRACTION_SYSTEM_PROMPT},
-            {"role": "user", "content": pdf_text[:6000]},
-        ],
-        response_format={"type": "json_object"},
+def _call_chat_api(pdf_text: str, tokens: int) -> str:
+    resp = scheduler.run(
+        EXTRACTION_MODEL,
+        tokens,
+        Priority.INGEST,
+        lambda: client.chat.completions.create(
+            model=EXTRACTION_MODEL,
+            messages=_messages(pdf_text),
+            response_format={"type": "json_object"},
+        ),
     )
     return resp.choices[0].message.content
 
 
+async def _acall_responses_api(pdf_text: str, tokens: int, priority: Priority) -> str:
+    resp = await scheduler.arun(
+        EXTRACTION_MODEL,
+        tokens,
+        priority,
+        lambda: async_client.responses.create(
+            model=EXTRACTION_MODEL,
+            input=_messages(pdf_text),
+            response_format={"type": "json_object"},
+        ),
+    )
+    return resp.output[0].content[0].text
+
+
+async def _acall_chat_api(pdf_text: str, tokens: int, priority: Priority) -> str:
+    resp = await scheduler.arun(
+        EXTRACTION_MODEL,
+        tokens,
+        priority,
+        lambda: async_client.chat.completions.create(
+            model=EXTRACTION_MODEL,
+            messages=_messages(pdf_text),
+            response_format={"type": "json_object"},
+        ),
+    )
+    return resp.choices[0].message.content
+
+
+def _parse_features(content: str) -> dict:
+    try:
+        return json.loads(content)
+    except Exception as exc:
+        logging.warning("OpenAI feature extraction JSON parse error: %s", exc)
+        return {"canonical": {}, "dynamic_features": {}}
+
+
 def extract_features_from_pdf_text(pdf_text: str) -> dict:
     if not pdf_text.strip():
         return {"canonical": {}, "dynamic_features": {}}
@@ -39,11 +105,12 @@ def extract_features_from_pdf_text(pdf_text: str) -> dict:
         # Dev fallback when no API key is configured
         return {"canonical": {}, "dynamic_features": {}}
 
+    pdf_text, tokens = _extraction_input(pdf_text)
     try:
         try:
-            content = _call_responses_api(pdf_text)
+            content = _call_responses_api(pdf_text, tokens)
         except TypeError:
-            content = _call_chat_api(pdf_text)
+            content = _call_chat_api(pdf_text, tokens)
     except (RateLimitError, APIError) as exc:
         logging.warning("OpenAI feature extraction failed: %s", exc)
         return {"canonical": {}, "dynamic_features": {}}
@@ -51,13 +118,37 @@ def extract_features_from_pdf_text(pdf_text: str) -> dict:
         logging.warning("OpenAI feature extraction unexpected error: %s", exc)
         return {"canonical": {}, "dynamic_features": {}}
 
+    return _parse_features(content)
+
+
+async def aextract_features_from_pdf_text(
+    pdf_text: str, strict: bool = False, priority: Priority = Priority.INGEST
+) -> dict:
+    """
+    Async `extract_features_from_pdf_text`, on the shared AsyncOpenAI client.
+    With `strict`, a failed call raises instead of returning empty features.
+    """
+    if not pdf_text.strip() or not async_client.api_key:
+        return {"canonical": {}, "dynamic_features": {}}
+
+    pdf_text, tokens = _extraction_input(pdf_text)
     try:
-        data = json.loads(content)
-    except Exception as exc:
-        logging.warning("OpenAI feature extraction JSON parse error: %s", exc)
+        try:
+            content = await _acall_responses_api(pdf_text, tokens, priority)
+        except TypeError:
+            content = await _acall_chat_api(pdf_text, tokens, priority)
+    except (RateLimitError, APIError) as exc:
+        if strict:
+            raise
+        logging.warning("OpenAI feature extraction failed: %s", exc)
+        return {"canonical": {}, "dynamic_features": {}}
+    except Exception as exc:  # safety net
+        if strict:
+            raise
+        logging.warning("OpenAI feature extraction unexpected error: %s", exc)
         return {"canonical": {}, "dynamic_features": {}}
 
-    return data
+    return _parse_features(content)
 
 
 def build_self_text(who_am_i: str, pdf_text: str, canonical: dict, dynamic: dict) -> str:
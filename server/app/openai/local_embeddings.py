@@ -0,0 +1,79 @@
+"""
+Deterministic offline embeddings: feature-hashed word unigrams, word bigrams
+and character trigrams, projected into `settings.embedding_dim` dimensions.
+Texts that share words and spellings get similar vectors, which is enough to
+exercise matching at scale without network access. They do not live in the
+same space as OpenAI embeddings, so the two must never be mixed in one
+database.
+"""
+import asyncio
+import re
+import zlib
+from typing import Dict, List, Sequence
+
+import numpy as np
+
+from .scheduler import Priority
+
+_WORD_RE = re.compile(r"\w+", re.UNICODE)
+# Relative weight of each feature family in the projected vector
+_WORD_WEIGHT = 1.0
+_BIGRAM_WEIGHT = 0.7
+_TRIGRAM_WEIGHT = 0.3
+
+
+def _features(text: str) -> tuple[List[bytes], List[float]]:
+    words = _WORD_RE.findall(text.lower())
+    feats: List[bytes] = []
+    weights: List[float] = []
+    for word in words:
+        feats.append(b"w:" + word.encode("utf-8"))
+        weights.append(_WORD_WEIGHT)
+        padded = f"<{word}>"
+        for i in range(len(padded) - 2):
+            feats.append(b"c:" + padded[i : i + 3].encode("utf-8"))
+            weights.append(_TRIGRAM_WEIGHT)
+    for first, second in zip(words, words[1:]):
+        feats.append(f"b:{first} {second}".encode("utf-8"))
+        weights.append(_BIGRAM_WEIGHT)
+    return feats, weights
+
+
+class HashingEmbeddingProvider:
+    """
+    Signed feature hashing (the hashing trick): each feature adds ±weight to
+    one of `dim` slots picked by its CRC32, so collisions cancel out on
+    average. Counts are log-damped and rows L2-normalised, all in one NumPy
+    pass per batch.
+    """
+
+    name = "local-hash-v1"
+    cacheable = False  # recomputing is cheaper than a cache lookup
+
+    def __init__(self, dim: int) -> None:
+        self.dim = dim
+
+    def encode(self, texts: Sequence[str]) -> np.ndarray:
+        rows: List[int] = []
+        hashes: List[int] = []
+        weights: List[float] = []
+        for row, text in enumerate(texts):
+            feats, feat_weights = _features(text)
+            rows.extend([row] * len(feats))
+            hashes.extend(zlib.crc32(feat) for feat in feats)
+            weights.extend(feat_weights)
+        h = np.asarray(hashes, dtype=np.uint32)
+        # Low bits pick the slot, the top bit the sign
+        signs = np.where(h >> 31, -1.0, 1.0) * np.asarray(weights, dtype=np.float64)
+        matrix = np.zeros((len(texts), self.dim), dtype=np.float64)
+        np.add.at(matrix, (np.asarray(rows, dtype=np.intp), (h % self.dim).astype(np.intp)), signs)
+        matrix = np.sign(matrix) * np.log1p(np.abs(matrix))
+        norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+        np.divide(matrix, norms, out=matrix, where=norms > 0)
+        return matrix
+
+    def embed(self, texts: List[str], priority: Priority) -> Dict[str, Sequence[float]]:
+        return dict(zip(texts, self.encode(texts).tolist()))
+
+    async def aembed(self, texts: List[str], priority: Priority) -> Dict[str, Sequence[float]]:
+        return await asyncio.to_thread(self.embed, texts, priority)
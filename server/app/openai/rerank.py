@@ -1,16 +1,37 @@
+import hashlib
 import json
 import logging
-from typing import List, Dict, Any, Optional, Tuple
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from typing import Callable, Iterator, List, Dict, Any, Optional, Tuple
 
 import numpy as np
 from openai import APIError, RateLimitError
+from sqlalchemy import delete, select
+from sqlalchemy.exc import SQLAlchemyError
 from sqlalchemy.orm import Session
-from collections.abc import Sequence
 
-from ..db.models import Profile
-from ..utils.geo import geocode_city, haversine_km
+from ..config import settings
+from ..db.models import Profile, RerankScore
+from ..matching import _batch_from_rows, _component_scores
+from ..utils.geo import distance_decay, haversine_km_many, lookup_cities_cached
 from .client import client
 from .prompts import RERANK_SYSTEM_PROMPT
+from .scheduler import Priority, scheduler
+from .tokens import count_tokens, fit_fields, prompt_stats
+
+RERANK_MODEL = "gpt-4.1-mini"
+# Cached verdicts are only reused under the same model and prompt
+RERANK_PROMPT_VERSION = hashlib.sha256(f"{RERANK_MODEL}\0{RERANK_SYSTEM_PROMPT}".encode("utf-8")).hexdigest()[:16]
+
+# Shared by all requests, so RERANK_MAX_CONCURRENCY caps shard calls process-wide
+_shard_pool = ThreadPoolExecutor(max_workers=settings.rerank_max_concurrency, thread_name_prefix="rerank")
+
+# Completion allowance per candidate (score plus four short reasons) when budgeting a call
+RERANK_COMPLETION_TOKENS_PER_CANDIDATE = 150
+
+_VERDICT_FIELDS = ("reason", "pref_to_self_reason", "self_to_pref_reason", "location_reason", "location_open")
+# Score breakdown shown with each candidate, in `_components` column order
+_COMPONENTS = ("pref_to_self", "self_to_pref", "canonical", "dynamic", "distance")
 
 
 def _canonical_text(canon: Dict[str, Any] | None) -> str:
@@ -44,103 +65,376 @@ def _dynamic_text(dynamic: Dict[str, Any] | None) -> str:
             parts.append(f"{k}: {text}")
     return "; ".join(parts)
 
-def _is_vector(vec: Sequence | None) -> bool:
-    return vec is not None and not isinstance(vec, (str, bytes))
 
+def _proximities(seeker: Profile, cands: List[Profile]) -> np.ndarray:
+    """
+    Proximity bonus of each candidate to the seeker, from one batched
+    haversine; 0 without coordinates. Profiles not geocoded yet are placed
+    by city from one cached lookup, never the network, while a user waits.
+    """
+    profiles = [seeker, *cands]
+    unplaced = [p for p in profiles if p.location_lat is None or p.location_lon is None]
+    by_city = lookup_cities_cached((p.canonical or {}).get("city") for p in unplaced) if unplaced else {}
+    coords = np.full((len(profiles), 2), np.nan)
+    for i, profile in enumerate(profiles):
+        if profile.location_lat is not None and profile.location_lon is not None:
+            coords[i] = profile.location_lat, profile.location_lon
+        else:
+            city = (profile.canonical or {}).get("city")
+            if isinstance(city, str) and city in by_city:
+                coords[i] = by_city[city]
+    if not cands or np.isnan(coords[0]).any():
+        return np.zeros(len(cands), dtype=np.float64)
+    distances = haversine_km_many(coords[0, 0], coords[0, 1], coords[1:, 0], coords[1:, 1])
+    return np.nan_to_num(distance_decay(distances))
 
-def _cosine(a, b) -> float:
-    if not _is_vector(a) or not _is_vector(b):
-        return 0.0
-    try:
-        va = np.array(a, dtype=float)
-        vb = np.array(b, dtype=float)
-    except Exception:
-        return 0.0
-    denom = np.linalg.norm(va) * np.linalg.norm(vb)
-    if denom == 0:
-        return 0.0
-    return float(np.dot(va, vb) / denom)
-
-
-def _canonical_similarity(src: dict | None, cand: dict | None) -> float:
-    if not src or not cand:
-        return 0.0
-    keys = ["city", "state", "country", "education", "profession", "religion", "caste"]
-    matches = 0
-    total = 0
-    for k in keys:
-        s_val = (src.get(k) or "").strip().lower()
-        c_val = (cand.get(k) or "").strip().lower()
-        if not s_val or not c_val:
-            continue
-        total += 1
-        if s_val == c_val:
-            matches += 1
-    if total == 0:
-        return 0.0
-    return matches / total
-
-def _dynamic_similarity(src: dict | None, cand: dict | None) -> float:
-    if not src or not cand:
-        return 0.0
-    src_keys = set(src.keys())
-    cand_keys = set(cand.keys())
-    if not src_keys or not cand_keys:
-        return 0.0
-    overlap = src_keys & cand_keys
-    return len(overlap) / len(src_keys | cand_keys)
-
-
-
-def _coords_from_profile(profile: Profile) -> Optional[Tuple[float, float]]:
-    if profile.location_lat is not None and profile.location_lon is not None:
-        return profile.location_lat, profile.location_lon
-    city = (profile.canonical or {}).get("city")
-    return geocode_city(city) if city else None
-
-
-def _components_for(seeker: Profile, cand: Profile) -> dict[str, float]:
-    pref_to_self = _cosine(seeker.pref_embedding, cand.self_embedding)
-    self_to_pref = _cosine(seeker.self_embedding, cand.pref_embedding)
-    canonical_sim = _canonical_similarity(seeker.canonical, cand.canonical)
-    dynamic_sim = _dynamic_similarity(seeker.dynamic_features, cand.dynamic_features)
-    distance_bonus = 0.0
-
-    seeker_coords = _coords_from_profile(seeker)
-    if seeker_coords:
-        cand_coords = _coords_from_profile(cand)
-        if cand_coords:
-            dist_km = haversine_km(seeker_coords[0], seeker_coords[1], cand_coords[0], cand_coords[1])
-            distance_bonus = max(0.0, 1.0 - (dist_km / 1500.0))
 
+def _components(seeker: Profile, cands: List[Profile]) -> List[dict[str, float]]:
+    """
+    Score breakdown of each candidate, from the vectorised component scores
+    (interned feature codes included) that `top_matches` ranks with.
+    """
+    if not cands:
+        return []
+    columns = (*_component_scores(seeker, _batch_from_rows(cands)), _proximities(seeker, cands))
+    return [{name: float(values[i]) for name, values in zip(_COMPONENTS, columns)} for i in range(len(cands))]
+
+
+def _profile_version(profile: Profile) -> str:
+    """Hash of the profile fields the rerank prompt is built from."""
+    payload = json.dumps(
+        [
+            profile.who_am_i,
+            profile.looking_for,
+            profile.canonical,
+            profile.dynamic_features,
+            profile.location_lat,
+            profile.location_lon,
+        ],
+        sort_keys=True,
+        default=str,
+    )
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()[:16]
+
+
+def _cached_verdicts(db: Session, seeker: Profile, versions: dict[str, str]) -> dict[str, dict[str, Any]]:
+    rows = db.execute(
+        select(RerankScore)
+        .where(RerankScore.seeker_id == seeker.id)
+        .where(RerankScore.candidate_id.in_(list(versions)))
+        .where(RerankScore.prompt_version == RERANK_PROMPT_VERSION)
+    ).scalars()
     return {
-        "pref_to_self": pref_to_self,
-        "self_to_pref": self_to_pref,
-        "canonical": canonical_sim,
-        "dynamic": dynamic_sim,
-        "distance": distance_bonus,
+        row.candidate_id: {"score": row.score, **{field: getattr(row, field) for field in _VERDICT_FIELDS}}
+        for row in rows
+        if versions.get(row.candidate_id) == row.content_version
     }
 
 
-def rerank_with_llm(
+def _store_verdicts(
+    db: Session,
+    seeker: Profile,
+    versions: dict[str, str],
+    verdicts: dict[str, dict[str, Any]],
+) -> None:
+    """Store the pairs' new verdicts in place of any older content or prompt version."""
+    try:
+        db.execute(
+            delete(RerankScore)
+            .where(RerankScore.seeker_id == seeker.id)
+            .where(RerankScore.candidate_id.in_(list(verdicts)))
+        )
+        for cid, verdict in verdicts.items():
+            location_open = verdict.get("location_open")
+            db.merge(
+                RerankScore(
+                    seeker_id=seeker.id,
+                    candidate_id=cid,
+                    content_version=versions[cid],
+                    prompt_version=RERANK_PROMPT_VERSION,
+                    score=verdict["score"],
+                    reason=verdict.get("reason"),
+                    pref_to_self_reason=verdict.get("pref_to_self_reason"),
+                    self_to_pref_reason=verdict.get("self_to_pref_reason"),
+                    location_reason=verdict.get("location_reason"),
+                    location_open=location_open if isinstance(location_open, bool) else None,
+                )
+            )
+        db.commit()
+    except SQLAlchemyError as exc:  # e.g. a concurrent request stored the same pair first
+        db.rollback()
+        logging.warning("Storing rerank verdicts failed: %s", exc)
+
+
+def _parse_verdicts(content: str | None) -> dict[str, dict[str, Any]] | None:
+    try:
+        data = json.loads(content or "{}")
+
+        # We expect either:
+        #   { "candidates": [ { "profile_id": "...", "score": 0.87, "reason": "..." }, ... ] }
+        # or directly:
+        #   [ { "profile_id": "...", "score": 0.87, "reason": "..." }, ... ]
+        if isinstance(data, dict) and "candidates" in data:
+            items = data["candidates"]
+        elif isinstance(data, list):
+            items = data
+        else:
+            logging.warning("LLM rerank: unexpected JSON shape: %s", type(data))
+            return None
+
+        verdicts: dict[str, dict[str, Any]] = {}
+        for item in items:
+            pid = item.get("profile_id")
+            if not pid:
+                continue
+            verdicts[pid] = {
+                "score": float(item.get("score", 0.0)),
+                **{field: item.get(field) for field in _VERDICT_FIELDS},
+            }
+        return verdicts
+    except Exception as exc:
+        logging.warning("LLM rerank parse error: %s", exc)
+        return None
+
+
+def _without_duplicates(dynamic: Dict[str, Any] | None, canonical: Dict[str, Any] | None) -> Dict[str, Any]:
+    """Drop dynamic keys that repeat a canonical key; the prompt shows canonical first."""
+    seen = {str(k).strip().lower() for k in (canonical or {})}
+    return {k: v for k, v in (dynamic or {}).items() if str(k).strip().lower() not in seen}
+
+
+def _fit_block(render: Callable[[Dict[str, str]], str], fields: Dict[str, str], budget: int) -> tuple[str, bool]:
+    """
+    Render a prompt block within `budget` tokens by trimming its free-text
+    fields: dynamic traits first, canonical facts last. Labels, ids and
+    scores are never cut, so a block cannot shrink below its skeleton.
+    """
+    room = budget - count_tokens(render({name: "" for name in fields}), RERANK_MODEL)
+    floor = max(0, min(16, room // (2 * len(fields))))
+    fitted, trimmed = fit_fields(
+        fields, room, ("dynamic", "who_am_i", "looking_for", "canonical"), RERANK_MODEL, floor=floor
+    )
+    return render(fitted), trimmed
+
+
+def _seeker_block(summary: Dict[str, Any]) -> tuple[str, bool]:
+    """Seeker block shared by every call/shard; capped at a quarter of the prompt budget."""
+    canonical = {k: v for k, v in summary["canonical"].items() if k != "name"}
+
+    def render(fields: Dict[str, str]) -> str:
+        return (
+            "Seeker:\n"
+            f"  profile_id: {summary['profile_id']}\n"
+            f"  name: {summary['name']}\n"
+            f"  who_am_i: {fields['who_am_i']}\n"
+            f"  looking_for: {fields['looking_for']}\n"
+            f"  canonical: {fields['canonical']}\n"
+            f"  dynamic: {fields['dynamic']}\n"
+        )
+
+    return _fit_block(
+        render,
+        {
+            "who_am_i": summary["who_am_i"],
+            "looking_for": summary["looking_for"],
+            "canonical": _canonical_text(canonical),
+            "dynamic": _dynamic_text(_without_duplicates(summary["dynamic_features"], canonical)),
+        },
+        settings.rerank_prompt_token_budget // 4,
+    )
+
+
+def _candidate_block(c: dict[str, Any], budget: int) -> tuple[str, bool]:
+    loc_prox = c.get("location_proximity")
+    loc_line = f"  location_proximity: {loc_prox:.3f}" if isinstance(loc_prox, (int, float)) else "  location_proximity: null"
+    canonical = {k: v for k, v in (c["canonical"] or {}).items() if k != "name"}
+
+    def render(fields: Dict[str, str]) -> str:
+        return (
+            f"- profile_id: {c['profile_id']}\n"
+            f"  name: {c.get('name', '')}\n"
+            f"  base_score: {c['base_score']:.3f}\n"
+            f"  who_am_i: {fields['who_am_i']}\n"
+            f"  looking_for: {fields['looking_for']}\n"
+            f"{loc_line}\n"
+            f"  canonical: {fields['canonical']}\n"
+            f"  dynamic: {fields['dynamic']}"
+        )
+
+    return _fit_block(
+        render,
+        {
+            "who_am_i": c.get("who_am_i", ""),
+            "looking_for": c["looking_for"],
+            "canonical": _canonical_text(canonical),
+            "dynamic": _dynamic_text(_without_duplicates(c["dynamic_features"], canonical)),
+        },
+        budget,
+    )
+
+
+def _request_verdicts(
+    seeker_block: str,
+    cand_payload: list[dict[str, Any]],
+    seeker_trimmed: bool = False,
+) -> dict[str, dict[str, Any]] | None:
+    """
+    One chat completion scoring `cand_payload`; None when the call or its JSON
+    fails. Candidates share what RERANK_PROMPT_TOKEN_BUDGET leaves after the
+    system prompt and seeker block.
+    """
+    fixed = count_tokens(RERANK_SYSTEM_PROMPT, RERANK_MODEL) + count_tokens(seeker_block, RERANK_MODEL)
+    per_candidate = (settings.rerank_prompt_token_budget - fixed) // max(len(cand_payload), 1)
+
+    trimmed = seeker_trimmed
+    candidates_block_lines: list[str] = ["Candidates:"]
+    for c in cand_payload:
+        block, cut = _candidate_block(c, per_candidate)
+        trimmed = trimmed or cut
+        candidates_block_lines.append(block)
+    candidates_block = "\n".join(candidates_block_lines)
+
+    messages = [
+        {"role": "system", "content": RERANK_SYSTEM_PROMPT},
+        {
+            "role": "user",
+            "content": f"{seeker_block}\n\n{candidates_block}",
+        },
+    ]
+    prompt_tokens = fixed + count_tokens(candidates_block, RERANK_MODEL)
+    prompt_stats.record("rerank", prompt_tokens, trimmed)
+
+    try:
+        resp = scheduler.run(
+            RERANK_MODEL,
+            prompt_tokens + RERANK_COMPLETION_TOKENS_PER_CANDIDATE * len(cand_payload),
+            Priority.INTERACTIVE,
+            lambda: client.chat.completions.create(
+                model=RERANK_MODEL,
+                messages=messages,
+                response_format={"type": "json_object"},
+                temperature=0.2,
+            ),
+        )
+        content = resp.choices[0].message.content
+    except (RateLimitError, APIError) as exc:
+        logging.warning("LLM rerank failed: %s", exc)
+        return None
+    except Exception as exc:
+        logging.warning("LLM rerank unexpected error: %s", exc)
+        return None
+
+    return _parse_verdicts(content)
+
+
+def _iter_shards(
+    seeker_block: str,
+    cand_payload: list[dict[str, Any]],
+    seeker_trimmed: bool = False,
+) -> Iterator[dict[str, dict[str, Any]]]:
+    """
+    Score `cand_payload` in shards of RERANK_SHARD_SIZE that share the seeker
+    block, at most RERANK_MAX_CONCURRENCY in flight across all requests, and
+    yield each shard's verdicts as it completes. A failed shard yields nothing.
+    """
+    size = settings.rerank_shard_size
+    if size <= 0 or len(cand_payload) <= size:
+        result = _request_verdicts(seeker_block, cand_payload, seeker_trimmed)
+        if result:
+            yield result
+        return
+
+    shards = [cand_payload[i : i + size] for i in range(0, len(cand_payload), size)]
+    futures = [_shard_pool.submit(_request_verdicts, seeker_block, shard, seeker_trimmed) for shard in shards]
+    for future in as_completed(futures):
+        result = future.result()
+        if result:
+            yield result
+
+
+def _calibrate_missing(
+    candidates: list[dict[str, Any]],
+    verdicts: dict[str, dict[str, Any]],
+    missing: set[str],
+) -> list[dict[str, Any]]:
+    """
+    Give candidates the LLM did not score (failed shard, omitted id) a score
+    on the LLM's scale: their base score mapped through the mean/spread of
+    the (base, LLM) pairs that were scored. Without such pairs they keep
+    their base score.
+    """
+    pairs = [
+        (float(c["base_score"]), verdicts[c["profile_id"]]["score"])
+        for c in candidates
+        if c.get("profile_id") in verdicts and c.get("base_score") is not None
+    ]
+    if not pairs:
+        return candidates
+    base, llm = np.array(pairs, dtype=float).T
+    scale = llm.std() / base.std() if len(pairs) > 1 and base.std() > 0 else 1.0
+
+    out = []
+    for c in candidates:
+        if c.get("profile_id") in missing and c.get("base_score") is not None:
+            calibrated = llm.mean() + (float(c["base_score"]) - base.mean()) * scale
+            c = {**c, "score": float(np.clip(calibrated, 0.0, 1.0))}
+        out.append(c)
+    return out
+
+
+def _merge_verdicts(
+    candidates: list[dict[str, Any]],
+    verdicts: dict[str, dict[str, Any]],
+    components_map: dict[str, dict[str, float]],
+    who_map: dict[str, str],
+    limit: int,
+) -> list[dict[str, Any]]:
+    """Merge LLM scores/reasons into existing candidates and re-sort."""
+    merged: list[dict[str, Any]] = []
+    for cand in candidates:
+        cid = cand.get("profile_id")
+        overrides = verdicts.get(cid)
+        base_components = cand.get("components") or components_map.get(cid)
+        base_score = cand.get("base_score", cand.get("score"))
+        if overrides:
+            cand = {
+                **cand,
+                "score": overrides["score"],
+                "base_score": base_score,
+                "reason": overrides.get("reason"),
+                "pref_to_self_reason": overrides.get("pref_to_self_reason"),
+                "self_to_pref_reason": overrides.get("self_to_pref_reason"),
+                "location_reason": overrides.get("location_reason"),
+                "location_open": overrides.get("location_open"),
+                "components": base_components,
+                "who_am_i": cand.get("who_am_i") or who_map.get(cid) or "",
+            }
+        elif base_components:
+            cand = {
+                **cand,
+                "base_score": base_score,
+                "components": base_components,
+                "who_am_i": cand.get("who_am_i") or who_map.get(cid) or "",
+            }
+        else:
+            cand = {**cand, "base_score": base_score, "who_am_i": cand.get("who_am_i") or who_map.get(cid) or ""}
+        merged.append(cand)
+
+    merged.sort(key=lambda x: x.get("score", 0.0), reverse=True)
+    return merged[:limit]
+
+
+def iter_rerank_with_llm(
     seeker: Profile,
     candidates: List[Dict[str, Any]],
     db: Session | None = None,
     limit: int = 20,
-) -> List[Dict[str, Any]]:
+) -> Iterator[Tuple[str, Any]]:
     """
-    Rerank candidates using an LLM, focusing on:
-    - mutual fit (seeker <-> candidate)
-    - seeker preferences expressed in `looking_for` overriding strict canonical/dynamic similarity
-    - short reason for each score
-
-    Expects `candidates` items to have:
-      - profile_id
-      - score (pre-LLM score)
-      - canonical (dict)
-      - dynamic_features (dict)
-      - looking_for (str, candidate's own preferences)
-      - optionally: who_am_i (if you add it later)
+    `rerank_with_llm` as a stream of events:
+    - ("verdicts", {profile_id: verdict}) for the cached verdicts, then once
+      per LLM call (or shard) as it completes
+    - ("ranking", merged candidates) last; this is what `rerank_with_llm` returns
     """
     def _annotate_base(items: list[dict[str, Any]]) -> list[dict[str, Any]]:
         return [
@@ -154,7 +448,8 @@ def rerank_with_llm(
     candidates = _annotate_base(candidates)
 
     if not client.api_key or not candidates:
-        return candidates[:limit]
+        yield "ranking", candidates[:limit]
+        return
 
     # Build seeker summary
     seeker_summary = {
@@ -166,28 +461,32 @@ def rerank_with_llm(
         "dynamic_features": seeker.dynamic_features or {},
     }
 
-    # Precompute component breakdowns using DB profiles if available
+    # Precompute component breakdowns and content versions using DB profiles if available
     components_map: dict[str, dict[str, float]] = {}
     who_map: dict[str, str] = {}
+    versions: dict[str, str] = {}
     if db:
-        for c in candidates:
-            cid = c.get("profile_id")
-            if not cid:
-                continue
-            cand_profile = db.get(Profile, cid)
-            if not cand_profile:
-                continue
-            try:
-                components_map[cid] = _components_for(seeker, cand_profile)
-                if cand_profile.who_am_i:
-                    who_map[cid] = cand_profile.who_am_i
-            except Exception as exc:  # defensive; avoid breaking rerank on one failure
-                logging.warning("Component calc failed for %s: %s", cid, exc)
-
-    # Trim candidates for LLM context (LLM will only see at most `limit`)
+        seeker_version = _profile_version(seeker)
+        ids = [c["profile_id"] for c in candidates if c.get("profile_id")]
+        loaded = {p.id: p for p in db.execute(select(Profile).where(Profile.id.in_(ids))).scalars()} if ids else {}
+        # In candidate order
+        cand_profiles: dict[str, Profile] = {cid: loaded[cid] for cid in ids if cid in loaded}
+        components_map = dict(zip(cand_profiles, _components(seeker, list(cand_profiles.values()))))
+        for cid, cand_profile in cand_profiles.items():
+            versions[cid] = f"{seeker_version}:{_profile_version(cand_profile)}"
+            if cand_profile.who_am_i:
+                who_map[cid] = cand_profile.who_am_i
+
+    cached = _cached_verdicts(db, seeker, versions) if db and versions else {}
+    if cached:
+        yield "verdicts", cached
+
+    # Trim candidates for LLM context (LLM will only see at most `limit`), skipping cached pairs
     cand_payload: list[dict[str, Any]] = []
     for c in candidates[:limit]:
         cid = c.get("profile_id")
+        if cid in cached:
+            continue
         cand_payload.append(
             {
                 "profile_id": cid,
@@ -204,119 +503,57 @@ def rerank_with_llm(
         )
 
     # Build a single structured text block – this is easier for the LLM to parse
-    seeker_block = (
-        "Seeker:\n"
-        f"  profile_id: {seeker_summary['profile_id']}\n"
-        f"  name: {seeker_summary['name']}\n"
-        f"  who_am_i: {seeker_summary['who_am_i']}\n"
-        f"  looking_for: {seeker_summary['looking_for']}\n"
-        f"  canonical: {_canonical_text(seeker_summary['canonical'])}\n"
-        f"  dynamic: {_dynamic_text(seeker_summary['dynamic_features'])}\n"
-    )
-
-    candidates_block_lines: list[str] = ["Candidates:"]
-    for c in cand_payload:
-        loc_prox = c.get("location_proximity")
-        loc_line = f"  location_proximity: {loc_prox:.3f}" if isinstance(loc_prox, (int, float)) else "  location_proximity: null"
-        candidates_block_lines.append(
-            (
-                f"- profile_id: {c['profile_id']}\n"
-                f"  name: {c.get('name', '')}\n"
-                f"  base_score: {c['base_score']:.3f}\n"
-                f"  who_am_i: {c.get('who_am_i', '')}\n"
-                f"  looking_for: {c['looking_for']}\n"
-                f"{loc_line}\n"
-                f"  canonical: {_canonical_text(c['canonical'])}\n"
-                f"  dynamic: {_dynamic_text(c['dynamic_features'])}"
-            )
-        )
-    candidates_block = "\n".join(candidates_block_lines)
+    seeker_block, seeker_trimmed = _seeker_block(seeker_summary)
+
+    verdicts = dict(cached)
+    if cand_payload:
+        # Only pairs we asked about; the model may invent ids
+        sent = {c["profile_id"] for c in cand_payload}
+        fresh: dict[str, dict[str, Any]] = {}
+        for shard in _iter_shards(seeker_block, cand_payload, seeker_trimmed):
+            shard = {cid: v for cid, v in shard.items() if cid in sent}
+            if shard:
+                fresh.update(shard)
+                yield "verdicts", shard
+        if not fresh and not cached:
+            yield "ranking", candidates[:limit]
+            return
+        if db and fresh:
+            _store_verdicts(db, seeker, versions, {cid: v for cid, v in fresh.items() if cid in versions})
+        verdicts.update(fresh)
+        missing = sent - verdicts.keys()
+        if missing:
+            candidates = _calibrate_missing(candidates, verdicts, missing)
+
+    yield "ranking", _merge_verdicts(candidates, verdicts, components_map, who_map, limit)
 
-    messages = [
-        {"role": "system", "content": RERANK_SYSTEM_PROMPT},
-        {
-            "role": "user",
-            "content": f"{seeker_block}\n\n{candidates_block}",
-        },
-    ]
 
-    try:
-        resp = client.chat.completions.create(
-            model="gpt-4.1-mini",
-            messages=messages,
-            response_format={"type": "json_object"},
-            temperature=0.2,
-        )
-        content = resp.choices[0].message.content
-    except (RateLimitError, APIError) as exc:
-        logging.warning("LLM rerank failed: %s", exc)
-        return candidates[:limit]
-    except Exception as exc:
-        logging.warning("LLM rerank unexpected error: %s", exc)
-        return candidates[:limit]
-
-    try:
-        data = json.loads(content or "{}")
-
-        # We expect either:
-        #   { "candidates": [ { "profile_id": "...", "score": 0.87, "reason": "..." }, ... ] }
-        # or directly:
-        #   [ { "profile_id": "...", "score": 0.87, "reason": "..." }, ... ]
-        if isinstance(data, dict) and "candidates" in data:
-            items = data["candidates"]
-        elif isinstance(data, list):
-            items = data
-        else:
-            logging.warning("LLM rerank: unexpected JSON shape: %s", type(data))
-            return candidates[:limit]
+def rerank_with_llm(
+    seeker: Profile,
+    candidates: List[Dict[str, Any]],
+    db: Session | None = None,
+    limit: int = 20,
+) -> List[Dict[str, Any]]:
+    """
+    Rerank candidates using an LLM, focusing on:
+    - mutual fit (seeker <-> candidate)
+    - seeker preferences expressed in `looking_for` overriding strict canonical/dynamic similarity
+    - short reason for each score
 
-        reranked_map: dict[str, dict[str, Any]] = {}
-        for item in items:
-            pid = item.get("profile_id")
-            if not pid:
-                continue
-            reranked_map[pid] = {
-                "score": float(item.get("score", 0.0)),
-                "reason": item.get("reason"),
-                "pref_to_self_reason": item.get("pref_to_self_reason"),
-                "self_to_pref_reason": item.get("self_to_pref_reason"),
-                "location_reason": item.get("location_reason"),
-                "location_open": item.get("location_open"),
-            }
+    With a `db`, verdicts are stored per (seeker, candidate, content version,
+    prompt version) in `rerank_scores`; only candidates without a stored
+    verdict are sent to the LLM.
 
-        # Merge LLM scores/reasons into existing candidates
-        merged: list[dict[str, Any]] = []
-        for cand in candidates:
-            cid = cand.get("profile_id")
-            overrides = reranked_map.get(cid)
-            base_components = cand.get("components") or components_map.get(cid)
-            base_score = cand.get("base_score", cand.get("score"))
-            if overrides:
-                cand = {
-                    **cand,
-                    "score": overrides["score"],
-                    "base_score": base_score,
-                    "reason": overrides.get("reason"),
-                    "pref_to_self_reason": overrides.get("pref_to_self_reason"),
-                    "self_to_pref_reason": overrides.get("self_to_pref_reason"),
-                    "location_reason": overrides.get("location_reason"),
-                    "location_open": overrides.get("location_open"),
-                    "components": base_components,
-                    "who_am_i": cand.get("who_am_i") or who_map.get(cid) or "",
-                }
-            elif base_components:
-                cand = {
-                    **cand,
-                    "base_score": base_score,
-                    "components": base_components,
-                    "who_am_i": cand.get("who_am_i") or who_map.get(cid) or "",
-                }
-            else:
-                cand = {**cand, "base_score": base_score, "who_am_i": cand.get("who_am_i") or who_map.get(cid) or ""}
-            merged.append(cand)
-
-        merged.sort(key=lambda x: x.get("score", 0.0), reverse=True)
-        return merged[:limit]
-    except Exception as exc:
-        logging.warning("LLM rerank parse error: %s", exc)
-        return candidates[:limit]
+    Expects `candidates` items to have:
+      - profile_id
+      - score (pre-LLM score)
+      - canonical (dict)
+      - dynamic_features (dict)
+      - looking_for (str, candidate's own preferences)
+      - optionally: who_am_i (if you add it later)
+    """
+    ranking: List[Dict[str, Any]] = []
+    for kind, payload in iter_rerank_with_llm(seeker, candidates, db=db, limit=limit):
+        if kind == "ranking":
+            ranking = payload
+    return ranking
@@ -0,0 +1,269 @@
+"""
+Every OpenAI request goes through `scheduler`. It holds a requests/min and
+a tokens/min token bucket per model, admits queued calls in priority order
+(interactive before ingest before bulk), and retries rate limits and
+transient errors with jittered exponential backoff.
+"""
+import asyncio
+import heapq
+import itertools
+import logging
+import random
+import threading
+import time
+from collections import deque
+from enum import IntEnum
+from typing import Any, Awaitable, Callable, Deque, Dict, List, Tuple, TypeVar
+
+from openai import APIConnectionError, APIError, APIStatusError, APITimeoutError, InternalServerError, RateLimitError
+
+from ..config import settings
+
+T = TypeVar("T")
+
+RETRYABLE_ERRORS = (RateLimitError, APITimeoutError, APIConnectionError, InternalServerError)
+# How long an async waiter sleeps between checks while another call is ahead of it
+_ASYNC_POLL_SECONDS = 0.01
+_WAIT_SAMPLES = 1000
+
+
+class Priority(IntEnum):
+    """Lower values are admitted first when calls queue for the same model."""
+
+    INTERACTIVE = 0  # a user is waiting on the response (rerank, canonical match)
+    INGEST = 1  # profile uploads
+    BULK = 2  # backfills and imports
+
+
+class _Bucket:
+    """Token bucket refilled continuously at `per_minute / 60` per second."""
+
+    def __init__(self, per_minute: int) -> None:
+        self.capacity = float(max(per_minute, 1))
+        self.rate = self.capacity / 60.0
+        self.level = self.capacity
+        self.updated = time.monotonic()
+
+    def refill(self, now: float) -> None:
+        self.level = min(self.capacity, self.level + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def shortfall(self, amount: float) -> float:
+        """Seconds until `amount` is available (0 if it already is)."""
+        missing = min(amount, self.capacity) - self.level
+        return missing / self.rate if missing > 0 else 0.0
+
+
+class _ModelState:
+    def __init__(self, rpm: int, tpm: int) -> None:
+        self.requests = _Bucket(rpm)
+        self.tokens = _Bucket(tpm)
+        self.queue: List[Tuple[int, int]] = []  # heap of (priority, ticket)
+        self.in_flight = 0
+        self.calls = 0
+        self.retries = 0
+        self.failures = 0
+        self.tokens_used = 0
+        self.waits: Deque[float] = deque(maxlen=_WAIT_SAMPLES)
+
+
+class OpenAIScheduler:
+    def __init__(self, max_retries: int, backoff_base: float, backoff_max: float) -> None:
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        # Re-entrant, so _try_admit can run inside _acquire's wait loop
+        self._cond = threading.Condition(threading.RLock())
+        self._tickets = itertools.count()
+        self._models: Dict[str, _ModelState] = {}
+
+    @staticmethod
+    def _limits(model: str) -> Tuple[int, int]:
+        if model.startswith("text-embedding"):
+            return settings.openai_embedding_rpm, settings.openai_embedding_tpm
+        return settings.openai_chat_rpm, settings.openai_chat_tpm
+
+    def _state(self, model: str) -> _ModelState:
+        state = self._models.get(model)
+        if state is None:
+            state = self._models[model] = _ModelState(*self._limits(model))
+        return state
+
+    def _enqueue(self, model: str, priority: Priority) -> Tuple[int, int]:
+        with self._cond:
+            entry = (int(priority), next(self._tickets))
+            heapq.heappush(self._state(model).queue, entry)
+            return entry
+
+    def _try_admit(self, model: str, entry: Tuple[int, int], tokens: int) -> float:
+        """Admit `entry` if it heads the queue and both buckets allow; else seconds to wait."""
+        with self._cond:
+            state = self._models[model]
+            if state.queue[0] != entry:
+                return -1.0
+            now = time.monotonic()
+            state.requests.refill(now)
+            state.tokens.refill(now)
+            wait = max(state.requests.shortfall(1), state.tokens.shortfall(tokens))
+            if wait > 0:
+                return wait
+            state.requests.level -= 1
+            state.tokens.level -= min(tokens, state.tokens.capacity)
+            state.in_flight += 1
+            heapq.heappop(state.queue)
+            self._cond.notify_all()
+            return 0.0
+
+    def _acquire(self, model: str, tokens: int, priority: Priority) -> None:
+        start = time.monotonic()
+        entry = self._enqueue(model, priority)
+        with self._cond:
+            while True:
+                wait = self._try_admit(model, entry, tokens)
+                if wait == 0:
+                    break
+                # Not at the head: sleep until the queue moves
+                self._cond.wait(timeout=wait if wait > 0 else None)
+        self._record_wait(model, time.monotonic() - start)
+
+    async def _aacquire(self, model: str, tokens: int, priority: Priority) -> None:
+        start = time.monotonic()
+        entry = self._enqueue(model, priority)
+        try:
+            while True:
+                wait = self._try_admit(model, entry, tokens)
+                if wait == 0:
+                    break
+                await asyncio.sleep(wait if wait > 0 else _ASYNC_POLL_SECONDS)
+        except asyncio.CancelledError:
+            self._abandon(model, entry)
+            raise
+        self._record_wait(model, time.monotonic() - start)
+
+    def _abandon(self, model: str, entry: Tuple[int, int]) -> None:
+        with self._cond:
+            queue = self._models[model].queue
+            if entry in queue:
+                queue.remove(entry)
+                heapq.heapify(queue)
+                self._cond.notify_all()
+
+    def _record_wait(self, model: str, seconds: float) -> None:
+        with self._cond:
+            self._models[model].waits.append(seconds)
+
+    def _release(
+        self, model: str, estimated: int, outcome: str, response: Any = None, error: Exception | None = None
+    ) -> None:
+        """Settle the token estimate against reported usage and count the attempt."""
+        usage = getattr(response, "usage", None)
+        actual = getattr(usage, "total_tokens", None)
+        with self._cond:
+            state = self._models[model]
+            state.in_flight -= 1
+            if outcome == "ok":
+                state.calls += 1
+            elif outcome == "unsent":
+                # Failed before reaching the API (e.g. a client-side TypeError): refund it
+                state.requests.level = min(state.requests.capacity, state.requests.level + 1)
+                state.tokens.level = min(state.tokens.capacity, state.tokens.level + estimated)
+            elif outcome == "retry":
+                state.retries += 1
+                if isinstance(error, RateLimitError):
+                    # The server disagrees with our budget: make queued calls
+                    # wait for a full request slot to refill
+                    state.requests.level = min(state.requests.level, 0.0)
+            elif outcome == "failed":
+                state.failures += 1
+            if isinstance(actual, int):
+                state.tokens_used += actual
+                state.tokens.level = min(state.tokens.capacity, state.tokens.level + estimated - actual)
+            self._cond.notify_all()
+
+    def _backoff(self, attempt: int, exc: Exception) -> float:
+        """Full-jitter exponential backoff, or the server's Retry-After if it is longer."""
+        delay = random.uniform(0, min(self.backoff_max, self.backoff_base * 2**attempt))
+        if isinstance(exc, APIStatusError):
+            try:
+                delay = max(delay, float(exc.response.headers.get("retry-after", 0)))
+            except (TypeError, ValueError):
+                pass
+        return delay
+
+    @staticmethod
+    def _outcome(exc: Exception, retry: bool) -> str:
+        if retry:
+            return "retry"
+        return "failed" if isinstance(exc, APIError) else "unsent"
+
+    def _should_retry(self, model: str, attempt: int, exc: Exception) -> bool:
+        if not isinstance(exc, RETRYABLE_ERRORS) or attempt >= self.max_retries:
+            return False
+        logging.info("OpenAI %s call failed (%s), retry %d/%d", model, type(exc).__name__, attempt + 1, self.max_retries)
+        return True
+
+    def run(self, model: str, tokens: int, priority: Priority, call: Callable[[], T]) -> T:
+        """
+        Run `call` (one OpenAI request estimated at `tokens` prompt plus
+        completion tokens) once the budgets for `model` admit it. Rate limits
+        and transient errors are retried; the last error is raised.
+        """
+        for attempt in itertools.count():
+            self._acquire(model, tokens, priority)
+            try:
+                response = call()
+            except Exception as exc:
+                retry = self._should_retry(model, attempt, exc)
+                self._release(model, tokens, self._outcome(exc, retry), error=exc)
+                if not retry:
+                    raise
+                time.sleep(self._backoff(attempt, exc))
+                continue
+            self._release(model, tokens, "ok", response=response)
+            return response
+
+    async def arun(self, model: str, tokens: int, priority: Priority, call: Callable[[], Awaitable[T]]) -> T:
+        """Async `run`; `call` returns a fresh awaitable per attempt."""
+        for attempt in itertools.count():
+            await self._aacquire(model, tokens, priority)
+            try:
+                response = await call()
+            except asyncio.CancelledError:
+                self._release(model, tokens, "cancelled")
+                raise
+            except Exception as exc:
+                retry = self._should_retry(model, attempt, exc)
+                self._release(model, tokens, self._outcome(exc, retry), error=exc)
+                if not retry:
+                    raise
+                await asyncio.sleep(self._backoff(attempt, exc))
+                continue
+            self._release(model, tokens, "ok", response=response)
+            return response
+
+    def stats(self) -> Dict[str, Any]:
+        with self._cond:
+            models = {}
+            for model, state in self._models.items():
+                waits = sorted(state.waits)
+                models[model] = {
+                    "queue_depth": len(state.queue),
+                    "in_flight": state.in_flight,
+                    "calls": state.calls,
+                    "retries": state.retries,
+                    "failures": state.failures,
+                    "tokens_used": state.tokens_used,
+                    "requests_available": int(state.requests.level),
+                    "tokens_available": int(state.tokens.level),
+                    "mean_wait_ms": 1000 * sum(waits) / len(waits) if waits else None,
+                    "p95_wait_ms": 1000 * waits[int(0.95 * (len(waits) - 1))] if waits else None,
+                    "max_wait_ms": 1000 * waits[-1] if waits else None,
+                }
+        return {"max_retries": self.max_retries, "models": models}
+
+
+scheduler = OpenAIScheduler(
+    max_retries=settings.openai_max_retries,
+    backoff_base=settings.openai_backoff_base_seconds,
+    backoff_max=settings.openai_backoff_max_seconds,
+)
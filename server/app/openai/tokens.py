@@ -0,0 +1,105 @@
+import logging
+import threading
+from functools import lru_cache
+from typing import Any, Dict, Sequence
+
+try:
+    import tiktoken
+except ImportError:  # optional; counts fall back to a character estimate
+    tiktoken = None
+
+# Characters per token for the fallback estimate; English prose averages ~4,
+# so this errs high and budgets stay within the real limits
+_CHARS_PER_TOKEN = 3
+_ELLIPSIS = "…"
+
+
+@lru_cache(maxsize=8)
+def _encoding(model: str):
+    if tiktoken is None:
+        return None
+    try:
+        return tiktoken.encoding_for_model(model)
+    except KeyError:
+        return tiktoken.get_encoding("o200k_base")
+    except Exception as exc:  # e.g. the BPE file cannot be downloaded
+        logging.warning("tiktoken unavailable for %s, estimating token counts: %s", model, exc)
+        return None
+
+
+def count_tokens(text: str, model: str) -> int:
+    if not text:
+        return 0
+    enc = _encoding(model)
+    if enc is None:
+        return len(text) // _CHARS_PER_TOKEN + 1
+    return len(enc.encode(text, disallowed_special=()))
+
+
+def truncate_to_tokens(text: str, max_tokens: int, model: str) -> str:
+    """Cut `text` to at most `max_tokens`, marking the cut with an ellipsis."""
+    if max_tokens <= 0:
+        return ""
+    if count_tokens(text, model) <= max_tokens:
+        return text
+    enc = _encoding(model)
+    if enc is None:
+        return text[: max(0, (max_tokens - 1) * _CHARS_PER_TOKEN - 1)].rstrip() + _ELLIPSIS
+    return enc.decode(enc.encode(text, disallowed_special=())[: max_tokens - 1]).rstrip() + _ELLIPSIS
+
+
+def fit_fields(
+    fields: Dict[str, str],
+    budget: int,
+    trim_order: Sequence[str],
+    model: str,
+    floor: int = 16,
+) -> tuple[Dict[str, str], bool]:
+    """
+    Trim free-text `fields` until their total token count fits `budget`.
+    Fields are cut in `trim_order` (lowest priority first), each down to
+    `floor` tokens before the next one is touched; fields not listed are
+    never cut. Returns the fitted fields and whether anything was trimmed.
+    """
+    counts = {name: count_tokens(text, model) for name, text in fields.items()}
+    over = sum(counts.values()) - budget
+    if over <= 0:
+        return fields, False
+    fitted = dict(fields)
+    for name in trim_order:
+        if over <= 0:
+            break
+        cut = min(over, counts.get(name, 0) - floor)
+        if cut > 0:
+            fitted[name] = truncate_to_tokens(fields[name], counts[name] - cut, model)
+            over -= cut
+    return fitted, True
+
+
+class PromptStats:
+    """Per-prompt-kind size counters, reported at /stats/prompts."""
+
+    def __init__(self) -> None:
+        self._lock = threading.Lock()
+        self._kinds: Dict[str, Dict[str, int]] = {}
+
+    def record(self, kind: str, tokens: int, trimmed: bool) -> None:
+        with self._lock:
+            entry = self._kinds.setdefault(kind, {"calls": 0, "tokens": 0, "max_tokens": 0, "trimmed_calls": 0})
+            entry["calls"] += 1
+            entry["tokens"] += tokens
+            entry["max_tokens"] = max(entry["max_tokens"], tokens)
+            entry["trimmed_calls"] += int(trimmed)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            kinds = {kind: dict(entry) for kind, entry in self._kinds.items()}
+        return {
+            "tokenizer": "tiktoken" if _encoding("gpt-4.1-mini") is not None else "estimate",
+            "prompts": {
+                kind: {**entry, "mean_tokens": entry["tokens"] / entry["calls"]} for kind, entry in kinds.items()
+            },
+        }
+
+
+prompt_stats = PromptStats()
@@ -0,0 +1,80 @@
+"""
+Candidate-pool versions, one per gender partition, kept in the
+`pool_versions` table so every process sees the same numbers. Whatever
+writes profiles (API, ingest workers, bulk import, backfill commands) bumps
+the partitions it touched after committing, which also stamps the written
+rows with the new version; cached matches are keyed on the version and API
+processes refresh their in-memory index from the stamps when it moves.
+"""
+from typing import Dict, Iterable, List
+
+from sqlalchemy import select, update
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
+
+from .db import SessionLocal
+from .db.models import PoolVersion, Profile
+
+_STAMP_BATCH_SIZE = 500
+
+
+def partition_key(gender: str | None) -> str:
+    return (gender or "").strip().lower()
+
+
+def pool_version(db: Session, gender: str | None) -> int:
+    version = db.execute(
+        select(PoolVersion.version).where(PoolVersion.partition == partition_key(gender))
+    ).scalar_one_or_none()
+    return version or 0
+
+
+def pool_versions(db: Session) -> Dict[str, int]:
+    return {partition: version for partition, version in db.execute(select(PoolVersion.partition, PoolVersion.version))}
+
+
+def bump_pool_versions(profile_ids: Iterable[str]) -> Dict[str, int]:
+    """
+    Announce committed writes to these profiles: bump each touched partition's
+    version and stamp its profiles with the new number, in one transaction
+    per partition. The version row's lock orders concurrent bumps, so stamps
+    follow commit order and `EmbeddingIndex.refresh` can read exactly the rows
+    stamped after the version it holds. Returns the new versions.
+    """
+    ids = list(dict.fromkeys(profile_ids))
+    members: Dict[str, List[str]] = {}
+    versions: Dict[str, int] = {}
+    with SessionLocal() as db:
+        for start in range(0, len(ids), _STAMP_BATCH_SIZE):
+            chunk = ids[start : start + _STAMP_BATCH_SIZE]
+            for profile_id, gender in db.execute(select(Profile.id, Profile.gender).where(Profile.id.in_(chunk))):
+                members.setdefault(partition_key(gender), []).append(profile_id)
+        db.rollback()
+        for partition in sorted(members):
+            for _ in range(2):
+                try:
+                    bumped = db.execute(
+                        update(PoolVersion)
+                        .where(PoolVersion.partition == partition)
+                        .values(version=PoolVersion.version + 1)
+                    ).rowcount
+                    if not bumped:
+                        db.add(PoolVersion(partition=partition, version=1))
+                        db.flush()
+                    version = db.execute(
+                        select(PoolVersion.version).where(PoolVersion.partition == partition)
+                    ).scalar_one()
+                    stamped = members[partition]
+                    for start in range(0, len(stamped), _STAMP_BATCH_SIZE):
+                        db.execute(
+                            update(Profile)
+                            .where(Profile.id.in_(stamped[start : start + _STAMP_BATCH_SIZE]))
+                            .values(pool_version=version)
+                        )
+                    db.commit()
+                    versions[partition] = version
+                    break
+                except IntegrityError:
+                    # Another process created the row first; bump it instead
+                    db.rollback()
+    return versions
@@ -1,3 +1,3 @@
-from . import profiles
+from . import profiles, stats
 
-__all__ = ["profiles"]
+__all__ = ["profiles", "stats"]
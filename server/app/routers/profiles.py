@@ -1,30 +1,54 @@
-from uuid import uuid4
-from fastapi import APIRouter, UploadFile, File, Form, Depends, HTTPException
+import json
+import logging
+from typing import Any, Optional
+
+from fastapi import APIRouter, BackgroundTasks, UploadFile, File, Form, Depends, HTTPException, Query
+from fastapi.concurrency import run_in_threadpool
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import StreamingResponse
 from sqlalchemy.orm import Session
 
-from ..db import get_db
-from ..db.models import Profile
-from ..utils.file_utils import save_upload_file, extract_text_from_file
+from ..bulk_import import arun_import, claim_resume, create_import
+from ..config import settings
+from ..db import SessionLocal, get_db
+from ..db.models import BulkImport, IngestJob, Profile
+from ..ingest_queue import enqueue_job
+from ..utils.file_utils import UploadTooLarge, save_upload_file
 from ..openai import (
-    extract_features_from_pdf_text,
-    build_self_text,
-    build_pref_text,
-    get_embedding,
+    iter_rerank_with_llm,
     rerank_with_llm,
     score_canonical_fields,
 )
 from ..schemas.profile import (
+    BulkImportRequest,
+    BulkImportResponse,
     CanonicalMatchRequest,
     CanonicalMatchResponse,
+    IngestJobResponse,
     ProfileResponse,
 )
 from ..matching import top_matches
-from ..utils.geo import geocode_city
 
 router = APIRouter(prefix="/profile", tags=["profile"])
 
+# Optional radius filter on the match endpoints; ignored for seekers without coordinates
+MaxDistanceKm = Query(None, gt=0, description="Only candidates within this many km of the seeker")
 
-@router.post("", response_model=ProfileResponse)
+
+def _job_response(job: IngestJob) -> IngestJobResponse:
+    return IngestJobResponse(
+        job_id=job.id,
+        status=job.status,
+        stage=job.stage,
+        attempts=job.attempts,
+        profile_id=job.profile_id,
+        error=job.error,
+        created_at=job.created_at,
+        updated_at=job.updated_at,
+    )
+
+
+@router.post("", response_model=IngestJobResponse, status_code=202)
 async def create_profile(
     who_am_i: str = Form(...),
     looking_for: str = Form(...),
@@ -35,64 +59,150 @@ async def create_profile(
     if not who_am_i.strip() or not looking_for.strip():
         raise HTTPException(status_code=400, detail="who_am_i and looking_for are required")
 
-    # 1. Save + read file
-    pdf_path = save_upload_file(profile_file)
-    pdf_text = extract_text_from_file(pdf_path)
-
-    # 2. Feature extraction + embeddings
-    feat = extract_features_from_pdf_text(pdf_text)
-    canonical = feat.get("canonical", {})
-    dynamic = feat.get("dynamic_features", {})
-
-    self_text = build_self_text(who_am_i, pdf_text, canonical, dynamic)
-    pref_text = build_pref_text(looking_for)
-
-    self_emb = get_embedding(self_text)
-    pref_emb = get_embedding(pref_text)
-
-    coords = None
-    seeker_city = canonical.get("city")
-    if seeker_city:
-        coords = geocode_city(seeker_city)
-    # 3. Persist
-    profile = Profile(
-        id=str(uuid4()),
-        pdf_path=pdf_path,
-        pdf_text=pdf_text,
-        location_lat=coords[0] if coords else None,
-        location_lon=coords[1] if coords else None,
+    try:
+        upload = await run_in_threadpool(save_upload_file, profile_file)
+    except UploadTooLarge as exc:
+        raise HTTPException(status_code=413, detail=str(exc))
+    # Parsing, extraction, embeddings and geocoding run on the ingest workers;
+    # poll GET /profile/jobs/{job_id} for the resulting profile_id
+    job = await run_in_threadpool(
+        enqueue_job,
+        db,
         who_am_i=who_am_i,
         looking_for=looking_for,
         gender=gender,
-        canonical=canonical,
-        dynamic_features=dynamic,
-        self_embedding=self_emb,
-        pref_embedding=pref_emb,
+        pdf_path=upload.path,
+        content_hash=upload.sha256,
     )
-    db.add(profile)
-    db.commit()
-
-    return ProfileResponse(
-        profile_id=profile.id,
-        canonical=canonical,
-        dynamic_features=dynamic,
+    return _job_response(job)
+
+
+@router.get("/jobs/{job_id}", response_model=IngestJobResponse)
+def get_ingest_job(job_id: str, db: Session = Depends(get_db)):
+    job = db.get(IngestJob, job_id)
+    if not job:
+        raise HTTPException(status_code=404, detail="Job not found")
+    return _job_response(job)
+
+
+def _import_response(run: BulkImport) -> BulkImportResponse:
+    return BulkImportResponse(
+        import_id=run.id,
+        status=run.status,
+        source=run.source,
+        total=run.total,
+        position=run.position,
+        imported=run.imported,
+        skipped=run.skipped,
+        failed=run.failed,
+        errors=run.errors or [],
+        error=run.error,
+        elapsed_seconds=run.elapsed_seconds,
+        items_per_second=run.position / run.elapsed_seconds if run.elapsed_seconds else None,
+        stage_seconds=run.stage_seconds or {},
+        created_at=run.created_at,
+        updated_at=run.updated_at,
     )
 
 
+async def _run_import(import_id: str) -> None:
+    try:
+        await arun_import(import_id, root=settings.bulk_import_root)
+    except Exception:
+        # Already recorded on the import; resume it with POST /profile/imports/{id}/resume
+        logging.exception("Bulk import %s failed", import_id)
+
+
+@router.post("/imports", response_model=BulkImportResponse, status_code=202)
+async def create_bulk_import(payload: BulkImportRequest, background: BackgroundTasks, db: Session = Depends(get_db)):
+    """
+    Import every profile listed by a manifest or directory under
+    BULK_IMPORT_ROOT; poll GET /profile/imports/{import_id} for progress.
+    """
+    defaults = {
+        name: value
+        for name, value in (
+            ("who_am_i", payload.who_am_i),
+            ("looking_for", payload.looking_for),
+            ("gender", payload.gender),
+        )
+        if value
+    }
+    try:
+        run = await run_in_threadpool(create_import, db, payload.source, defaults, settings.bulk_import_root)
+    except (OSError, ValueError) as exc:
+        raise HTTPException(status_code=400, detail=str(exc))
+    background.add_task(_run_import, run.id)
+    return _import_response(run)
+
+
+@router.get("/imports/{import_id}", response_model=BulkImportResponse)
+def get_bulk_import(import_id: str, db: Session = Depends(get_db)):
+    run = db.get(BulkImport, import_id)
+    if not run:
+        raise HTTPException(status_code=404, detail="Import not found")
+    return _import_response(run)
+
+
+@router.post("/imports/{import_id}/resume", response_model=BulkImportResponse, status_code=202)
+def resume_bulk_import(import_id: str, background: BackgroundTasks, db: Session = Depends(get_db)):
+    run = db.get(BulkImport, import_id)
+    if not run:
+        raise HTTPException(status_code=404, detail="Import not found")
+    claimed = claim_resume(db, import_id)
+    db.refresh(run)
+    if not claimed:
+        raise HTTPException(status_code=409, detail=f"Import is {run.status}")
+    background.add_task(_run_import, run.id)
+    return _import_response(run)
+
+
 @router.get("/matches/{profile_id}", response_model=list[ProfileResponse])
-def get_matches(profile_id: str, db: Session = Depends(get_db)):
-    matches = top_matches(db, source_profile_id=profile_id, limit=50)
-    return [ProfileResponse(**m) for m in matches[:20]]
+def get_matches(profile_id: str, max_distance_km: Optional[float] = MaxDistanceKm, db: Session = Depends(get_db)):
+    matches = top_matches(db, source_profile_id=profile_id, limit=20, max_distance_km=max_distance_km)
+    return [ProfileResponse(**m) for m in matches]
 
 
 @router.get("/matches/ai/{profile_id}", response_model=list[ProfileResponse])
-def get_matches_rerank(profile_id: str, db: Session = Depends(get_db)):
-    matches = top_matches(db, source_profile_id=profile_id, limit=50)
+def get_matches_rerank(profile_id: str, max_distance_km: Optional[float] = MaxDistanceKm, db: Session = Depends(get_db)):
+    matches = top_matches(db, source_profile_id=profile_id, limit=50, max_distance_km=max_distance_km)
     seeker = db.get(Profile, profile_id)
     reranked = rerank_with_llm(seeker, matches, db=db, limit=20)
     return [ProfileResponse(**m) for m in reranked]
 
 
+def _sse(event: str, data: Any) -> str:
+    return f"event: {event}\ndata: {json.dumps(jsonable_encoder(data))}\n\n"
+
+
+@router.get("/matches/ai/{profile_id}/stream")
+def stream_matches_rerank(profile_id: str, max_distance_km: Optional[float] = MaxDistanceKm):
+    """
+    Server-sent events version of /matches/ai: `matches` carries the vector
+    ranking as soon as it is scored, `rerank` the LLM verdicts of each call or
+    shard as it completes, `ranking` the final order, then `done`.
+    """
+
+    def events():
+        # The stream outlives the request's dependencies, so it owns its session
+        with SessionLocal() as db:
+            matches = top_matches(db, source_profile_id=profile_id, limit=50, max_distance_km=max_distance_km)
+            yield _sse("matches", [ProfileResponse(**m) for m in matches[:20]])
+            seeker = db.get(Profile, profile_id)
+            for kind, payload in iter_rerank_with_llm(seeker, matches, db=db, limit=20):
+                if kind == "verdicts":
+                    yield _sse("rerank", [{"profile_id": cid, **verdict} for cid, verdict in payload.items()])
+                else:
+                    yield _sse("ranking", [ProfileResponse(**m) for m in payload])
+        yield _sse("done", {})
+
+    return StreamingResponse(
+        events(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+
 @router.post("/matches/canonical", response_model=CanonicalMatchResponse)
 def compare_canonical(payload: CanonicalMatchRequest):
     if not payload.seeker_canonical or not payload.candidate_canonical:
@@ -0,0 +1,42 @@
+from fastapi import APIRouter, Depends
+from sqlalchemy.orm import Session
+
+from ..db import get_db
+from ..embedding_cache import embedding_cache
+from ..ingest_queue import ingest_workers, job_counts
+from ..match_cache import match_cache
+from ..match_index import embedding_index
+from ..openai.scheduler import scheduler
+from ..openai.tokens import prompt_stats
+
+router = APIRouter(prefix="/stats", tags=["stats"])
+
+
+@router.get("/match-cache")
+def get_match_cache_stats():
+    return match_cache.stats()
+
+
+@router.get("/match-index")
+def get_match_index_stats():
+    return {"loaded": embedding_index.loaded, "partitions": embedding_index.stats()}
+
+
+@router.get("/embedding-cache")
+def get_embedding_cache_stats():
+    return embedding_cache.stats()
+
+
+@router.get("/prompts")
+def get_prompt_stats():
+    return prompt_stats.stats()
+
+
+@router.get("/openai")
+def get_openai_stats():
+    return scheduler.stats()
+
+
+@router.get("/ingest")
+def get_ingest_stats(db: Session = Depends(get_db)):
+    return {"workers": ingest_workers.running, "jobs": job_counts(db)}
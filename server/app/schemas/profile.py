@@ -1,3 +1,4 @@
+from datetime import datetime
 from typing import Any, Dict, List, Optional
 
 from pydantic import BaseModel, Field
@@ -27,6 +28,44 @@ class ProfileResponse(BaseModel):
         from_attributes = True
 
 
+class IngestJobResponse(BaseModel):
+    job_id: str
+    status: str
+    stage: Optional[str] = None
+    attempts: int = 0
+    profile_id: Optional[str] = None
+    error: Optional[str] = None
+    created_at: Optional[datetime] = None
+    updated_at: Optional[datetime] = None
+
+
+class BulkImportRequest(BaseModel):
+    # Manifest or directory, relative to BULK_IMPORT_ROOT
+    source: str = Field(..., min_length=1)
+    # Answers for every file of a directory without a manifest
+    who_am_i: Optional[str] = None
+    looking_for: Optional[str] = None
+    gender: Optional[str] = None
+
+
+class BulkImportResponse(BaseModel):
+    import_id: str
+    status: str
+    source: str
+    total: int = 0
+    position: int = 0
+    imported: int = 0
+    skipped: int = 0
+    failed: int = 0
+    errors: List[Dict[str, str]] = Field(default_factory=list)
+    error: Optional[str] = None
+    elapsed_seconds: float = 0.0
+    items_per_second: Optional[float] = None
+    stage_seconds: Dict[str, float] = Field(default_factory=dict)
+    created_at: Optional[datetime] = None
+    updated_at: Optional[datetime] = None
+
+
 class CanonicalFieldScore(BaseModel):
     field: str
     label: str
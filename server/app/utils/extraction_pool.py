@@ -0,0 +1,236 @@
+"""
+Upload text extraction in a process pool, so parsing never runs on a
+request or event-loop thread and a pathological document cannot hold one
+forever. Each parse task gets EXTRACTION_TIMEOUT_SECONDS from when a worker
+starts it; PDFs are cut at EXTRACTION_MAX_PAGES, and longer ones are split
+into page ranges parsed in parallel.
+"""
+import asyncio
+import itertools
+import logging
+import multiprocessing
+import os
+import signal
+import threading
+import time
+from concurrent.futures import Future, ProcessPoolExecutor
+from concurrent.futures import TimeoutError as FutureTimeout
+from concurrent.futures.process import BrokenProcessPool
+from typing import Any, Callable, Dict, List, Optional, Sequence, Set, Tuple, Union
+
+from ..config import settings
+from .file_utils import extract_pdf_pages, extract_text_from_file
+
+# Worker processes are recycled after this many tasks to cap parser memory growth
+_TASKS_PER_WORKER = 200
+
+
+class ExtractionTimeout(TimeoutError):
+    pass
+
+
+# Set in each worker process by `_init_worker`
+_started_queue: Any = None
+
+
+def _init_worker(started_queue: Any) -> None:
+    global _started_queue
+    _started_queue = started_queue
+
+
+def _run_task(task_id: int, fn: Callable[..., Any], *args: Any) -> Any:
+    _started_queue.put((task_id, os.getpid()))
+    return fn(*args)
+
+
+class _Workers:
+    """
+    A process pool whose workers report the pid that starts each task, so a
+    deadline can run from the task's start and a stuck task's own worker can
+    be killed.
+    """
+
+    def __init__(self, workers: int) -> None:
+        # The API process runs threads; forking it is not safe
+        ctx = multiprocessing.get_context("spawn")
+        self._queue = ctx.SimpleQueue()
+        self.executor = ProcessPoolExecutor(
+            max_workers=workers,
+            mp_context=ctx,
+            max_tasks_per_child=_TASKS_PER_WORKER,
+            initializer=_init_worker,
+            initargs=(self._queue,),
+        )
+        self._cond = threading.Condition()
+        self._ids = itertools.count()
+        self._pending: Set[int] = set()
+        self._started: Dict[int, Tuple[int, float]] = {}
+        threading.Thread(target=self._read_starts, name="extraction-starts", daemon=True).start()
+
+    def submit(self, fn: Callable[..., Any], *args: Any) -> Tuple[int, Future]:
+        # Registered before submitting, so the start report always finds it. The
+        # executor runs done callbacks under its own lock, so `_cond` must not be
+        # held across `submit`.
+        with self._cond:
+            task_id = next(self._ids)
+            self._pending.add(task_id)
+        try:
+            future = self.executor.submit(_run_task, task_id, fn, *args)
+        except RuntimeError as exc:
+            self._forget(task_id)
+            # Shut down by another thread's timeout; callers retry on BrokenProcessPool
+            raise BrokenProcessPool("the extraction pool was restarted") from exc
+        future.add_done_callback(lambda _: self._forget(task_id))
+        return task_id, future
+
+    def wait_started(self, task_id: int, future: Future) -> Optional[Tuple[int, float]]:
+        """(pid, monotonic start) of a task once it runs; None if it finished first."""
+        with self._cond:
+            self._cond.wait_for(lambda: task_id in self._started or future.done())
+            return self._started.get(task_id)
+
+    def _forget(self, task_id: int) -> None:
+        with self._cond:
+            self._pending.discard(task_id)
+            self._started.pop(task_id, None)
+            self._cond.notify_all()
+
+    def _read_starts(self) -> None:
+        while True:
+            message = self._queue.get()
+            if message is None:
+                return
+            task_id, pid = message
+            with self._cond:
+                if task_id in self._pending:
+                    self._started[task_id] = (pid, time.monotonic())
+                    self._cond.notify_all()
+
+    def shutdown(self) -> None:
+        self.executor.shutdown(wait=False, cancel_futures=True)
+        self._queue.put(None)
+
+
+class ExtractionPool:
+    def __init__(self, workers: int, timeout: float, max_pages: int, pages_per_task: int) -> None:
+        self.workers = workers
+        self.timeout = timeout
+        self.max_pages = max_pages
+        self.pages_per_task = max(pages_per_task, 1)
+        self._lock = threading.Lock()
+        self._workers: Optional[_Workers] = None
+
+    def _pool(self) -> _Workers:
+        with self._lock:
+            if self._workers is None:
+                self._workers = _Workers(self.workers)
+            return self._workers
+
+    def _retire(self, workers: _Workers, stuck_pid: Optional[int] = None) -> None:
+        """
+        Replace a pool, first killing the worker stuck past its deadline; the
+        executor API cannot cancel a running task. The executor treats any
+        dead worker as broken, so documents still in flight on it fail with
+        BrokenProcessPool and are retried once on the new pool.
+        """
+        with self._lock:
+            if self._workers is workers:
+                self._workers = None
+        if stuck_pid is not None:
+            try:
+                os.kill(stuck_pid, getattr(signal, "SIGKILL", signal.SIGTERM))
+            except ProcessLookupError:
+                pass
+        workers.shutdown()
+
+    def _start(self, workers: _Workers, path: str) -> Tuple[int, Future]:
+        if os.path.splitext(path)[1].lower() == ".pdf":
+            return workers.submit(extract_pdf_pages, path, 0, min(self.pages_per_task, self.max_pages))
+        return workers.submit(extract_text_from_file, path)
+
+    def _wait(self, workers: _Workers, task: Tuple[int, Future], path: str):
+        task_id, future = task
+        started = workers.wait_started(task_id, future)
+        remaining = self.timeout if started is None else started[1] + self.timeout - time.monotonic()
+        try:
+            return future.result(timeout=max(remaining, 0))
+        except FutureTimeout:
+            self._retire(workers, started[0])
+            raise ExtractionTimeout(f"No text from {os.path.basename(path)} within {self.timeout:g}s") from None
+
+    def _finish(self, workers: _Workers, first: Tuple[int, Future], path: str) -> str:
+        result = self._wait(workers, first, path)
+        if not isinstance(result, tuple):
+            return result
+        text, page_count = result
+        page_count = min(page_count, self.max_pages)
+        rest = [
+            workers.submit(extract_pdf_pages, path, start, min(start + self.pages_per_task, page_count))
+            for start in range(self.pages_per_task, page_count, self.pages_per_task)
+        ]
+        # One join over all ranges keeps assembly linear in the document size
+        return "\n".join([text] + [self._wait(workers, task, path)[0] for task in rest])
+
+    def extract(self, path: str) -> str:
+        """Text of one upload; raises ExtractionTimeout when a parse task overruns."""
+        if self.workers <= 0:
+            return extract_text_from_file(path, self.max_pages)
+        for attempt in range(2):
+            workers = self._pool()
+            try:
+                return self._finish(workers, self._start(workers, path), path)
+            except BrokenProcessPool:
+                if attempt:
+                    raise
+                logging.info("Extraction pool was restarted while parsing %s; retrying", path)
+                self._retire(workers)
+        raise AssertionError("unreachable")
+
+    async def aextract(self, path: str) -> str:
+        return await asyncio.to_thread(self.extract, path)
+
+    def extract_many(self, paths: Sequence[str]) -> List[Union[str, Exception]]:
+        """
+        Texts of many uploads (bulk import), all queued on the pool at once.
+        Each entry is the text or the exception for that file.
+        """
+        if self.workers <= 0:
+            return [self._safe(self.extract, path) for path in paths]
+        workers = self._pool()
+        firsts = [self._safe(self._start, workers, path) for path in paths]
+        out: List[Union[str, Exception]] = []
+        for path, first in zip(paths, firsts):
+            if workers is not self._workers:
+                # An earlier document timed out and took the pool down
+                out.append(self._safe(self.extract, path))
+                continue
+            result = first if isinstance(first, Exception) else self._safe(self._finish, workers, first, path)
+            if isinstance(result, BrokenProcessPool):
+                # Another thread's timeout killed a worker under this document; as in `extract`,
+                # it is parsed again on the new pool
+                logging.info("Extraction pool was restarted while parsing %s; retrying", path)
+                self._retire(workers)
+                result = self._safe(self.extract, path)
+            out.append(result)
+        return out
+
+    @staticmethod
+    def _safe(fn, *args) -> Union[str, Exception]:
+        try:
+            return fn(*args)
+        except Exception as exc:
+            return exc
+
+    def shutdown(self) -> None:
+        with self._lock:
+            workers, self._workers = self._workers, None
+        if workers is not None:
+            workers.shutdown()
+
+
+extraction_pool = ExtractionPool(
+    workers=settings.extraction_workers,
+    timeout=settings.extraction_timeout_seconds,
+    max_pages=settings.extraction_max_pages,
+    pages_per_task=settings.extraction_pages_per_task,
+)
@@ -1,5 +1,7 @@
+import hashlib
 import os
-from uuid import uuid4
+import tempfile
+from typing import BinaryIO, NamedTuple, Optional, Tuple
 
 import pdfplumber
 from docx import Document
@@ -9,27 +11,71 @@ from ..config import settings
 
 os.makedirs(settings.upload_dir, exist_ok=True)
 
+_CHUNK_SIZE = 1024 * 1024
 
-def save_upload_file(upload_file: UploadFile) -> str:
-    ext = os.path.splitext(upload_file.filename)[1].lower()
-    filename = f"{uuid4()}{ext}"
-    filepath = os.path.join(settings.upload_dir, filename)
 
-    with open(filepath, "wb") as buffer:
-        buffer.write(upload_file.file.read())
+class UploadTooLarge(ValueError):
+    pass
 
-    return filepath
 
+class SavedUpload(NamedTuple):
+    path: str
+    sha256: str
+    size: int
 
-def extract_text_from_file(filepath: str) -> str:
+
+def _store_stream(stream: BinaryIO, ext: str) -> SavedUpload:
+    """
+    Copy `stream` to `upload_dir` in chunks, hashing as it goes, and store
+    it content-addressed as `<sha256><ext>`; identical files share one copy.
+    Raises UploadTooLarge past MAX_UPLOAD_BYTES.
+    """
+    digest = hashlib.sha256()
+    size = 0
+    fd, tmp_path = tempfile.mkstemp(dir=settings.upload_dir, suffix=".part")
+    try:
+        with os.fdopen(fd, "wb") as buffer:
+            while chunk := stream.read(_CHUNK_SIZE):
+                size += len(chunk)
+                if size > settings.max_upload_bytes:
+                    raise UploadTooLarge(f"Upload exceeds the {settings.max_upload_bytes} byte limit")
+                digest.update(chunk)
+                buffer.write(chunk)
+        sha256 = digest.hexdigest()
+        filepath = os.path.join(settings.upload_dir, f"{sha256}{ext}")
+        if os.path.exists(filepath):
+            os.remove(tmp_path)
+        else:
+            os.replace(tmp_path, filepath)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+    return SavedUpload(filepath, sha256, size)
+
+
+def save_upload_file(upload_file: UploadFile) -> SavedUpload:
+    return _store_stream(upload_file.file, os.path.splitext(upload_file.filename or "")[1].lower())
+
+
+def store_local_file(path: str) -> SavedUpload:
+    """`save_upload_file` for a file already on this host (bulk imports)."""
+    with open(path, "rb") as stream:
+        return _store_stream(stream, os.path.splitext(path)[1].lower())
+
+
+def extract_pdf_pages(filepath: str, start: int = 0, stop: Optional[int] = None) -> Tuple[str, int]:
+    """Text of pages [start, stop), one line break between pages, and the document's page count."""
+    with pdfplumber.open(filepath) as pdf:
+        return "\n".join(page.extract_text() or "" for page in pdf.pages[start:stop]), len(pdf.pages)
+
+
+def extract_text_from_file(filepath: str, max_pages: Optional[int] = None) -> str:
+    """In-process extraction; the ingest paths go through `utils.extraction_pool` instead."""
     ext = os.path.splitext(filepath)[1].lower()
 
     if ext == ".pdf":
-        text = ""
-        with pdfplumber.open(filepath) as pdf:
-            for page in pdf.pages:
-                text += page.extract_text() or ""
-        return text
+        return extract_pdf_pages(filepath, 0, max_pages)[0]
 
     if ext in [".doc", ".docx"]:
         doc = Document(filepath)
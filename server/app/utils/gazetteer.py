@@ -0,0 +1,142 @@
+"""
+Offline city gazetteer: a CSV of `name,aliases,state,country,lat,lon`
+(aliases separated by `|`) loaded into an in-memory index. Lookups are
+accent-, case- and punctuation-insensitive, use trailing ", state" or
+", country" parts to pick between places sharing a name, and fall back to
+fuzzy matching for misspellings.
+"""
+import csv
+import difflib
+import os
+import re
+import threading
+import unicodedata
+from dataclasses import dataclass
+from functools import lru_cache
+from typing import Dict, List, Optional, Set, Tuple
+
+from ..config import settings
+
+BUNDLED_GAZETTEER = os.path.join(os.path.dirname(os.path.dirname(__file__)), "data", "cities.csv")
+
+_NON_ALNUM_RE = re.compile(r"[^a-z0-9]+")
+_LOOKUP_CACHE_SIZE = 4096
+# Words people add to a place name that the gazetteer does not carry
+_NOISE_SUFFIXES = (" city", " district", " metro")
+_COUNTRY_ALIASES = {
+    "us": "united states",
+    "usa": "united states",
+    "united states of america": "united states",
+    "america": "united states",
+    "uk": "united kingdom",
+    "great britain": "united kingdom",
+    "britain": "united kingdom",
+    "uae": "united arab emirates",
+    "emirates": "united arab emirates",
+    "ksa": "saudi arabia",
+    "bharat": "india",
+}
+
+
+def normalize_place(text: str) -> str:
+    """Lowercase ASCII words: accents stripped, punctuation and spacing collapsed."""
+    folded = unicodedata.normalize("NFKD", text).encode("ascii", "ignore").decode("ascii")
+    return _NON_ALNUM_RE.sub(" ", folded.lower()).strip()
+
+
+def split_place(text: str) -> List[str]:
+    """Normalised comma (or bracket) separated parts: 'Pune (MH), India' -> ['pune', 'mh', 'india']."""
+    parts = re.split(r"[,;/()]", text)
+    return [part for part in (normalize_place(p) for p in parts) if part]
+
+
+@dataclass(frozen=True)
+class Place:
+    name: str
+    state: str
+    country: str
+    lat: float
+    lon: float
+
+    @property
+    def coords(self) -> Tuple[float, float]:
+        return self.lat, self.lon
+
+
+class Gazetteer:
+    def __init__(self, path: str, fuzzy_cutoff: float) -> None:
+        self.path = path
+        self.fuzzy_cutoff = fuzzy_cutoff
+        self._lock = threading.Lock()
+        self._index: Optional[Dict[str, List[Place]]] = None
+        self._keys: List[str] = []
+        self._regions: Set[str] = set()
+        # Per instance: a cache on the method would key on, and keep alive, every instance
+        self.lookup = lru_cache(maxsize=_LOOKUP_CACHE_SIZE)(self._lookup)
+
+    def _load(self) -> Dict[str, List[Place]]:
+        with self._lock:
+            if self._index is None:
+                index: Dict[str, List[Place]] = {}
+                with open(self.path, newline="", encoding="utf-8") as f:
+                    for row in csv.DictReader(f):
+                        place = Place(row["name"], row["state"], row["country"], float(row["lat"]), float(row["lon"]))
+                        for name in [row["name"], *(row.get("aliases") or "").split("|")]:
+                            key = normalize_place(name)
+                            # File order breaks ties, so list the more prominent place first
+                            if key and place not in index.setdefault(key, []):
+                                index[key].append(place)
+                self._keys = sorted(index)
+                places = {place for entries in index.values() for place in entries}
+                self._regions = {normalize_place(p.state) for p in places} | {normalize_place(p.country) for p in places}
+                self._regions.discard("")
+                self._index = index
+            return self._index
+
+    def __len__(self) -> int:
+        return len({place for places in self._load().values() for place in places})
+
+    def _candidates(self, name: str) -> List[Place]:
+        index = self._load()
+        if name in index:
+            return index[name]
+        for suffix in _NOISE_SUFFIXES:
+            if name.endswith(suffix) and name[: -len(suffix)] in index:
+                return index[name[: -len(suffix)]]
+        return []
+
+    def _fuzzy(self, name: str) -> List[Place]:
+        index = self._load()
+        close = difflib.get_close_matches(name, self._keys, n=1, cutoff=self.fuzzy_cutoff)
+        return index[close[0]] if close else []
+
+    def _pick(self, places: List[Place], qualifiers: List[str]) -> Optional[Place]:
+        """
+        The place whose state or country is among `qualifiers`, else the first
+        one; None when the qualifiers name a known region none of them is in
+        ("Salem, India" vs "Salem, United States").
+        """
+        wanted = {_COUNTRY_ALIASES.get(q, q) for q in qualifiers}
+        for place in places:
+            if normalize_place(place.state) in wanted or normalize_place(place.country) in wanted:
+                return place
+        if wanted & self._regions:
+            return None
+        return places[0]
+
+    def _lookup(self, query: str) -> Optional[Place]:
+        """
+        The place `query` names, or None. The first part is the place name;
+        when it is unknown, later parts are tried as names too ("Andheri,
+        Mumbai"), then the first part is matched fuzzily.
+        """
+        parts = split_place(query)
+        for i, part in enumerate(parts):
+            places = self._candidates(part)
+            if places:
+                return self._pick(places, parts[i + 1 :])
+        places = self._fuzzy(parts[0]) if parts else []
+        return self._pick(places, parts[1:]) if places else None
+
+
+gazetteer = Gazetteer(settings.geocoder_gazetteer_path or BUNDLED_GAZETTEER, settings.geocoder_fuzzy_cutoff)
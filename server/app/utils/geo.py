@@ -1,40 +1,180 @@
 import logging
 import math
-from functools import lru_cache
-from typing import Optional, Tuple
+import threading
+import time
+from typing import Any, Dict, Iterable, List, Optional, Tuple
 
+import numpy as np
 import requests
+from sqlalchemy import select
+from sqlalchemy.exc import IntegrityError
 
+from ..config import settings
+from ..db import SessionLocal
+from ..db.models import GeocodeCache
+from .gazetteer import gazetteer, split_place
 
-@lru_cache(maxsize=256)
-def geocode_city(city: str) -> Optional[Tuple[float, float]]:
-    """Geocode a city name to (lat, lon) using Nominatim. Returns None on failure."""
+# Nominatim's usage policy allows one request per second
+_NOMINATIM_INTERVAL_SECONDS = 1.0
+_nominatim_lock = threading.Lock()
+_nominatim_last = 0.0
+
+
+def cache_key(city: str) -> str:
+    return ", ".join(split_place(city))
+
+
+def nominatim_search(query: str) -> Optional[Tuple[float, float]]:
+    """
+    Geocode `query` with Nominatim, at most one request per second per
+    process; None when it is not found. Network and HTTP errors are raised.
+    """
+    global _nominatim_last
+    with _nominatim_lock:
+        wait = _nominatim_last + _NOMINATIM_INTERVAL_SECONDS - time.monotonic()
+        if wait > 0:
+            time.sleep(wait)
+        try:
+            resp = requests.get(
+                "https://nominatim.openstreetmap.org/search",
+                params={"q": query, "format": "json", "limit": 1},
+                headers={"User-Agent": "match-maker/1.0"},
+                timeout=5,
+            )
+        finally:
+            _nominatim_last = time.monotonic()
+    resp.raise_for_status()
+    data = resp.json()
+    if not data:
+        return None
+    item = data[0]
+    return float(item["lat"]), float(item["lon"])
+
+
+def _cached(key: str) -> Optional[GeocodeCache]:
+    with SessionLocal() as db:
+        return db.get(GeocodeCache, key)
+
+
+def record_geocode(key: str, coords: Optional[Tuple[float, float]], source: str) -> None:
+    """Store a result in geocode_cache; a `pending` marker never replaces a result."""
+    with SessionLocal() as db:
+        row = db.get(GeocodeCache, key)
+        if row is None:
+            row = GeocodeCache(query=key)
+            db.add(row)
+        elif source == "pending":
+            return
+        row.source = source
+        row.lat, row.lon = coords if coords else (None, None)
+        try:
+            db.commit()
+        except IntegrityError:
+            # Another worker recorded it first
+            db.rollback()
+
+
+def lookup_city(city: str, network: Optional[bool] = None) -> Optional[Tuple[float, float]]:
+    """
+    Geocode a city name to (lat, lon); None when it is unknown. The bundled
+    gazetteer answers first, then the shared geocode_cache table. With
+    `network` (default GEOCODER_NOMINATIM_FALLBACK), other names are looked up
+    on Nominatim and the answer cached, found or not; network and HTTP errors
+    are raised (and not cached), so callers can retry them. Offline, the name
+    is recorded as pending for `make resolve-geocodes`.
+    """
+    if not isinstance(city, str):  # the LLM occasionally returns a list or object
+        return None
+    place = gazetteer.lookup(city)
+    if place is not None:
+        return place.coords
+    key = cache_key(city)
+    if not key:
+        return None
+    cached = _cached(key)
+    if cached is not None and cached.source != "pending":
+        return (cached.lat, cached.lon) if cached.lat is not None else None
+    if not (settings.geocoder_nominatim_fallback if network is None else network):
+        if cached is None:
+            record_geocode(key, None, "pending")
+        return None
+    coords = nominatim_search(city)
+    record_geocode(key, coords, "nominatim" if coords else "miss")
+    return coords
+
+
+def lookup_cities_cached(cities: Iterable[Any]) -> Dict[str, Tuple[float, float]]:
+    """
+    Coordinates of each known city name, from the gazetteer and then one
+    geocode_cache query for the rest. Never uses the network or records
+    pending names, so it is safe on the match path; unknown names are left out.
+    """
+    found: Dict[str, Tuple[float, float]] = {}
+    keys: Dict[str, List[str]] = {}
+    for city in {city for city in cities if isinstance(city, str)}:
+        place = gazetteer.lookup(city)
+        if place is not None:
+            found[city] = place.coords
+        elif key := cache_key(city):
+            keys.setdefault(key, []).append(city)
+    if keys:
+        with SessionLocal() as db:
+            rows = db.execute(
+                select(GeocodeCache).where(GeocodeCache.query.in_(list(keys)), GeocodeCache.lat.is_not(None))
+            ).scalars()
+            for row in rows:
+                for city in keys[row.query]:
+                    found[city] = (row.lat, row.lon)
+    return found
+
+
+def geocode_city(city: str, network: Optional[bool] = None) -> Optional[Tuple[float, float]]:
+    """`lookup_city` that returns None on failure."""
     if not city:
         return None
     try:
-        resp = requests.get(
-            "https://nominatim.openstreetmap.org/search",
-            params={"q": city, "format": "json", "limit": 1},
-            headers={"User-Agent": "match-maker/1.0"},
-            timeout=5,
-        )
-        resp.raise_for_status()
-        data = resp.json()
-        if not data:
-            return None
-        item = data[0]
-        return float(item["lat"]), float(item["lon"])
+        return lookup_city(city, network)
     except Exception as exc:  # noqa: BLE001
         logging.debug("Geocode failed for %s: %s", city, exc)
         return None
 
 
+EARTH_RADIUS_KM = 6371.0
+
+
+def haversine_km_many(lat: float, lon: float, lats: np.ndarray, lons: np.ndarray) -> np.ndarray:
+    """Great-circle distances in km from (lat, lon) to each point; NaN where a point has no coordinates."""
+    phi1 = np.radians(lat)
+    phi2 = np.radians(np.asarray(lats, dtype=np.float64))
+    dphi = phi2 - phi1
+    dlambda = np.radians(np.asarray(lons, dtype=np.float64) - lon)
+    a = np.sin(dphi / 2) ** 2 + np.cos(phi1) * np.cos(phi2) * np.sin(dlambda / 2) ** 2
+    return 2 * EARTH_RADIUS_KM * np.arcsin(np.sqrt(np.clip(a, 0.0, 1.0)))
+
+
+def bounding_box(lat: float, lon: float, radius_km: float) -> Tuple[float, float, Optional[Tuple[float, float]]]:
+    """
+    (lat_min, lat_max, lon_range) of the circle of `radius_km` around (lat,
+    lon). `lon_range` may reach past ±180, meaning it wraps; it is None when
+    every longitude is in range (the circle covers a pole or half the globe).
+    """
+    angle = radius_km / EARTH_RADIUS_KM
+    dlat = math.degrees(angle)
+    lat_min, lat_max = max(lat - dlat, -90.0), min(lat + dlat, 90.0)
+    if lat_min <= -90.0 or lat_max >= 90.0 or angle >= math.pi / 2:
+        return lat_min, lat_max, None
+    ratio = math.sin(angle) / math.cos(math.radians(lat))
+    if ratio >= 1.0:
+        return lat_min, lat_max, None
+    dlon = math.degrees(math.asin(ratio))
+    return lat_min, lat_max, (lon - dlon, lon + dlon)
+
+
 def haversine_km(lat1: float, lon1: float, lat2: float, lon2: float) -> float:
     """Great-circle distance in km."""
-    R = 6371.0
-    phi1, phi2 = math.radians(lat1), math.radians(lat2)
-    dphi = math.radians(lat2 - lat1)
-    dlambda = math.radians(lon2 - lon1)
-    a = math.sin(dphi / 2) ** 2 + math.cos(phi1) * math.cos(phi2) * math.sin(dlambda / 2) ** 2
-    c = 2 * math.atan2(math.sqrt(a), math.sqrt(1 - a))
-    return R * c
+    return float(haversine_km_many(lat1, lon1, np.array([lat2]), np.array([lon2]))[0])
+
+
+def distance_decay(distances_km: np.ndarray) -> np.ndarray:
+    """Proximity in [0, 1]: 1 at the same place, 0 from MATCH_DISTANCE_DECAY_KM on; NaN stays NaN."""
+    return np.clip(1.0 - np.asarray(distances_km, dtype=np.float64) / settings.match_distance_decay_km, 0.0, 1.0)
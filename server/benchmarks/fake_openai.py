@@ -0,0 +1,244 @@
+"""
+Deterministic, offline stand-ins for the `openai.OpenAI` and
+`openai.AsyncOpenAI` clients.
+
+Implements the surface the app uses (`embeddings.create`,
+`chat.completions.create`, `responses.create`) with answers derived from the
+request content, plus configurable per-call latency.
+"""
+import asyncio
+import hashlib
+import json
+import re
+import sys
+import threading
+import time
+from collections import Counter
+from types import SimpleNamespace
+from typing import Any, Dict, List
+
+import numpy as np
+
+_PROFILE_ID_RE = re.compile(r"^- profile_id: (\S+)$", re.MULTILINE)
+_BASE_SCORE_RE = re.compile(r"^  base_score: ([0-9.]+)$", re.MULTILINE)
+_FIELD_RE = re.compile(r"^([A-Za-z_ ]+):\s*(.+)$", re.MULTILINE)
+
+_CANONICAL_FIELDS = {
+    "name",
+    "approx_age",
+    "dob",
+    "city",
+    "state",
+    "country",
+    "education",
+    "profession",
+    "religion",
+    "caste",
+    "height",
+}
+
+
+def _stable_unit(text: str) -> float:
+    """Deterministic value in [0, 1) for `text`."""
+    digest = hashlib.blake2b(text.encode("utf-8"), digest_size=8).digest()
+    return int.from_bytes(digest, "little") / 2**64
+
+
+def _approx_tokens(text: str) -> int:
+    return max(1, len(text) // 4)
+
+
+class _Embeddings:
+    def __init__(self, owner: "FakeOpenAI") -> None:
+        self._owner = owner
+
+    def create(self, model: str, input, **kwargs):
+        time.sleep(self._owner._record("embeddings"))
+        return self._build(model, input)
+
+    def _build(self, model: str, input):
+        texts = [input] if isinstance(input, str) else list(input)
+        data = []
+        for i, text in enumerate(texts):
+            seed = int.from_bytes(hashlib.blake2b(text.encode("utf-8"), digest_size=8).digest(), "little")
+            vec = np.random.default_rng(seed).standard_normal(self._owner.dim)
+            vec /= np.linalg.norm(vec)
+            data.append(SimpleNamespace(embedding=vec.tolist(), index=i, object="embedding"))
+        tokens = sum(_approx_tokens(t) for t in texts)
+        return SimpleNamespace(
+            data=data,
+            model=model,
+            usage=SimpleNamespace(prompt_tokens=tokens, total_tokens=tokens),
+        )
+
+
+class _ChatCompletions:
+    def __init__(self, owner: "FakeOpenAI") -> None:
+        self._owner = owner
+
+    def create(self, model: str, messages: List[Dict[str, str]], **kwargs):
+        time.sleep(self._owner._record("chat"))
+        return self._build(model, messages)
+
+    def _build(self, model: str, messages: List[Dict[str, str]]):
+        content = self._owner._answer(messages)
+        tokens = sum(_approx_tokens(m.get("content") or "") for m in messages)
+        return SimpleNamespace(
+            choices=[SimpleNamespace(message=SimpleNamespace(content=content), finish_reason="stop", index=0)],
+            model=model,
+            usage=SimpleNamespace(
+                prompt_tokens=tokens,
+                completion_tokens=_approx_tokens(content),
+                total_tokens=tokens + _approx_tokens(content),
+            ),
+        )
+
+
+class _Responses:
+    def __init__(self, owner: "FakeOpenAI") -> None:
+        self._owner = owner
+
+    def create(self, model: str, input, **kwargs):
+        self._check(kwargs)
+        time.sleep(self._owner._record("responses"))
+        return self._build(input)
+
+    @staticmethod
+    def _check(kwargs: Dict[str, Any]) -> None:
+        if "response_format" in kwargs:
+            # Mirrors the current SDK, which rejects this argument on the responses API
+            raise TypeError("Responses.create() got an unexpected keyword argument 'response_format'")
+
+    def _build(self, input):
+        text = self._owner._answer(input)
+        return SimpleNamespace(output=[SimpleNamespace(content=[SimpleNamespace(text=text)])])
+
+
+class FakeOpenAI:
+    """
+    Offline OpenAI client. `latency_ms`/`jitter_ms` add a normally distributed
+    sleep per call so benchmarks can model network and model time.
+    """
+
+    def __init__(self, dim: int, latency_ms: float = 0.0, jitter_ms: float = 0.0, seed: int = 0) -> None:
+        self.api_key = "offline-benchmark"
+        self.dim = dim
+        self.latency_ms = latency_ms
+        self.jitter_ms = jitter_ms
+        self.calls: Counter = Counter()
+        self._lock = threading.Lock()
+        self._rng = np.random.default_rng(seed)
+        self.embeddings = _Embeddings(self)
+        self.chat = SimpleNamespace(completions=_ChatCompletions(self))
+        self.responses = _Responses(self)
+
+    def _record(self, kind: str) -> float:
+        """Count a call and return its simulated latency in seconds."""
+        with self._lock:
+            self.calls[kind] += 1
+            delay = self._rng.normal(self.latency_ms, self.jitter_ms) if self.jitter_ms else self.latency_ms
+        return max(delay, 0.0) / 1000.0
+
+    def _answer(self, messages: List[Dict[str, str]]) -> str:
+        system = next((m["content"] for m in messages if m.get("role") == "system"), "")
+        user = next((m["content"] for m in messages if m.get("role") == "user"), "")
+        if "re-ranking matchmaking candidates" in system:
+            return self._rerank(user)
+        if "biodata information" in system:
+            return self._extract(user)
+        return self._canonical_match(user)
+
+    @staticmethod
+    def _extract(text: str) -> str:
+        canonical: Dict[str, Any] = {field: None for field in _CANONICAL_FIELDS}
+        dynamic: Dict[str, Any] = {}
+        for key, value in _FIELD_RE.findall(text):
+            key = key.strip().lower().replace(" ", "_")
+            if key in _CANONICAL_FIELDS:
+                canonical[key] = value.strip()
+            else:
+                dynamic[key] = value.strip()
+        return json.dumps({"canonical": canonical, "dynamic_features": dynamic})
+
+    @staticmethod
+    def _rerank(text: str) -> str:
+        ids = _PROFILE_ID_RE.findall(text)
+        bases = [float(b) for b in _BASE_SCORE_RE.findall(text)]
+        items = []
+        for pid, base in zip(ids, bases + [0.5] * (len(ids) - len(bases))):
+            jitter = _stable_unit(pid) * 0.2 - 0.1
+            items.append(
+                {
+                    "profile_id": pid,
+                    "score": round(min(1.0, max(0.0, base + jitter)), 3),
+                    "reason": "Synthetic rerank reason.",
+                    "pref_to_self_reason": "Synthetic preference fit.",
+                    "self_to_pref_reason": "Synthetic reverse fit.",
+                    "location_reason": "Synthetic location note.",
+                    "location_open": _stable_unit(pid + ":loc") > 0.5,
+                }
+            )
+        return json.dumps({"candidates": items})
+
+    @staticmethod
+    def _canonical_match(text: str) -> str:
+        try:
+            payload = json.loads(text)
+        except ValueError:
+            payload = {}
+        seeker = payload.get("seeker_canonical") or {}
+        candidate = payload.get("candidate_canonical") or {}
+        fields = []
+        for key in sorted(set(seeker) | set(candidate)):
+            same = str(seeker.get(key)).lower() == str(candidate.get(key)).lower()
+            fields.append(
+                {
+                    "field": key,
+                    "seeker_value": seeker.get(key),
+                    "candidate_value": candidate.get(key),
+                    "score": 1.0 if same else 0.5,
+                    "reason": "Same." if same else "Different.",
+                }
+            )
+        overall = sum(f["score"] for f in fields) / len(fields) if fields else None
+        return json.dumps({"overall_score": overall, "summary": "Synthetic comparison.", "fields": fields})
+
+
+class _AsyncEmbeddings(_Embeddings):
+    async def create(self, model: str, input, **kwargs):
+        await asyncio.sleep(self._owner._record("embeddings"))
+        return self._build(model, input)
+
+
+class _AsyncChatCompletions(_ChatCompletions):
+    async def create(self, model: str, messages: List[Dict[str, str]], **kwargs):
+        await asyncio.sleep(self._owner._record("chat"))
+        return self._build(model, messages)
+
+
+class _AsyncResponses(_Responses):
+    async def create(self, model: str, input, **kwargs):
+        self._check(kwargs)
+        await asyncio.sleep(self._owner._record("responses"))
+        return self._build(input)
+
+
+class FakeAsyncOpenAI:
+    """Async view of a FakeOpenAI; shares its answers, latency model and call counts."""
+
+    def __init__(self, fake: FakeOpenAI) -> None:
+        self.api_key = fake.api_key
+        self.embeddings = _AsyncEmbeddings(fake)
+        self.chat = SimpleNamespace(completions=_AsyncChatCompletions(fake))
+        self.responses = _AsyncResponses(fake)
+
+
+def install(fake: FakeOpenAI) -> None:
+    """Point every `app.openai` module's `client` and `async_client` at `fake`."""
+    async_fake = FakeAsyncOpenAI(fake)
+    for name, module in list(sys.modules.items()):
+        if name == "app.openai" or name.startswith("app.openai."):
+            if hasattr(module, "client"):
+                setattr(module, "client", fake)
+            if hasattr(module, "async_client"):
+                setattr(module, "async_client", async_fake)
@@ -0,0 +1,182 @@
+"""
+Synthetic profile generator: realistic canonical/dynamic JSON, clustered
+unit-length embeddings and matching biodata documents for the ingest path.
+"""
+import os
+from typing import Any, Dict, List, Tuple
+from uuid import uuid4
+
+import numpy as np
+from sqlalchemy import insert
+from sqlalchemy.orm import Session
+
+from app.db.models import Profile
+from app.feature_codes import encode_canonical, encode_dynamic
+
+# (city, state, lat, lon)
+CITIES: List[Tuple[str, str, float, float]] = [
+    ("Mumbai", "Maharashtra", 19.076, 72.8777),
+    ("Pune", "Maharashtra", 18.5204, 73.8567),
+    ("Nagpur", "Maharashtra", 21.1458, 79.0882),
+    ("Delhi", "Delhi", 28.6139, 77.209),
+    ("Bengaluru", "Karnataka", 12.9716, 77.5946),
+    ("Mysuru", "Karnataka", 12.2958, 76.6394),
+    ("Hyderabad", "Telangana", 17.385, 78.4867),
+    ("Chennai", "Tamil Nadu", 13.0827, 80.2707),
+    ("Coimbatore", "Tamil Nadu", 11.0168, 76.9558),
+    ("Kolkata", "West Bengal", 22.5726, 88.3639),
+    ("Ahmedabad", "Gujarat", 23.0225, 72.5714),
+    ("Surat", "Gujarat", 21.1702, 72.8311),
+    ("Jaipur", "Rajasthan", 26.9124, 75.7873),
+    ("Lucknow", "Uttar Pradesh", 26.8467, 80.9462),
+    ("Kanpur", "Uttar Pradesh", 26.4499, 80.3319),
+    ("Indore", "Madhya Pradesh", 22.7196, 75.8577),
+    ("Bhopal", "Madhya Pradesh", 23.2599, 77.4126),
+    ("Chandigarh", "Chandigarh", 30.7333, 76.7794),
+    ("Kochi", "Kerala", 9.9312, 76.2673),
+    ("Patna", "Bihar", 25.5941, 85.1376),
+]
+EDUCATION = ["B.Tech", "M.Tech", "MBA", "B.Com", "M.Sc", "MBBS", "CA", "B.A", "PhD", "LLB"]
+PROFESSIONS = [
+    "Software Engineer",
+    "Doctor",
+    "Chartered Accountant",
+    "Teacher",
+    "Product Manager",
+    "Lawyer",
+    "Civil Servant",
+    "Architect",
+    "Data Scientist",
+    "Business Owner",
+]
+RELIGIONS = ["Hindu", "Muslim", "Christian", "Sikh", "Jain", "Buddhist"]
+CASTES = ["Brahmin", "Maratha", "Agarwal", "Iyer", "Reddy", "Nair", "Jat", "Kayastha", None, None]
+DYNAMIC_VALUES: Dict[str, List[str]] = {
+    "hobbies": ["reading", "trekking", "cooking", "music", "cricket", "photography", "travel"],
+    "diet": ["vegetarian", "non-vegetarian", "eggetarian", "vegan"],
+    "family_type": ["nuclear", "joint"],
+    "personality": ["introvert", "extrovert", "ambivert"],
+    "smoking": ["never", "occasionally"],
+    "drinking": ["never", "socially"],
+    "languages": ["Hindi, English", "Marathi, English", "Tamil, English", "Bengali, Hindi"],
+    "siblings": ["one brother", "one sister", "two brothers", "none"],
+    "fitness": ["gym", "yoga", "running", "swimming"],
+    "pets": ["dog lover", "cat lover", "no pets"],
+    "relocation": ["open to relocate", "prefers home city"],
+    "spirituality": ["religious", "spiritual", "not religious"],
+}
+TRAITS = ["kind", "ambitious", "family-oriented", "curious", "calm", "adventurous", "funny", "grounded"]
+WANTS = ["honest", "educated", "caring", "independent", "well-settled", "cheerful", "supportive"]
+
+
+class SyntheticProfiles:
+    """Seeded generator; the same seed always yields the same profiles."""
+
+    def __init__(self, seed: int, dim: int, topics: int = 32) -> None:
+        self.rng = np.random.default_rng(seed)
+        self.dim = dim
+        centroids = self.rng.standard_normal((topics, dim)).astype(np.float32)
+        self.centroids = centroids / np.linalg.norm(centroids, axis=1, keepdims=True)
+
+    def _embeddings(self, n: int) -> np.ndarray:
+        topics = self.rng.integers(0, len(self.centroids), size=n)
+        # Noise of norm ~0.8 keeps clusters distinct but overlapping
+        noise = self.rng.standard_normal((n, self.dim)).astype(np.float32) * (0.8 / np.sqrt(self.dim))
+        vecs = self.centroids[topics] + noise
+        return vecs / np.linalg.norm(vecs, axis=1, keepdims=True)
+
+    def profile(self) -> Dict[str, Any]:
+        rng = self.rng
+        city, state, lat, lon = CITIES[rng.integers(len(CITIES))]
+        gender = "male" if rng.random() < 0.5 else "female"
+        canonical = {
+            "name": f"Person {rng.integers(1_000_000)}",
+            "approx_age": int(rng.integers(22, 40)),
+            "dob": None,
+            "city": city,
+            "state": state,
+            "country": "India",
+            "education": EDUCATION[rng.integers(len(EDUCATION))],
+            "profession": PROFESSIONS[rng.integers(len(PROFESSIONS))],
+            "religion": RELIGIONS[rng.integers(len(RELIGIONS))],
+            "caste": CASTES[rng.integers(len(CASTES))],
+            "height": f"{rng.integers(150, 190)} cm",
+        }
+        keys = rng.choice(list(DYNAMIC_VALUES), size=rng.integers(3, 9), replace=False)
+        dynamic = {str(k): DYNAMIC_VALUES[k][rng.integers(len(DYNAMIC_VALUES[k]))] for k in keys}
+        traits = ", ".join(rng.choice(TRAITS, size=3, replace=False))
+        wants = ", ".join(rng.choice(WANTS, size=3, replace=False))
+        return {
+            "gender": gender,
+            "who_am_i": f"I am a {traits} {canonical['profession'].lower()} from {city} who enjoys {dynamic.get('hobbies', 'music')}.",
+            "looking_for": f"Looking for someone {wants}, ideally {canonical['religion']}, open to living in {state}.",
+            "canonical": canonical,
+            "dynamic_features": dynamic,
+            "location_lat": lat,
+            "location_lon": lon,
+        }
+
+    def biodata_text(self, profile: Dict[str, Any]) -> str:
+        lines = ["BIODATA"]
+        for key, value in profile["canonical"].items():
+            if value is not None:
+                lines.append(f"{key.replace('_', ' ').title()}: {value}")
+        for key, value in profile["dynamic_features"].items():
+            lines.append(f"{key.replace('_', ' ').title()}: {value}")
+        lines.append("")
+        lines.append(profile["who_am_i"])
+        return "\n".join(lines)
+
+    def write_docx(self, directory: str, profile: Dict[str, Any]) -> str:
+        from docx import Document
+
+        doc = Document()
+        for line in self.biodata_text(profile).splitlines():
+            doc.add_paragraph(line)
+        path = os.path.join(directory, f"{uuid4()}.docx")
+        doc.save(path)
+        return path
+
+    def populate(self, db: Session, n: int, batch_size: int = 1000) -> List[str]:
+        """Insert `n` profiles with embeddings and feature codes; returns their ids."""
+        ids: List[str] = []
+        for start in range(0, n, batch_size):
+            count = min(batch_size, n - start)
+            self_vecs = self._embeddings(count)
+            pref_vecs = self._embeddings(count)
+            rows = []
+            for i in range(count):
+                p = self.profile()
+                pid = str(uuid4())
+                ids.append(pid)
+                rows.append(
+                    {
+                        "id": pid,
+                        "gender": p["gender"],
+                        "pdf_path": None,
+                        "pdf_text": self.biodata_text(p),
+                        "location_lat": p["location_lat"],
+                        "location_lon": p["location_lon"],
+                        "who_am_i": p["who_am_i"],
+                        "looking_for": p["looking_for"],
+                        "canonical": p["canonical"],
+                        "canonical_codes": encode_canonical(p["canonical"]),
+                        "dynamic_features": p["dynamic_features"],
+                        "dynamic_codes": encode_dynamic(p["dynamic_features"]),
+                        "self_embedding": self_vecs[i],
+                        "pref_embedding": pref_vecs[i],
+                        "self_embedding_valid": True,
+                        "pref_embedding_valid": True,
+                    }
+                )
+            db.execute(insert(Profile), rows)
+            db.commit()
+        return ids
+
+
+def fake_geocode(city: str | None) -> Tuple[float, float] | None:
+    """Offline geocoder over the synthetic city table."""
+    for name, _state, lat, lon in CITIES:
+        if city and city.strip().lower() == name.lower():
+            return lat, lon
+    return None
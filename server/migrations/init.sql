@@ -10,25 +10,154 @@ CREATE TABLE IF NOT EXISTS profiles (
     id                 VARCHAR PRIMARY KEY,
     gender             VARCHAR NOT NULL,
     pdf_path           VARCHAR,
+    content_hash       VARCHAR,
     pdf_text           TEXT,
     location_lat       DOUBLE PRECISION,
     location_lon       DOUBLE PRECISION,
     who_am_i           TEXT NOT NULL,
     looking_for        TEXT NOT NULL,
     canonical          JSONB,
+    canonical_codes    BYTEA,
     dynamic_features   JSONB,
+    dynamic_codes      BYTEA,
     self_embedding     vector(1536),
     pref_embedding     vector(1536),
-    created_at         TIMESTAMPTZ DEFAULT NOW()
+    self_embedding_valid BOOLEAN,
+    pref_embedding_valid BOOLEAN,
+    pool_version       INTEGER,
+    created_at         TIMESTAMPTZ DEFAULT NOW(),
+    updated_at         TIMESTAMPTZ DEFAULT NOW()
 );
 
--- Vector indexes for faster ANN search (tune lists based on dataset size)
-CREATE INDEX IF NOT EXISTS idx_profiles_self_ivfflat
+-- Upgrades for databases created before these columns existed (safe to re-run).
+-- Run `make backfill-embeddings` afterwards to normalise existing vectors.
+ALTER TABLE profiles ADD COLUMN IF NOT EXISTS self_embedding_valid BOOLEAN;
+ALTER TABLE profiles ADD COLUMN IF NOT EXISTS pref_embedding_valid BOOLEAN;
+-- Run `make backfill-feature-codes` afterwards to encode existing profiles.
+ALTER TABLE profiles ADD COLUMN IF NOT EXISTS canonical_codes BYTEA;
+ALTER TABLE profiles ADD COLUMN IF NOT EXISTS dynamic_codes BYTEA;
+ALTER TABLE profiles ADD COLUMN IF NOT EXISTS content_hash VARCHAR;
+CREATE INDEX IF NOT EXISTS idx_profiles_content_hash ON profiles (content_hash);
+-- Bounding-box prefilter for top_matches with max_distance_km
+CREATE INDEX IF NOT EXISTS idx_profiles_location ON profiles (gender, location_lat, location_lon);
+ALTER TABLE profiles ADD COLUMN IF NOT EXISTS updated_at TIMESTAMPTZ DEFAULT NOW();
+-- Partition version that announced the row's last write; API processes refresh their in-memory index from it
+ALTER TABLE profiles ADD COLUMN IF NOT EXISTS pool_version INTEGER;
+DROP INDEX IF EXISTS idx_profiles_updated_at;
+CREATE INDEX IF NOT EXISTS idx_profiles_pool_version ON profiles (gender, pool_version);
+-- Genders are stored trimmed and lower-cased, the spelling the partial ANN indexes and gender filters use
+UPDATE profiles SET gender = lower(btrim(gender)) WHERE gender <> lower(btrim(gender));
+
+-- Candidate-pool version per gender partition, bumped after profile writes
+CREATE TABLE IF NOT EXISTS pool_versions (
+    partition  VARCHAR PRIMARY KEY,
+    version    INTEGER NOT NULL DEFAULT 0,
+    updated_at TIMESTAMPTZ DEFAULT NOW()
+);
+
+-- Interned feature values (canonical match fields, dynamic_features keys); profiles store the codes
+CREATE TABLE IF NOT EXISTS feature_vocab (
+    code    SERIAL PRIMARY KEY,
+    kind    VARCHAR NOT NULL,
+    value   VARCHAR NOT NULL,
+    CONSTRAINT uq_feature_vocab_kind_value UNIQUE (kind, value)
+);
+
+-- Cached LLM rerank verdicts per (seeker, candidate); versions hash the profile content and prompt
+CREATE TABLE IF NOT EXISTS rerank_scores (
+    seeker_id           VARCHAR NOT NULL,
+    candidate_id        VARCHAR NOT NULL,
+    content_version     VARCHAR NOT NULL,
+    prompt_version      VARCHAR NOT NULL,
+    score               DOUBLE PRECISION NOT NULL,
+    reason              TEXT,
+    pref_to_self_reason TEXT,
+    self_to_pref_reason TEXT,
+    location_reason     TEXT,
+    location_open       BOOLEAN,
+    created_at          TIMESTAMPTZ DEFAULT NOW(),
+    PRIMARY KEY (seeker_id, candidate_id, content_version, prompt_version)
+);
+
+-- Background profile ingestion; workers claim rows with FOR UPDATE SKIP LOCKED
+CREATE TABLE IF NOT EXISTS ingest_jobs (
+    id          VARCHAR PRIMARY KEY,
+    status      VARCHAR NOT NULL DEFAULT 'queued',
+    stage       VARCHAR,
+    attempts    INTEGER NOT NULL DEFAULT 0,
+    who_am_i    TEXT NOT NULL,
+    looking_for TEXT NOT NULL,
+    gender      VARCHAR NOT NULL,
+    pdf_path    VARCHAR NOT NULL,
+    content_hash VARCHAR,
+    profile_id  VARCHAR,
+    error       TEXT,
+    locked_at   TIMESTAMPTZ,
+    created_at  TIMESTAMPTZ DEFAULT NOW(),
+    updated_at  TIMESTAMPTZ DEFAULT NOW()
+);
+CREATE INDEX IF NOT EXISTS idx_ingest_jobs_status_created ON ingest_jobs (status, created_at);
+ALTER TABLE ingest_jobs ADD COLUMN IF NOT EXISTS content_hash VARCHAR;
+
+CREATE TABLE IF NOT EXISTS bulk_imports (
+    id              VARCHAR PRIMARY KEY,
+    source          TEXT NOT NULL,
+    defaults        JSONB,
+    status          VARCHAR NOT NULL DEFAULT 'queued',
+    total           INTEGER NOT NULL DEFAULT 0,
+    position        INTEGER NOT NULL DEFAULT 0,
+    imported        INTEGER NOT NULL DEFAULT 0,
+    skipped         INTEGER NOT NULL DEFAULT 0,
+    failed          INTEGER NOT NULL DEFAULT 0,
+    errors          JSONB,
+    error           TEXT,
+    elapsed_seconds DOUBLE PRECISION NOT NULL DEFAULT 0,
+    stage_seconds   JSONB,
+    created_at      TIMESTAMPTZ DEFAULT NOW(),
+    updated_at      TIMESTAMPTZ DEFAULT NOW()
+);
+
+CREATE TABLE IF NOT EXISTS geocode_cache (
+    query      VARCHAR PRIMARY KEY,
+    lat        DOUBLE PRECISION,
+    lon        DOUBLE PRECISION,
+    source     VARCHAR NOT NULL,
+    created_at TIMESTAMPTZ DEFAULT NOW(),
+    updated_at TIMESTAMPTZ DEFAULT NOW()
+);
+
+-- Vector indexes for ANN retrieval (MATCH_RETRIEVAL=ann). Embeddings are stored
+-- unit length, so inner product ranks like cosine without per-row norms. Partial
+-- per gender so the matching query's gender filter does not reduce what the
+-- index scan returns.
+-- For IVFFlat use `USING ivfflat (... vector_ip_ops) WITH (lists = 100)` instead.
+DROP INDEX IF EXISTS idx_profiles_self_ivfflat;
+DROP INDEX IF EXISTS idx_profiles_pref_ivfflat;
+DROP INDEX IF EXISTS idx_profiles_self_embedding_male_hnsw;
+DROP INDEX IF EXISTS idx_profiles_self_embedding_female_hnsw;
+DROP INDEX IF EXISTS idx_profiles_pref_embedding_male_hnsw;
+DROP INDEX IF EXISTS idx_profiles_pref_embedding_female_hnsw;
+
+CREATE INDEX IF NOT EXISTS idx_profiles_self_embedding_male_hnsw_ip
+    ON profiles
+    USING hnsw (self_embedding vector_ip_ops)
+    WITH (m = 16, ef_construction = 64)
+    WHERE gender = 'male';
+
+CREATE INDEX IF NOT EXISTS idx_profiles_self_embedding_female_hnsw_ip
+    ON profiles
+    USING hnsw (self_embedding vector_ip_ops)
+    WITH (m = 16, ef_construction = 64)
+    WHERE gender = 'female';
+
+CREATE INDEX IF NOT EXISTS idx_profiles_pref_embedding_male_hnsw_ip
     ON profiles
-    USING ivfflat (self_embedding vector_cosine_ops)
-    WITH (lists = 100);
+    USING hnsw (pref_embedding vector_ip_ops)
+    WITH (m = 16, ef_construction = 64)
+    WHERE gender = 'male';
 
-CREATE INDEX IF NOT EXISTS idx_profiles_pref_ivfflat
+CREATE INDEX IF NOT EXISTS idx_profiles_pref_embedding_female_hnsw_ip
     ON profiles
-    USING ivfflat (pref_embedding vector_cosine_ops)
-    WITH (lists = 100);
+    USING hnsw (pref_embedding vector_ip_ops)
+    WITH (m = 16, ef_construction = 64)
+    WHERE gender = 'female';
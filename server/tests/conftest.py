@@ -0,0 +1,67 @@
+"""
+Tests run offline against a throwaway SQLite database, with OpenAI replaced
+by the benchmarks' fake client. Settings are read when `app` is imported, so
+the environment is set here first.
+
+    cd server && python -m pytest -q
+"""
+import os
+import sys
+import tempfile
+
+import pytest
+
+SERVER_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, SERVER_DIR)
+
+_WORKDIR = tempfile.mkdtemp(prefix="matchmaker-tests-")
+EMBEDDING_DIM = 16
+
+os.environ.update(
+    {
+        "DATABASE_URL": f"sqlite:///{os.path.join(_WORKDIR, 'test.sqlite3')}",
+        "OPENAI_API_KEY": "offline-tests",
+        "EMBEDDING_DIM": str(EMBEDDING_DIM),
+        "EMBEDDING_PROVIDER": "openai",
+        "MATCH_RETRIEVAL": "scan",
+        "MATCH_CACHE_BACKEND": "none",
+        "MATCH_DISTANCE_WEIGHT": "0",
+        "EMBEDDING_CACHE_BACKEND": "none",
+        # Parse uploads in-process; test_extraction_pool starts its own spawn workers
+        "EXTRACTION_WORKERS": "0",
+        "GEOCODER_NOMINATIM_FALLBACK": "false",
+        "UPLOAD_DIR": os.path.join(_WORKDIR, "uploads"),
+    }
+)
+# The fake has no rate limits; keep the scheduler from pacing it
+for _name in ("OPENAI_CHAT_RPM", "OPENAI_CHAT_TPM", "OPENAI_EMBEDDING_RPM", "OPENAI_EMBEDDING_TPM"):
+    os.environ[_name] = str(10**9)
+os.makedirs(os.environ["UPLOAD_DIR"], exist_ok=True)
+
+
+@pytest.fixture
+def db():
+    """A session on freshly created tables."""
+    from app import feature_codes
+    from app.db import Base, SessionLocal, engine
+
+    Base.metadata.drop_all(bind=engine)
+    Base.metadata.create_all(bind=engine)
+    # Codes are cached per process; the vocabulary table was just recreated
+    feature_codes._cache.clear()
+    session = SessionLocal()
+    try:
+        yield session
+    finally:
+        session.close()
+
+
+@pytest.fixture
+def fake_openai():
+    """The benchmarks' deterministic OpenAI client, installed in every `app.openai` module."""
+    import app.openai  # noqa: F401  # install() patches the modules already imported
+    from benchmarks.fake_openai import FakeOpenAI, install
+
+    fake = FakeOpenAI(dim=EMBEDDING_DIM)
+    install(fake)
+    return fake
@@ -0,0 +1,121 @@
+import asyncio
+import csv
+import os
+from datetime import timedelta
+
+import pytest
+from fastapi import BackgroundTasks, HTTPException
+from sqlalchemy import func, select
+
+import app.bulk_import as bulk_import
+from app.db.models import BulkImport, Profile
+from app.routers import profiles
+from benchmarks.synthetic import SyntheticProfiles, fake_geocode
+
+BATCH_SIZE = 4
+
+
+@pytest.fixture
+def manifest(tmp_path, monkeypatch, fake_openai):
+    """A manifest of 10 synthetic biodata files, one of them listed twice."""
+    monkeypatch.setattr(bulk_import, "geocode_city", fake_geocode)
+    gen = SyntheticProfiles(seed=3, dim=16)
+    rows = []
+    for _ in range(10):
+        profile = gen.profile()
+        path = gen.write_docx(str(tmp_path), profile)
+        rows.append(
+            {
+                "file": os.path.basename(path),
+                "who_am_i": profile["who_am_i"],
+                "looking_for": profile["looking_for"],
+                "gender": profile["gender"],
+            }
+        )
+    rows.append(dict(rows[0]))
+    path = tmp_path / "manifest.csv"
+    with open(path, "w", newline="") as f:
+        writer = csv.DictWriter(f, fieldnames=bulk_import.MANIFEST_FIELDS)
+        writer.writeheader()
+        writer.writerows(rows)
+    return str(path)
+
+
+def _profile_count(db) -> int:
+    return db.execute(select(func.count()).select_from(Profile)).scalar_one()
+
+
+def test_resume_continues_after_the_last_committed_batch(db, manifest, monkeypatch):
+    import_id = bulk_import.create_import(db, manifest).id
+    real_batch = bulk_import._import_batch
+    batches = []
+
+    async def crash_on_second_batch(items, seconds, coords):
+        batches.append([item.file for item in items])
+        if len(batches) == 2:
+            raise RuntimeError("worker lost")
+        return await real_batch(items, seconds, coords)
+
+    monkeypatch.setattr(bulk_import, "_import_batch", crash_on_second_batch)
+    with pytest.raises(RuntimeError):
+        asyncio.run(bulk_import.arun_import(import_id, batch_size=BATCH_SIZE))
+
+    db.expire_all()
+    run = db.get(BulkImport, import_id)
+    assert (run.status, run.position, run.imported) == ("failed", BATCH_SIZE, BATCH_SIZE)
+    assert _profile_count(db) == BATCH_SIZE
+
+    asyncio.run(bulk_import.arun_import(import_id, batch_size=BATCH_SIZE))
+
+    db.expire_all()
+    run = db.get(BulkImport, import_id)
+    assert (run.status, run.position, run.failed) == ("succeeded", 11, 0)
+    # The repeated manifest row is skipped, not imported twice
+    assert (run.imported, run.skipped) == (10, 1)
+    assert _profile_count(db) == 10
+    # The resumed run started at the failed batch, not at the beginning
+    assert batches[2] == batches[1]
+    assert len(batches) == 1 + 1 + 2
+
+
+def test_rerunning_a_manifest_skips_imported_items(db, manifest, fake_openai):
+    first = bulk_import.create_import(db, manifest).id
+    asyncio.run(bulk_import.arun_import(first, batch_size=BATCH_SIZE))
+    fake_openai.calls.clear()
+
+    second = bulk_import.create_import(db, manifest).id
+    asyncio.run(bulk_import.arun_import(second, batch_size=BATCH_SIZE))
+
+    db.expire_all()
+    run = db.get(BulkImport, second)
+    assert (run.status, run.imported, run.skipped) == ("succeeded", 0, 11)
+    assert _profile_count(db) == 10
+    assert not fake_openai.calls
+
+
+def test_resume_refuses_a_changed_source(db, manifest):
+    import_id = bulk_import.create_import(db, manifest).id
+    with open(manifest, "a", newline="") as f:
+        f.write("extra.pdf,a,b,male\n")
+    with pytest.raises(ValueError):
+        asyncio.run(bulk_import.arun_import(import_id, batch_size=BATCH_SIZE))
+    db.expire_all()
+    assert db.get(BulkImport, import_id).status == "failed"
+
+
+def test_only_one_of_two_resumes_starts_the_import(db, manifest):
+    import_id = bulk_import.create_import(db, manifest).id
+    first, second = BackgroundTasks(), BackgroundTasks()
+
+    assert profiles.resume_bulk_import(import_id, first, db=db).status == "running"
+    with pytest.raises(HTTPException) as exc:
+        profiles.resume_bulk_import(import_id, second, db=db)
+    assert exc.value.status_code == 409
+    assert (len(first.tasks), len(second.tasks)) == (1, 0)
+
+    # A run that stopped committing lost its process and can be taken over
+    run = db.get(BulkImport, import_id)
+    run.updated_at = run.updated_at - bulk_import.STALE_AFTER - timedelta(minutes=1)
+    db.commit()
+    assert profiles.resume_bulk_import(import_id, second, db=db).status == "running"
+    assert len(second.tasks) == 1
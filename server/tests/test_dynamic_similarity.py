@@ -0,0 +1,84 @@
+import random
+from types import SimpleNamespace
+from uuid import uuid4
+
+import numpy as np
+import pytest
+
+import app.matching as matching
+
+
+def _jaccard(a, b) -> float:
+    a, b = set(a), set(b)
+    return len(a & b) / len(a | b) if a and b else 0.0
+
+
+def _row(codes, dynamic=None) -> SimpleNamespace:
+    """A candidate with only dynamic features; `codes` None = not backfilled."""
+    return SimpleNamespace(
+        id=str(uuid4()),
+        self_embedding=None,
+        pref_embedding=None,
+        self_embedding_valid=None,
+        pref_embedding_valid=None,
+        canonical_codes=None,
+        dynamic_codes=None if codes is None else np.unique(np.array(codes, dtype=np.int32)).tobytes(),
+        canonical=None,
+        dynamic_features=dynamic,
+        location_lat=None,
+        location_lon=None,
+    )
+
+
+def _seeker(codes) -> SimpleNamespace:
+    return SimpleNamespace(
+        dynamic_codes=np.unique(np.array(codes, dtype=np.int32)).tobytes(),
+        dynamic_features={str(code): "yes" for code in codes},
+    )
+
+
+def _code_sets(seed: int, count: int = 40):
+    rng = random.Random(seed)
+    # Codes spread over a few hundred positions, so bitsets span several words
+    return [rng.sample(range(1, 400), rng.randint(0, 30)) for _ in range(count)]
+
+
+def test_bitsets_give_the_exact_key_jaccard(monkeypatch):
+    monkeypatch.setattr(matching.settings, "dynamic_similarity", "exact")
+    sets = _code_sets(1)
+    batch = matching._batch_from_rows([_row(codes) for codes in sets])
+    for src in _code_sets(2, count=5):
+        scores = matching._dynamic_scores(_seeker(src), batch)
+        np.testing.assert_allclose(scores, [_jaccard(src, codes) for codes in sets])
+
+
+def test_seeker_keys_unseen_by_a_batch_still_count_in_the_union(monkeypatch):
+    monkeypatch.setattr(matching.settings, "dynamic_similarity", "exact")
+    sets = [[1001, 1002], [1002, 1003, 1004]]
+    batch = matching._batch_from_rows([_row(codes) for codes in sets])
+    # 5000+ get bit positions after the batch's matrix was sized
+    src = [1002, 5001, 5002]
+    np.testing.assert_allclose(matching._dynamic_scores(_seeker(src), batch), [0.25, 0.2])
+
+
+def test_minhash_estimates_the_key_jaccard(monkeypatch):
+    monkeypatch.setattr(matching.settings, "dynamic_similarity", "minhash")
+    monkeypatch.setattr(matching.settings, "minhash_permutations", 256)
+    src = list(range(1, 41))
+    sets = [src, list(range(21, 61)), list(range(100, 140)), []]
+    batch = matching._batch_from_rows([_row(codes) for codes in sets])
+    scores = matching._dynamic_scores(_seeker(src), batch)
+    assert scores[0] == 1.0
+    assert scores[1] == pytest.approx(_jaccard(src, sets[1]), abs=0.1)
+    assert scores[2] < 0.05
+    assert scores[3] == 0.0
+
+
+@pytest.mark.parametrize("mode", ["exact", "minhash"])
+def test_rows_without_codes_fall_back_to_the_feature_dicts(monkeypatch, mode):
+    monkeypatch.setattr(matching.settings, "dynamic_similarity", mode)
+    rows = [_row(None, {"1": "yes", "2": "no", "9": "yes"}), _row(None, None), _row([1, 2])]
+    scores = matching._dynamic_scores(_seeker([1, 2, 3]), matching._batch_from_rows(rows))
+    assert scores[0] == pytest.approx(0.5)
+    assert scores[1] == 0.0
+    assert scores[2] == pytest.approx(2 / 3, abs=0.2 if mode == "minhash" else 1e-9)
@@ -0,0 +1,56 @@
+import pytest
+
+import app.openai.embeddings as embeddings
+from app.embedding_cache import EmbeddingCache, MemoryBackend, SQLiteBackend
+
+
+@pytest.fixture(params=["memory", "sqlite"])
+def backend(request, tmp_path):
+    if request.param == "sqlite":
+        return SQLiteBackend(str(tmp_path / "embedding_cache.sqlite3"), max_entries=3)
+    return MemoryBackend(max_entries=3)
+
+
+@pytest.fixture
+def cache(monkeypatch):
+    cache = EmbeddingCache(MemoryBackend(max_entries=100))
+    monkeypatch.setattr(embeddings, "embedding_cache", cache)
+    return cache
+
+
+def test_backends_evict_the_least_recently_used(backend):
+    backend.set_many({"a": b"1", "b": b"2", "c": b"3"})
+    assert backend.get_many(["a"]) == {"a": b"1"}
+    backend.set_many({"d": b"4"})
+    assert len(backend) == 3
+    assert backend.get_many(["a", "b", "c", "d"]) == {"a": b"1", "c": b"3", "d": b"4"}
+
+
+def test_key_ignores_whitespace_and_unicode_form_only():
+    key = EmbeddingCache.key("model", "café  lover\n")
+    assert EmbeddingCache.key("model", " café lover") == key
+    assert EmbeddingCache.key("model", "Café lover") != key
+    assert EmbeddingCache.key("other-model", "café lover") != key
+
+
+def test_repeated_texts_are_served_from_cache(fake_openai, cache):
+    first = embeddings.get_embeddings(["tall and kind", "likes  hiking", "tall and kind"])
+    assert fake_openai.calls["embeddings"] == 1
+    assert first[0] == first[2]
+
+    again = embeddings.get_embeddings(["likes hiking", " tall and kind "])
+    assert fake_openai.calls["embeddings"] == 1
+    # Stored as float32
+    assert again[0] == pytest.approx(first[1], abs=1e-6)
+    assert again[1] == pytest.approx(first[0], abs=1e-6)
+    stats = cache.stats()
+    assert (stats["hits"], stats["misses"], stats["entries"]) == (2, 2, 2)
+    assert stats["bytes_saved"] > 0
+
+
+def test_blank_inputs_and_failures_are_not_cached(fake_openai, cache, monkeypatch):
+    assert embeddings.get_embeddings(["", "   "]) == [[0.0] * embeddings.settings.embedding_dim] * 2
+    monkeypatch.setattr(embeddings.embedding_provider, "embed", lambda texts, priority: {})
+    assert embeddings.get_embeddings(["provider is down"]) == [None]
+    assert cache.stats()["entries"] == 0
+    assert not fake_openai.calls
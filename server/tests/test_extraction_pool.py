@@ -0,0 +1,87 @@
+"""
+These start real spawn workers (the suite itself parses in-process, with
+EXTRACTION_WORKERS=0), so each test takes a second or two.
+"""
+import signal
+import threading
+import time
+
+import pytest
+
+from app.utils.extraction_pool import ExtractionPool, ExtractionTimeout
+from benchmarks.synthetic import SyntheticProfiles
+
+TIMEOUT = 1.5
+
+
+@pytest.fixture
+def document(tmp_path):
+    gen = SyntheticProfiles(seed=8, dim=16)
+    return gen.write_docx(str(tmp_path), gen.profile())
+
+
+def _pool(workers: int) -> ExtractionPool:
+    return ExtractionPool(workers=workers, timeout=TIMEOUT, max_pages=10, pages_per_task=5)
+
+
+def _stuck(pool: ExtractionPool, seconds: float, errors: list, processes: list) -> threading.Thread:
+    """A thread waiting on a parse task that sleeps for `seconds`; `processes` gets its worker."""
+    workers = pool._pool()
+    task = workers.submit(time.sleep, seconds)
+
+    def wait():
+        started = workers.wait_started(*task)
+        if started is not None:
+            processes.append(workers.executor._processes[started[0]])
+        try:
+            pool._wait(workers, task, "stuck.pdf")
+        except Exception as exc:
+            errors.append(exc)
+
+    thread = threading.Thread(target=wait)
+    thread.start()
+    return thread
+
+
+def test_the_deadline_runs_from_the_task_start():
+    pool = _pool(workers=1)
+    try:
+        workers = pool._pool()
+        # The second task queues behind the first for longer than its own deadline
+        tasks = [workers.submit(time.sleep, TIMEOUT * 0.6) for _ in range(2)]
+        assert [pool._wait(workers, task, "slow.pdf") for task in tasks] == [None, None]
+    finally:
+        pool.shutdown()
+
+
+def test_a_stuck_task_times_out_and_its_worker_is_killed(document):
+    pool = _pool(workers=2)
+    try:
+        errors, processes = [], []
+        thread = _stuck(pool, 60, errors, processes)
+        text = pool.extract(document)
+        thread.join(timeout=30)
+
+        assert text.strip()
+        assert len(errors) == 1 and isinstance(errors[0], ExtractionTimeout)
+        processes[0].join(timeout=10)
+        assert processes[0].exitcode == -getattr(signal, "SIGKILL", signal.SIGTERM)
+        # Documents submitted after the timeout get a new pool
+        assert pool.extract(document) == text
+    finally:
+        pool.shutdown()
+
+
+def test_bulk_extraction_retries_documents_lost_to_another_threads_timeout(document):
+    pool = _pool(workers=1)
+    try:
+        errors, processes = [], []
+        thread = _stuck(pool, 60, errors, processes)
+        # Queued behind the stuck task on the only worker, which the timeout kills
+        texts = pool.extract_many([document, document])
+        thread.join(timeout=30)
+
+        assert isinstance(errors[0], ExtractionTimeout)
+        assert all(isinstance(text, str) and text.strip() for text in texts)
+    finally:
+        pool.shutdown()
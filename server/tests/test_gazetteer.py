@@ -0,0 +1,98 @@
+import pytest
+
+from app.utils.gazetteer import Gazetteer, normalize_place, split_place
+
+_CITIES = """name,aliases,state,country,lat,lon
+Mumbai,Bombay,Maharashtra,India,19.0760,72.8777
+Bengaluru,Bangalore,Karnataka,India,12.9716,77.5946
+Salem,,Tamil Nadu,India,11.6643,78.1460
+Salem,,Oregon,United States,44.9429,-123.0351
+Andheri,,Maharashtra,India,19.1136,72.8697
+Zürich,,Zürich,Switzerland,47.3769,8.5417
+Portland,,Oregon,United States,45.5152,-122.6784
+"""
+
+
+@pytest.fixture
+def gazetteer(tmp_path):
+    path = tmp_path / "cities.csv"
+    path.write_text(_CITIES, encoding="utf-8")
+    return Gazetteer(str(path), fuzzy_cutoff=0.85)
+
+
+@pytest.mark.parametrize(
+    "text, expected",
+    [
+        ("  Mumbai ", "mumbai"),
+        ("BENGALURU", "bengaluru"),
+        ("Zürich", "zurich"),
+        ("St. John's", "st john s"),
+        ("New   Delhi-110001", "new delhi 110001"),
+    ],
+)
+def test_normalize_place(text, expected):
+    assert normalize_place(text) == expected
+
+
+def test_split_place():
+    assert split_place("Pune (MH), India") == ["pune", "mh", "india"]
+    assert split_place("Salem; Oregon / USA") == ["salem", "oregon", "usa"]
+    assert split_place(" , ") == []
+
+
+@pytest.mark.parametrize(
+    "query, name",
+    [
+        ("mumbai", "Mumbai"),
+        ("Bombay", "Mumbai"),
+        ("bangalore, karnataka", "Bengaluru"),
+        ("ZURICH", "Zürich"),
+        ("Mumbai City", "Mumbai"),
+        ("Mumbaii", "Mumbai"),
+        ("Bengaluruu", "Bengaluru"),
+    ],
+)
+def test_lookup_ignores_case_accents_aliases_and_misspellings(gazetteer, query, name):
+    assert gazetteer.lookup(query).name == name
+
+
+@pytest.mark.parametrize(
+    "query, state",
+    [
+        ("Salem", "Tamil Nadu"),  # file order breaks the tie
+        ("Salem, Tamil Nadu", "Tamil Nadu"),
+        ("Salem, India", "Tamil Nadu"),
+        ("Salem, Oregon", "Oregon"),
+        ("Salem, OR, USA", "Oregon"),
+        ("Salem (United States of America)", "Oregon"),
+    ],
+)
+def test_lookup_disambiguates_by_state_or_country(gazetteer, query, state):
+    assert gazetteer.lookup(query).state == state
+
+
+def test_lookup_rejects_a_known_region_none_of_the_places_is_in(gazetteer):
+    assert gazetteer.lookup("Portland, India") is None
+    # An unknown qualifier is ignored
+    assert gazetteer.lookup("Portland, Multnomah").name == "Portland"
+
+
+def test_lookup_tries_later_parts_as_names(gazetteer):
+    assert gazetteer.lookup("Powai, Mumbai").name == "Mumbai"
+    assert gazetteer.lookup("Andheri, Mumbai").name == "Andheri"
+
+
+def test_lookup_unknown(gazetteer):
+    assert gazetteer.lookup("Atlantis") is None
+    assert gazetteer.lookup("") is None
+    assert len(gazetteer) == 7
+
+
+def test_each_gazetteer_caches_its_own_lookups(gazetteer, tmp_path):
+    path = tmp_path / "other.csv"
+    path.write_text("name,aliases,state,country,lat,lon\nMumbai,,Ontario,Canada,43.0,-80.0\n", encoding="utf-8")
+    other = Gazetteer(str(path), fuzzy_cutoff=0.85)
+
+    assert gazetteer.lookup("Mumbai").country == "India"
+    assert other.lookup("Mumbai").country == "Canada"
+    assert gazetteer.lookup.cache_info().currsize == other.lookup.cache_info().currsize == 1
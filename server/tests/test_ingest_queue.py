@@ -0,0 +1,117 @@
+import asyncio
+from datetime import timedelta
+
+import pytest
+
+import app.ingest as ingest
+import app.ingest_queue as ingest_queue
+from app.db.models import IngestJob, Profile
+from benchmarks.synthetic import SyntheticProfiles, fake_geocode
+
+
+def _enqueue(db, pdf_path: str = "missing.pdf", age_seconds: int = 0) -> str:
+    job = ingest_queue.enqueue_job(db, who_am_i="who", looking_for="kind", gender="Female", pdf_path=pdf_path)
+    # created_at has second resolution on SQLite; spell out the queue order
+    job.created_at = ingest_queue._now() - timedelta(seconds=age_seconds)
+    db.commit()
+    return job.id
+
+
+def _job(db, job_id: str) -> IngestJob:
+    db.expire_all()
+    return db.get(IngestJob, job_id)
+
+
+def test_claims_take_the_oldest_queued_job_once(db):
+    newer = _enqueue(db, age_seconds=10)
+    older = _enqueue(db, age_seconds=20)
+
+    assert ingest_queue.claim_job().id == older
+    assert ingest_queue.claim_job().id == newer
+    assert ingest_queue.claim_job() is None
+    job = _job(db, older)
+    assert (job.status, job.attempts) == ("running", 1)
+
+
+def test_expired_leases_are_reclaimed_until_attempts_run_out(db, monkeypatch):
+    monkeypatch.setattr(ingest_queue.settings, "ingest_max_attempts", 2)
+    job_id = _enqueue(db)
+    for _ in range(2):
+        assert ingest_queue.claim_job().id == job_id
+        assert ingest_queue.claim_job() is None  # leased
+        job = _job(db, job_id)
+        job.locked_at -= timedelta(seconds=ingest_queue.settings.ingest_job_lease_seconds + 1)
+        db.commit()
+
+    assert ingest_queue.claim_job() is None
+    job = _job(db, job_id)
+    assert (job.status, job.attempts) == ("failed", 3)
+    assert "abandoned" in job.error
+
+
+def test_stages_retry_transient_failures_only(db, monkeypatch):
+    monkeypatch.setattr(ingest_queue.random, "uniform", lambda low, high: 0.0)
+    monkeypatch.setattr(ingest_queue.settings, "ingest_stage_retries", 2)
+    _enqueue(db)
+    job = ingest_queue.claim_job()
+    attempts = []
+
+    async def flaky(error):
+        attempts.append(error)
+        if len(attempts) < 3:
+            raise error
+        return "done"
+
+    async def run(error):
+        attempts.clear()
+        stages = ingest_queue._RunningStages(job.id)
+        return await ingest_queue._stage(job, stages, "embed", lambda: flaky(error))
+
+    assert asyncio.run(run(ConnectionError("reset"))) == "done"
+    assert len(attempts) == 3
+    with pytest.raises(ingest_queue.StageError, match="embed failed"):
+        asyncio.run(run(FileNotFoundError("gone")))
+    assert len(attempts) == 1
+
+
+def test_overlapping_stages_are_all_reported(monkeypatch):
+    reported = []
+    monkeypatch.setattr(ingest_queue, "_update_job", lambda job_id, stage: reported.append(stage))
+
+    async def run():
+        stages = ingest_queue._RunningStages("job")
+        await stages.enter("embed")  # the pref embedding starts first
+        await stages.enter("extract")
+        await stages.leave("extract")
+        await stages.enter("embed")
+        await stages.enter("geocode")
+        await stages.leave("embed")
+        await stages.leave("geocode")
+        await stages.leave("embed")
+
+    asyncio.run(run())
+    assert reported == ["embed", "extract+embed", "embed", "embed+geocode", "embed", None]
+
+
+def test_a_job_runs_to_a_profile_under_its_own_id(db, fake_openai, monkeypatch, tmp_path):
+    monkeypatch.setattr(ingest, "lookup_city", fake_geocode)
+    gen = SyntheticProfiles(seed=4, dim=16)
+    path = gen.write_docx(str(tmp_path), gen.profile())
+    job_id = _enqueue(db, pdf_path=path)
+
+    asyncio.run(ingest_queue.run_job(ingest_queue.claim_job()))
+
+    job = _job(db, job_id)
+    assert (job.status, job.stage, job.profile_id, job.error) == ("succeeded", None, job_id, None)
+    profile = db.get(Profile, job_id)
+    assert profile.gender == "female"
+    assert profile.self_embedding is not None and profile.location_lat is not None
+
+
+def test_a_missing_upload_fails_the_job_without_retries(db, fake_openai):
+    job_id = _enqueue(db, pdf_path="/nonexistent/upload.pdf")
+    asyncio.run(ingest_queue.run_job(ingest_queue.claim_job()))
+    job = _job(db, job_id)
+    assert job.status == "failed"
+    assert job.error.startswith("extract failed")
+    assert db.get(Profile, job_id) is None
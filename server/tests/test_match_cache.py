@@ -0,0 +1,96 @@
+import pytest
+
+from app.db.models import Profile
+from app.match_cache import MatchCache, MemoryBackend, SQLiteBackend
+from app.pool_versions import bump_pool_versions, pool_version
+
+
+@pytest.fixture(params=["memory", "sqlite"])
+def cache(request, tmp_path):
+    if request.param == "sqlite":
+        backend = SQLiteBackend(str(tmp_path / "match_cache.sqlite3"), max_entries=100, ttl_seconds=60)
+    else:
+        backend = MemoryBackend(max_entries=100, ttl_seconds=60)
+    return MatchCache(backend)
+
+
+class _Compute:
+    def __init__(self) -> None:
+        self.calls = 0
+
+    def __call__(self):
+        self.calls += 1
+        return [{"profile_id": f"p{self.calls}", "score": 0.5}]
+
+
+def test_same_key_is_served_from_cache(cache):
+    compute = _Compute()
+    first = cache.get_or_compute("seeker", "female", 20, 3, compute)
+    assert cache.get_or_compute("seeker", "female", 20, 3, compute) == first
+    assert compute.calls == 1
+    assert cache.stats()["hits"] == 1
+
+
+@pytest.mark.parametrize(
+    "change",
+    [
+        {"version": 4},
+        {"limit": 10},
+        {"target_gender": "male"},
+        {"profile_id": "other"},
+        {"max_distance_km": 50.0},
+        {"seeker_version": 2},
+    ],
+    ids=lambda change: next(iter(change)),
+)
+def test_each_key_part_separates_entries(cache, change):
+    key = {"profile_id": "seeker", "target_gender": "female", "limit": 20, "version": 3}
+    compute = _Compute()
+    cache.get_or_compute(compute=compute, **key)
+    cache.get_or_compute(compute=compute, **{**key, **change})
+    assert compute.calls == 2
+
+
+def test_radius_is_part_of_the_key(cache):
+    compute = _Compute()
+    cache.get_or_compute("seeker", "female", 20, 3, compute, max_distance_km=50)
+    cache.get_or_compute("seeker", "female", 20, 3, compute, max_distance_km=50.0)
+    cache.get_or_compute("seeker", "female", 20, 3, compute, max_distance_km=100)
+    assert compute.calls == 2
+
+
+def test_gender_spellings_share_a_partition(cache):
+    compute = _Compute()
+    cache.get_or_compute("seeker", "female", 20, 3, compute)
+    cache.get_or_compute("seeker", " Female ", 20, 3, compute)
+    assert compute.calls == 1
+
+
+def test_callers_get_copies(cache):
+    compute = _Compute()
+    cache.get_or_compute("seeker", "female", 20, 3, compute)[0]["score"] = 1.0
+    assert cache.get_or_compute("seeker", "female", 20, 3, compute)[0]["score"] == 0.5
+
+
+def test_without_backend_every_call_computes():
+    cache = MatchCache(None)
+    compute = _Compute()
+    cache.get_or_compute("seeker", "female", 20, 3, compute)
+    cache.get_or_compute("seeker", "female", 20, 3, compute)
+    assert compute.calls == 2
+    assert cache.stats()["backend"] == "none"
+
+
+def test_bumps_move_only_their_partitions_and_stamp_their_profiles(db):
+    profiles = [Profile(id=f"f{i}", gender="female", who_am_i="w", looking_for="l") for i in range(3)]
+    profiles.append(Profile(id="m0", gender="male", who_am_i="w", looking_for="l"))
+    db.add_all(profiles)
+    db.commit()
+    assert pool_version(db, "female") == 0
+
+    assert bump_pool_versions(["f0", "f1"]) == {"female": 1}
+    assert bump_pool_versions(["f1", "f2", "f2"]) == {"female": 2}
+    db.expire_all()
+    assert pool_version(db, "female") == 2
+    assert pool_version(db, "male") == 0
+    assert [db.get(Profile, pid).pool_version for pid in ("f0", "f1", "f2", "m0")] == [1, 2, 2, None]
@@ -0,0 +1,89 @@
+import asyncio
+import json
+import random
+from uuid import uuid4
+
+import numpy as np
+import pytest
+
+import app.matching as matching
+from app.db.models import Profile
+from app.ingest import _profile_fields
+from app.openai import rerank
+from app.routers import profiles
+
+
+def _profile(rng: random.Random, gender: str) -> Profile:
+    def unit():
+        vec = np.array([rng.gauss(0, 1) for _ in range(matching.settings.embedding_dim)])
+        return list(vec / np.linalg.norm(vec))
+
+    return Profile(
+        **_profile_fields(
+            profile_id=str(uuid4()),
+            who_am_i=f"who {rng.random()}",
+            looking_for="someone kind",
+            gender=gender,
+            pdf_path="",
+            pdf_text="",
+            canonical={"city": rng.choice(["Mumbai", "Pune"])},
+            dynamic={"hobbies": "reading"},
+            self_emb=unit(),
+            pref_emb=unit(),
+            coords=None,
+        )
+    )
+
+
+@pytest.fixture
+def seeker(db, fake_openai):
+    rng = random.Random(9)
+    seeker = _profile(rng, "male")
+    db.add_all([seeker, *(_profile(rng, "female") for _ in range(7))])
+    db.commit()
+    return seeker
+
+
+def _events(profile_id: str) -> list:
+    """(event, data) pairs of the stream, in order."""
+    response = profiles.stream_matches_rerank(profile_id, max_distance_km=None)
+    assert response.media_type == "text/event-stream"
+
+    async def read():
+        return [chunk async for chunk in response.body_iterator]
+
+    events = []
+    for chunk in asyncio.run(read()):
+        event, data = chunk.strip().split("\n")
+        events.append((event.removeprefix("event: "), json.loads(data.removeprefix("data: "))))
+    return events
+
+
+def test_stream_sends_matches_then_verdicts_then_the_ranking(db, seeker):
+    events = _events(seeker.id)
+
+    kinds = [kind for kind, _ in events]
+    assert kinds[0] == "matches" and kinds[-2:] == ["ranking", "done"]
+    assert set(kinds[1:-2]) == {"rerank"}
+    matched = [m["profile_id"] for m in events[0][1]]
+    verdicts = [v["profile_id"] for _, data in events[1:-2] for v in data]
+    assert sorted(verdicts) == sorted(matched)
+    ranking = events[-2][1]
+    expected = rerank.rerank_with_llm(seeker, matching.top_matches(db, seeker.id, limit=50), db=db, limit=20)
+    assert [m["profile_id"] for m in ranking] == [m["profile_id"] for m in expected]
+
+
+def test_each_shard_streams_as_its_own_event(db, seeker, monkeypatch):
+    monkeypatch.setattr(rerank.settings, "rerank_shard_size", 3)
+    events = _events(seeker.id)
+    shards = [data for kind, data in events if kind == "rerank"]
+    assert sorted(len(shard) for shard in shards) == [1, 3, 3]
+
+
+def test_cached_verdicts_arrive_in_one_event(db, seeker, fake_openai):
+    _events(seeker.id)
+    fake_openai.calls.clear()
+    events = _events(seeker.id)
+    assert [kind for kind, _ in events] == ["matches", "rerank", "ranking", "done"]
+    assert len(events[1][1]) == 7
+    assert not fake_openai.calls
@@ -0,0 +1,228 @@
+import random
+from datetime import datetime, timedelta, timezone
+from uuid import uuid4
+
+import numpy as np
+import pytest
+
+import app.matching as matching
+from app.db.models import Profile
+from app.ingest import _profile_fields
+from app.match_cache import MatchCache, MemoryBackend
+from app.match_index import EmbeddingIndex
+from app.pool_versions import bump_pool_versions
+
+_VALUES = {
+    "city": ["Mumbai", "Pune", " mumbai "],
+    "state": ["Maharashtra", "Karnataka"],
+    "country": ["India"],
+    "education": ["MBA", "B.Tech", "mba"],
+    "profession": ["Engineer", "Doctor", ""],
+    "religion": ["Hindu", "Jain", None],
+    "caste": ["Maratha", "Brahmin"],
+}
+_TRAITS = ["diet", "hobbies", "smoking", "pets", "languages", "fitness", "music", "travel"]
+
+
+def _cosine(a, b) -> float:
+    va, vb = np.array(a, dtype=float), np.array(b, dtype=float)
+    denom = np.linalg.norm(va) * np.linalg.norm(vb)
+    return float(np.dot(va, vb) / denom) if denom else 0.0
+
+
+def _canonical_similarity(src, cand) -> float:
+    if not src or not cand:
+        return 0.0
+    matches = total = 0
+    for k in ("city", "state", "country", "education", "profession", "religion", "caste"):
+        s_val = (src.get(k) or "").strip().lower()
+        c_val = (cand.get(k) or "").strip().lower()
+        if not s_val or not c_val:
+            continue
+        total += 1
+        matches += s_val == c_val
+    return matches / total if total else 0.0
+
+
+def _dynamic_similarity(src, cand) -> float:
+    if not src or not cand:
+        return 0.0
+    return len(src.keys() & cand.keys()) / len(src.keys() | cand.keys())
+
+
+def _baseline_score(seeker: Profile, cand: Profile) -> float:
+    """The per-candidate formula `top_matches` used before scoring was vectorised."""
+    weights, parts = [], []
+    for value, weight in (
+        (_cosine(seeker.pref_embedding, cand.self_embedding), 0.4),
+        (_cosine(seeker.self_embedding, cand.pref_embedding), 0.4),
+        (_canonical_similarity(seeker.canonical, cand.canonical), 0.1),
+        (_dynamic_similarity(seeker.dynamic_features, cand.dynamic_features), 0.1),
+    ):
+        if value > 0:
+            weights.append(weight)
+            parts.append(weight * value)
+    return sum(parts) / sum(weights) if weights else 0.0
+
+
+def _profile(rng: random.Random, gender: str, coded: bool) -> Profile:
+    canonical = {key: rng.choice(values) for key, values in _VALUES.items() if rng.random() < 0.8}
+    dynamic = {key: "yes" for key in rng.sample(_TRAITS, rng.randint(0, 4))}
+    dim = matching.settings.embedding_dim
+    self_emb = [rng.gauss(0, 1) for _ in range(dim)]
+    pref_emb = [rng.gauss(0, 1) for _ in range(dim)]
+    coords = (rng.uniform(8, 30), rng.uniform(68, 90))
+    if coded:
+        # Rows written by ingest: unit vectors, validity flags, feature codes and
+        # the gender as typed, which ingest normalises
+        return Profile(
+            **_profile_fields(
+                who_am_i="who",
+                looking_for="looking",
+                gender=rng.choice([gender, gender.title(), f" {gender.upper()} "]),
+                pdf_path="",
+                pdf_text="",
+                canonical=canonical,
+                dynamic=dynamic,
+                self_emb=list(np.array(self_emb) / np.linalg.norm(self_emb)),
+                pref_emb=list(np.array(pref_emb) / np.linalg.norm(pref_emb)),
+                coords=coords,
+            )
+        )
+    # Legacy rows: raw vectors without flags or codes
+    return Profile(
+        id=str(uuid4()),
+        gender=gender,
+        who_am_i="who",
+        looking_for="looking",
+        canonical=canonical,
+        dynamic_features=dynamic,
+        location_lat=coords[0],
+        location_lon=coords[1],
+        self_embedding=self_emb,
+        pref_embedding=pref_emb,
+    )
+
+
+@pytest.fixture
+def pool(db):
+    rng = random.Random(7)
+    seekers = [_profile(rng, "male", coded=True), _profile(rng, "male", coded=False)]
+    candidates = [_profile(rng, "female", coded=rng.random() < 0.5) for _ in range(60)]
+    db.add_all(seekers + candidates)
+    db.commit()
+    return seekers, candidates
+
+
+@pytest.mark.parametrize("retrieval", ["scan", "memory"])
+@pytest.mark.parametrize("seeker_index", [0, 1], ids=["coded-seeker", "legacy-seeker"])
+def test_scores_match_baseline_formula(db, pool, monkeypatch, retrieval, seeker_index):
+    seekers, candidates = pool
+    seeker = seekers[seeker_index]
+    monkeypatch.setattr(matching.settings, "match_retrieval", retrieval)
+    index = EmbeddingIndex()
+    if retrieval == "memory":
+        index.load(db)
+    monkeypatch.setattr(matching, "embedding_index", index)
+
+    matches = matching.top_matches(db, source_profile_id=seeker.id, limit=len(candidates))
+
+    expected = {cand.id: _baseline_score(seeker, cand) for cand in candidates}
+    assert {m["profile_id"] for m in matches} == set(expected)
+    for m in matches:
+        assert m["score"] == pytest.approx(expected[m["profile_id"]], abs=1e-5)
+    scores = [m["score"] for m in matches]
+    assert scores == sorted(scores, reverse=True)
+
+
+def test_top_matches_respects_limit(db, pool):
+    seekers, candidates = pool
+    full = matching.top_matches(db, source_profile_id=seekers[0].id, limit=len(candidates))
+    assert matching.top_matches(db, source_profile_id=seekers[0].id, limit=5) == full[:5]
+
+
+@pytest.mark.parametrize("k", [0, 1, 3, 5, 8, 12, 20])
+def test_top_k_orders_ties_by_candidate_position(k):
+    rng = np.random.default_rng(k)
+    scores = rng.choice([0.1, 0.5, 0.5, 0.7, 0.9], size=15)
+    expected = np.argsort(-scores, kind="stable")[:k]
+    np.testing.assert_array_equal(matching._top_k(scores, k), expected)
+
+
+def test_top_k_breaks_a_tie_at_the_cut_by_position():
+    scores = np.array([0.2, 0.8, 0.5, 0.5, 0.8, 0.5])
+    np.testing.assert_array_equal(matching._top_k(scores, 3), [1, 4, 2])
+    np.testing.assert_array_equal(matching._top_k(scores, 4), [1, 4, 2, 3])
+    assert len(matching._top_k(np.array([]), 3)) == 0
+
+
+def test_memory_index_picks_up_writes_after_a_version_bump(db, pool):
+    seekers, candidates = pool
+    index = EmbeddingIndex()
+    index.load(db)
+    assert index.refresh(db) == 0
+
+    late = _profile(random.Random(11), "female", coded=True)
+    db.add(late)
+    db.commit()
+    assert late.id not in index.partition("female").ids
+    bump_pool_versions([late.id])
+
+    assert index.refresh(db) >= 1
+    assert late.id in index.partition("female").ids
+    assert len(index.partition("female")) == len(candidates) + 1
+    assert index.version("female") == 1
+
+
+def test_memory_index_refresh_does_not_depend_on_write_timestamps(db, pool):
+    seekers, candidates = pool
+    index = EmbeddingIndex()
+    index.load(db)
+    rng = random.Random(12)
+    recent = _profile(rng, "female", coded=True)
+    db.add(recent)
+    db.commit()
+    bump_pool_versions([recent.id])
+    assert index.refresh(db) == 1
+
+    # A long transaction commits after the refresh above, its rows stamped with its start time
+    slow = _profile(rng, "female", coded=True)
+    slow.updated_at = datetime.now(timezone.utc) - timedelta(hours=1)
+    db.add(slow)
+    db.commit()
+    bump_pool_versions([slow.id])
+
+    assert index.refresh(db) == 1
+    assert slow.id in index.partition("female").ids
+    assert len(index.partition("female")) == len(candidates) + 2
+
+
+def test_seeker_writes_retire_its_cached_matches(db, pool, monkeypatch):
+    seekers, candidates = pool
+    seeker = seekers[0]
+    monkeypatch.setattr(matching, "match_cache", MatchCache(MemoryBackend(max_entries=100, ttl_seconds=60)))
+    first = matching.top_matches(db, source_profile_id=seeker.id, limit=5)
+    assert matching.top_matches(db, source_profile_id=seeker.id, limit=5) == first
+
+    # Re-embedding the seeker moves no candidate partition, only the seeker's own stamp
+    seeker.pref_embedding = [-x for x in seeker.pref_embedding]
+    db.commit()
+    bump_pool_versions([seeker.id])
+    db.expire_all()
+
+    second = matching.top_matches(db, source_profile_id=seeker.id, limit=5)
+    assert matching.match_cache.stats()["misses"] == 2
+    assert second != first
+
+
+def test_rerank_breakdown_uses_the_ranking_components(db, pool):
+    from app.openai import rerank
+
+    seekers, candidates = pool
+    for seeker in seekers:
+        components = rerank._components(seeker, candidates)
+        combined = matching._combine_scores(
+            *(np.array([c[name] for c in components]) for name in ("pref_to_self", "self_to_pref", "canonical", "dynamic"))
+        )
+        expected = [_baseline_score(seeker, cand) for cand in candidates]
+        np.testing.assert_allclose(combined, expected, atol=1e-5)
@@ -0,0 +1,92 @@
+import random
+from uuid import uuid4
+
+import numpy as np
+import pytest
+from sqlalchemy import func, select
+
+import app.matching as matching
+from app.db.models import Profile, RerankScore
+from app.ingest import _profile_fields
+from app.openai import rerank
+
+
+def _unit(rng: random.Random) -> list:
+    vec = np.array([rng.gauss(0, 1) for _ in range(matching.settings.embedding_dim)])
+    return list(vec / np.linalg.norm(vec))
+
+
+def _profile(rng: random.Random, gender: str) -> Profile:
+    return Profile(
+        **_profile_fields(
+            profile_id=str(uuid4()),
+            who_am_i=f"who {rng.random()}",
+            looking_for="someone kind",
+            gender=gender,
+            pdf_path="",
+            pdf_text="",
+            canonical={"city": rng.choice(["Mumbai", "Pune"]), "religion": "Hindu"},
+            dynamic={"hobbies": "reading"},
+            self_emb=_unit(rng),
+            pref_emb=_unit(rng),
+            coords=None,
+        )
+    )
+
+
+@pytest.fixture
+def pool(db, fake_openai):
+    rng = random.Random(5)
+    seeker = _profile(rng, "male")
+    candidates = [_profile(rng, "female") for _ in range(6)]
+    db.add_all([seeker, *candidates])
+    db.commit()
+    return seeker, candidates
+
+
+@pytest.fixture
+def sent(monkeypatch):
+    """Candidate ids of every LLM rerank call, one list per call."""
+    calls = []
+    real = rerank._request_verdicts
+
+    def record(seeker_block, cand_payload, seeker_trimmed=False):
+        calls.append([c["profile_id"] for c in cand_payload])
+        return real(seeker_block, cand_payload, seeker_trimmed)
+
+    monkeypatch.setattr(rerank, "_request_verdicts", record)
+    return calls
+
+
+def _rerank(db, seeker):
+    matches = matching.top_matches(db, source_profile_id=seeker.id, limit=10)
+    return rerank.rerank_with_llm(seeker, matches, db=db, limit=10)
+
+
+def _stored(db) -> int:
+    return db.execute(select(func.count()).select_from(RerankScore)).scalar_one()
+
+
+def test_cached_verdicts_skip_the_model(db, pool, sent):
+    seeker, candidates = pool
+    first = _rerank(db, seeker)
+    assert sorted(sum(sent, [])) == sorted(c.id for c in candidates)
+
+    sent.clear()
+    again = _rerank(db, seeker)
+    assert not sent
+    assert [(c["profile_id"], c["score"]) for c in again] == [(c["profile_id"], c["score"]) for c in first]
+
+
+def test_edited_candidates_are_rescored_and_their_old_verdicts_dropped(db, pool, sent):
+    seeker, candidates = pool
+    _rerank(db, seeker)
+    assert _stored(db) == len(candidates)
+
+    candidates[2].who_am_i = "rewritten"
+    db.commit()
+    sent.clear()
+    _rerank(db, seeker)
+
+    assert sent == [[candidates[2].id]]
+    assert _stored(db) == len(candidates)
@@ -0,0 +1,105 @@
+import asyncio
+from types import SimpleNamespace
+
+import pytest
+from openai import APITimeoutError, RateLimitError
+
+import app.openai.scheduler as scheduler_module
+from app.openai.scheduler import OpenAIScheduler, Priority
+
+MODEL = "gpt-test"
+
+
+@pytest.fixture
+def scheduler(monkeypatch):
+    monkeypatch.setattr(scheduler_module.settings, "openai_chat_rpm", 6000)
+    monkeypatch.setattr(scheduler_module.settings, "openai_chat_tpm", 600)
+    return OpenAIScheduler(max_retries=2, backoff_base=0.0, backoff_max=0.0)
+
+
+@pytest.fixture
+def sleeps(monkeypatch):
+    """Backoff delays, recorded instead of slept."""
+    slept = []
+    monkeypatch.setattr(scheduler_module.time, "sleep", slept.append)
+    return slept
+
+
+def _rate_limited(retry_after: str) -> RateLimitError:
+    response = SimpleNamespace(request=None, status_code=429, headers={"retry-after": retry_after})
+    return RateLimitError("rate limited", response=response, body=None)
+
+
+def _failing(*errors):
+    """A call raising `errors` in turn, then returning a response."""
+    pending = list(errors)
+
+    def call():
+        if pending:
+            raise pending.pop(0)
+        return SimpleNamespace(usage=SimpleNamespace(total_tokens=10))
+
+    return call
+
+
+def test_queued_calls_are_admitted_in_priority_order(scheduler):
+    bulk = scheduler._enqueue(MODEL, Priority.BULK)
+    ingest = scheduler._enqueue(MODEL, Priority.INGEST)
+    later_ingest = scheduler._enqueue(MODEL, Priority.INGEST)
+    interactive = scheduler._enqueue(MODEL, Priority.INTERACTIVE)
+
+    assert scheduler._try_admit(MODEL, bulk, 1) < 0
+    assert scheduler._try_admit(MODEL, later_ingest, 1) < 0
+    assert scheduler._try_admit(MODEL, interactive, 1) == 0
+    assert scheduler._try_admit(MODEL, later_ingest, 1) < 0
+    assert scheduler._try_admit(MODEL, ingest, 1) == 0
+    assert scheduler._try_admit(MODEL, later_ingest, 1) == 0
+    assert scheduler._try_admit(MODEL, bulk, 1) == 0
+
+
+def test_calls_wait_for_the_token_budget(scheduler):
+    scheduler._state(MODEL).tokens.level = 0.0
+    entry = scheduler._enqueue(MODEL, Priority.INGEST)
+    # 600 tokens/min refill 10 per second
+    assert scheduler._try_admit(MODEL, entry, 5) == pytest.approx(0.5, abs=0.05)
+
+
+def test_rate_limits_back_off_for_at_least_retry_after(scheduler, sleeps):
+    response = scheduler.run(MODEL, 10, Priority.INGEST, _failing(_rate_limited("7")))
+
+    assert response.usage.total_tokens == 10
+    assert sleeps == [7.0]
+    stats = scheduler.stats()["models"][MODEL]
+    assert (stats["calls"], stats["retries"], stats["failures"]) == (1, 1, 0)
+
+
+def test_transient_errors_are_retried_up_to_the_limit(scheduler, sleeps):
+    errors = [APITimeoutError(request=None) for _ in range(3)]
+    with pytest.raises(APITimeoutError):
+        scheduler.run(MODEL, 10, Priority.INGEST, _failing(*errors))
+    assert len(sleeps) == 2
+    stats = scheduler.stats()["models"][MODEL]
+    assert (stats["calls"], stats["retries"], stats["failures"]) == (0, 2, 1)
+
+
+def test_calls_failing_before_the_api_are_refunded(scheduler, sleeps):
+    with pytest.raises(TypeError):
+        scheduler.run(MODEL, 100, Priority.INGEST, _failing(TypeError("bad argument")))
+    assert not sleeps
+    stats = scheduler.stats()["models"][MODEL]
+    assert stats["tokens_available"] == 600
+    assert stats["retries"] == stats["failures"] == 0
+
+
+def test_async_calls_retry_rate_limits(scheduler):
+    attempts = []
+
+    async def call():
+        attempts.append(1)
+        if len(attempts) == 1:
+            raise _rate_limited("0")
+        return SimpleNamespace(usage=None)
+
+    asyncio.run(scheduler.arun(MODEL, 10, Priority.INTERACTIVE, call))
+    assert len(attempts) == 2
+    assert scheduler.stats()["models"][MODEL]["retries"] == 1
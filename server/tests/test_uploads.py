@@ -0,0 +1,85 @@
+import asyncio
+import hashlib
+import io
+import os
+
+import pytest
+from fastapi import HTTPException, UploadFile
+
+import app.ingest as ingest
+from app.db.models import IngestJob
+from app.routers import profiles
+from app.utils import file_utils
+from benchmarks.synthetic import SyntheticProfiles, fake_geocode
+
+
+@pytest.fixture
+def upload_dir(tmp_path, monkeypatch):
+    monkeypatch.setattr(file_utils.settings, "upload_dir", str(tmp_path))
+    return tmp_path
+
+
+def _upload(data: bytes, filename: str = "Biodata.PDF") -> UploadFile:
+    return UploadFile(file=io.BytesIO(data), filename=filename)
+
+
+def test_identical_uploads_share_one_stored_copy(upload_dir, monkeypatch):
+    monkeypatch.setattr(file_utils, "_CHUNK_SIZE", 4)
+    first = file_utils.save_upload_file(_upload(b"same biodata bytes"))
+    second = file_utils.save_upload_file(_upload(b"same biodata bytes", "copy.pdf"))
+    other = file_utils.save_upload_file(_upload(b"other biodata bytes"))
+
+    assert first == second
+    assert first.path == os.path.join(str(upload_dir), f"{first.sha256}.pdf")
+    assert first.size == len(b"same biodata bytes")
+    assert other.sha256 != first.sha256
+    assert sorted(os.listdir(upload_dir)) == sorted([f"{first.sha256}.pdf", f"{other.sha256}.pdf"])
+
+
+def test_oversized_uploads_are_refused_without_leftovers(upload_dir, monkeypatch):
+    monkeypatch.setattr(file_utils, "_CHUNK_SIZE", 4)
+    monkeypatch.setattr(file_utils.settings, "max_upload_bytes", 10)
+    assert file_utils.save_upload_file(_upload(b"0123456789")).size == 10
+    with pytest.raises(file_utils.UploadTooLarge):
+        file_utils.save_upload_file(_upload(b"0123456789a"))
+    assert len(os.listdir(upload_dir)) == 1
+
+
+def test_create_profile_queues_a_job_or_answers_413(db, upload_dir, monkeypatch):
+    monkeypatch.setattr(file_utils.settings, "max_upload_bytes", 10)
+
+    def create(data: bytes):
+        return asyncio.run(
+            profiles.create_profile(
+                who_am_i="who", looking_for="kind", gender="female", profile_file=_upload(data), db=db
+            )
+        )
+
+    response = create(b"small")
+    job = db.get(IngestJob, response.job_id)
+    assert (response.status, job.content_hash) == ("queued", hashlib.sha256(b"small").hexdigest())
+    with pytest.raises(HTTPException) as exc:
+        create(b"far too large")
+    assert exc.value.status_code == 413
+
+
+def test_a_known_file_reuses_its_extraction_and_embeddings(db, fake_openai, upload_dir, tmp_path, monkeypatch):
+    monkeypatch.setattr(ingest, "lookup_city", fake_geocode)
+    gen = SyntheticProfiles(seed=6, dim=16)
+    profile = gen.profile()
+    with open(gen.write_docx(str(tmp_path), profile), "rb") as f:
+        saved = file_utils.save_upload_file(_upload(f.read(), "biodata.docx"))
+    answers = dict(who_am_i=profile["who_am_i"], looking_for=profile["looking_for"])
+
+    def prepare():
+        return asyncio.run(ingest.aprepare_profile(**answers, pdf_path=saved.path, content_hash=saved.sha256))
+
+    fields = prepare()
+    stored = dict(answers, gender=profile["gender"], pdf_path=saved.path, content_hash=saved.sha256)
+    ingest._store_profile(db, **stored, **fields)
+    fake_openai.calls.clear()
+
+    again = prepare()
+    assert not fake_openai.calls
+    assert again["canonical"] == fields["canonical"]
+    assert again["self_emb"] == pytest.approx(fields["self_emb"])